@@ -0,0 +1,339 @@
+# host_controller.py
+# this program drives the motion stage and the NE-1000 syringe pump together, so the pump only sprays while the stage is on a pass
+# the stage gets the g-code through the streaming sender of fabricate, the pump gets its ppl program and then RUN and STP commands
+# a pass starts at the first move after the nozzle is turned on (M300 S30, or M101 for skeinforge g-code) and ends when it is turned off (M300 S40 or M103)
+# before the pump is started or stopped, the controller sends M400 and waits for its ok, which the firmware only sends when every
+# move in its planner buffer is finished, so the pump follows the stage and not just the acknowledgment of the moves
+# while it waits, it polls the pump status and checks the stage link, and it stops everything when either of them reports an alarm
+# or when the stage has lines to acknowledge but has not acknowledged one for the stage timeout
+# to stop everything the pump program is stopped and the stage gets M112, and the lines which were not acknowledged are dropped
+# every event is written with its time to the event log
+#
+# to spray a g-code file with a pump program type:
+# > python host_controller.py --stage-port /dev/ttyUSB0 --pump-port /dev/ttyUSB1 --ppl "Syringe/NE-1000 Syringe Pump PPL Creator.ppl" spray.gcode
+# to try it with the stage and the pump simulated on pseudo terminals type:
+# > python host_controller.py --simulate spray.gcode
+
+import getopt
+import os
+import sys
+import time
+
+fabricate_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replicatorg-0025", "skein_engines", "skeinforge-40", "fabmetheus_utilities", "miscellaneous", "fabricate")
+if fabricate_path not in sys.path:
+  sys.path.append(fabricate_path)
+
+import RepRapArduinoSerialSender
+import serial
+
+STX = '\x02'
+ETX = '\x03'
+
+# the statuses of the pump while its program runs: infusing, withdrawing, purging, paused, in a pause phase and waiting for a trigger
+running_statuses = ["I", "W", "X", "P", "T", "U"]
+# the statuses of the pump when its program has stopped or it has an alarm
+stopped_statuses = ["S", "A"]
+
+# the nozzle on and off codes of the scribbles g-code and of the skeinforge g-code
+pass_start_codes = ["M300 S30", "M101"]
+pass_stop_codes = ["M300 S40", "M103"]
+
+
+class SprayError(Exception):
+  pass
+
+
+class EventLog:
+  def __init__(self, file_name=None):
+    self.events = []
+    self.file = None
+    self.start_time = time.time()
+    if file_name != None:
+      self.file = open(file_name, "w")
+      self.file.write("time\tdevice\tevent\tdetail\n")
+
+  def add(self, device, event, detail=""):
+    "add an event with the seconds since the log was started, and write it straight away so the log survives a crash"
+    seconds = time.time() - self.start_time
+    self.events.append((seconds, device, event, detail))
+    if self.file != None:
+      self.file.write("%.3f\t%s\t%s\t%s\n" % (seconds, device, event, detail))
+      self.file.flush()
+
+  def close(self):
+    if self.file != None:
+      self.file.close()
+      self.file = None
+
+
+class PumpLink:
+  "the serial link to the NE-1000 syringe pump, in the basic mode of the pump manual"
+  def __init__(self, port, baud=19200, address=0, timeout=2.0):
+    self.address = address
+    self.serial = serial.Serial(port, baud, timeout=0.1)
+    self.status = None
+    self.timeout = timeout
+
+  def close(self):
+    self.serial.close()
+
+  def command(self, text):
+    "send a command and return the status and the data of the response, raise SprayError if the pump does not answer or does not know the command"
+    self.serial.write("%02d%s\r" % (self.address, text))
+    response = ""
+    end_time = time.time() + self.timeout
+    while not response.endswith(ETX):
+      if time.time() > end_time:
+        raise SprayError("the pump did not answer %r" % text)
+      response += self.serial.read(1)
+    response = response[response.rfind(STX) + 1 : -1]
+    self.status = response[2 : 3]
+    data = response[3 :]
+    if data.startswith("?") and self.status != "A":
+      raise SprayError("the pump did not take %r, it answered %s" % (text, data))
+    return self.status, data
+
+  def upload_program(self, ppl_file_name):
+    "send the commands of a ppl file, without its comments, and return the number of commands sent"
+    number_of_commands = 0
+    for line in open(ppl_file_name):
+      text = " ".join(line.split(";")[0].split())
+      if text != "":
+        self.command(text)
+        number_of_commands += 1
+    return number_of_commands
+
+
+class HostController:
+  def __init__(self, stage, pump, event_log, poll_interval=0.5, phases=None, stage_timeout=60.0):
+    self.acknowledged_count = 0
+    self.event_log = event_log
+    self.is_spraying = False
+    self.last_acknowledge_time = time.time()
+    self.last_poll_time = 0.0
+    self.pass_number = 0
+    self.phases = phases
+    self.poll_interval = poll_interval
+    self.pump = pump
+    self.stage = stage
+    self.stage_error_count = 0
+    self.stage_timeout = stage_timeout
+
+  def check(self):
+    "poll the pump every poll interval and check the stage, raise SprayError when the pump reports an alarm or the stage stalls"
+    if self.stage.errorCount > self.stage_error_count:
+      self.event_log.add("stage", "error", "%d errors" % self.stage.errorCount)
+      self.stage_error_count = self.stage.errorCount
+    self.check_stage()
+    if time.time() - self.last_poll_time < self.poll_interval:
+      return
+    self.last_poll_time = time.time()
+    status, data = self.pump.command("")
+    if status == "A":
+      self.event_log.add("pump", "alarm", data)
+      raise SprayError("the pump reported the alarm %s" % data)
+    if status not in running_statuses and status not in stopped_statuses:
+      self.event_log.add("pump", "error", "status %r" % status)
+      raise SprayError("the pump answered with the unknown status %r" % status)
+    if self.is_spraying and status in stopped_statuses:
+      self.event_log.add("pump", "stopped", "status %s" % status)
+      raise SprayError("the pump stopped during pass %d with the status %s" % (self.pass_number, status))
+
+  def check_stage(self):
+    "raise SprayError when the stage has lines to acknowledge but has not acknowledged one for the stage timeout"
+    now = time.time()
+    is_idle = len(self.stage.pending) == 0 and len(self.stage.inFlight) == 0
+    if is_idle or self.stage.acknowledgedCount != self.acknowledged_count:
+      self.acknowledged_count = self.stage.acknowledgedCount
+      self.last_acknowledge_time = now
+      return
+    if now - self.last_acknowledge_time > self.stage_timeout:
+      self.event_log.add("stage", "stalled", "no acknowledgment for %.1f seconds" % (now - self.last_acknowledge_time))
+      raise SprayError("the stage did not acknowledge a line for %.1f seconds" % (now - self.last_acknowledge_time))
+
+  def drain(self):
+    "send M400 and wait until the stage has acknowledged it, so every move sent is finished, checking both devices while waiting"
+    self.send("M400")
+    self.wait(self.stage.waitUntilDone)
+    self.check()
+
+  def send(self, block):
+    "send a block to the stage, checking both devices while the stage has no room for it"
+    if not self.stage.write(block, self.poll_interval):
+      self.wait(self.stage.waitUntilSent)
+
+  def spray(self, lines):
+    "send the g-code lines to the stage, starting and stopping the pump at the passes, and stop both when anything goes wrong"
+    self.event_log.add("host", "spray started", "%d lines" % len(lines))
+    is_pass_starting = False
+    try:
+      for line in lines:
+        block = RepRapArduinoSerialSender.getStrippedBlock(line)
+        if block == "":
+          continue
+        if starts_with_any(block, pass_start_codes):
+          is_pass_starting = True
+        elif starts_with_any(block, pass_stop_codes):
+          is_pass_starting = False
+          if self.is_spraying:
+            self.drain()
+            self.stop_pass()
+        elif is_pass_starting and block.startswith("G1"):
+          is_pass_starting = False
+          self.drain()
+          self.start_pass()
+        self.send(block)
+        self.check()
+      self.drain()
+      if self.is_spraying:
+        self.stop_pass()
+    except:
+      self.event_log.add("host", "spray aborted", str(sys.exc_info()[1]))
+      self.stop_pump()
+      self.stop_stage()
+      raise
+    self.stop_pump()
+    self.event_log.add("stage", "metrics", self.stage.getMetricsString())
+    self.event_log.add("host", "spray done", "%d passes" % self.pass_number)
+
+  def start_pass(self):
+    self.pass_number += 1
+    text = "RUN"
+    if self.phases != None:
+      text = "RUN %d" % self.phases[(self.pass_number - 1) % len(self.phases)]
+    self.pump.command(text)
+    self.is_spraying = True
+    self.event_log.add("pump", "pass started", "pass %d, %s" % (self.pass_number, text))
+
+  def stop_pass(self):
+    "pause the pump program at the end of a pass, so the next RUN continues it"
+    self.pump.command("STP")
+    self.is_spraying = False
+    self.event_log.add("pump", "pass stopped", "pass %d" % self.pass_number)
+
+  def stop_pump(self):
+    "stop the pump program, the first STP pauses a running pump and the second one stops it"
+    self.is_spraying = False
+    try:
+      for attempt in range(2):
+        status, data = self.pump.command("STP")
+        if status == "S":
+          break
+      status, data = self.pump.command("DIS")
+      self.event_log.add("pump", "stopped", "dispensed %s" % data)
+    except SprayError, error:
+      self.event_log.add("pump", "error", str(error))
+
+  def stop_stage(self):
+    "drop the lines the stage has not acknowledged and send it M112, so it halts at once"
+    try:
+      self.stage.stop()
+      self.event_log.add("stage", "stopped", "M112")
+    except Exception, error:
+      self.event_log.add("stage", "error", str(error))
+
+  def wait(self, wait_function):
+    "call the wait function of the stage with the poll interval until it returns True, checking both devices in between"
+    while not wait_function(self.poll_interval):
+      self.check()
+
+
+def starts_with_any(block, codes):
+  for code in codes:
+    if block.startswith(code.replace(" ", "")):
+      return True
+  return False
+
+
+def usage():
+  print "Usage: python host_controller.py [options] <g-code file>"
+  print "  --stage-port   the port of the motion stage, default /dev/ttyUSB0"
+  print "  --stage-baud   the baud rate of the motion stage, default 19200"
+  print "  --pump-port    the port of the syringe pump, default /dev/ttyUSB1"
+  print "  --pump-baud    the baud rate of the syringe pump, default 19200"
+  print "  --ppl          the pump program to upload before spraying"
+  print "  --phases       the pump phases to run for the passes in turn, like 1,3"
+  print "  --log          the event log file, default the g-code file name with _events.txt"
+  print "  --window       the number of g-code lines in flight, default 4"
+  print "  --stage-timeout  the seconds the stage may take to acknowledge a line before the spray is stopped, default 60"
+  print "  --simulate     spray on the firmware and pump simulators instead of the devices"
+
+
+def main(argv):
+  try:
+    opts, args = getopt.getopt(argv, "h", ["help", "stage-port=", "stage-baud=", "pump-port=", "pump-baud=", "ppl=", "phases=", "log=", "window=", "stage-timeout=", "simulate"])
+  except getopt.GetoptError:
+    usage()
+    return 2
+  if len(args) != 1:
+    usage()
+    return 2
+
+  stage_port = "/dev/ttyUSB0"
+  stage_baud = 19200
+  pump_port = "/dev/ttyUSB1"
+  pump_baud = 19200
+  ppl_file_name = None
+  phases = None
+  log_file_name = os.path.splitext(args[0])[0] + "_events.txt"
+  window = 4
+  stage_timeout = 60.0
+  simulate = False
+
+  for opt, arg in opts:
+    if opt in ("-h", "--help"):
+      usage()
+      return 0
+    elif opt == "--stage-port":
+      stage_port = arg
+    elif opt == "--stage-baud":
+      stage_baud = int(arg)
+    elif opt == "--pump-port":
+      pump_port = arg
+    elif opt == "--pump-baud":
+      pump_baud = int(arg)
+    elif opt == "--ppl":
+      ppl_file_name = arg
+    elif opt == "--phases":
+      phases = [int(phase) for phase in arg.split(",")]
+    elif opt == "--log":
+      log_file_name = arg
+    elif opt == "--window":
+      window = int(arg)
+    elif opt == "--stage-timeout":
+      stage_timeout = float(arg)
+    elif opt == "--simulate":
+      simulate = True
+
+  lines = open(args[0]).readlines()
+  if simulate:
+    import firmware_simulator
+    import pump_simulator
+    firmware = firmware_simulator.FirmwareSimulator()
+    pump_stand_in = pump_simulator.PumpSimulator()
+    stage_port = firmware.portName
+    pump_port = pump_stand_in.port_name
+
+  event_log = EventLog(log_file_name)
+  stage = RepRapArduinoSerialSender.RepRapArduinoStreamingSender(stage_port, stage_baud, False, window)
+  pump = PumpLink(pump_port, pump_baud)
+  try:
+    if ppl_file_name != None:
+      event_log.add("pump", "program uploaded", "%d commands from %s" % (pump.upload_program(ppl_file_name), ppl_file_name))
+    HostController(stage, pump, event_log, phases=phases, stage_timeout=stage_timeout).spray(lines)
+  except SprayError, error:
+    print "The spray was stopped: %s" % error
+    return 1
+  finally:
+    stage.close(stage_timeout)
+    pump.close()
+    event_log.close()
+    if simulate:
+      firmware.close()
+      pump_stand_in.close()
+  print "The events were logged in " + log_file_name
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1 :]))
@@ -0,0 +1,171 @@
+# pump_simulator.py
+# this program stands in for the NE-1000 syringe pump on a pseudo terminal, so the host controller can be run without the pump
+# it answers the basic mode commands of the pump manual with the same STX address status data ETX packets as the pump
+# it needs a posix system because it uses the pty module
+#
+# to run it by itself type:
+# > python pump_simulator.py
+# then give the port it prints to host_controller.py with --pump-port
+
+import os
+import pty
+import select
+import sys
+import threading
+import time
+import tty
+
+STX = '\x02'
+ETX = '\x03'
+
+# the volume units the RAT command takes, in mL per second
+rate_units = {"UM": 1.0 / 60000.0, "MM": 1.0 / 60.0, "UH": 1.0 / 3600000.0, "MH": 1.0 / 3600.0}
+
+# commands which only set a value of the pump program, the simulator remembers them and answers with the status
+setting_commands = ["AL", "BP", "BUZ", "DIA", "DIR", "FUN", "PF", "TRG", "VOL"]
+
+
+class PumpSimulator:
+  def __init__(self, address=0, stall_after=None, verbose=False):
+    self.address = address
+    self.alarm = None
+    self.dispensed = 0.0
+    self.phase = 1
+    self.phases = {1: {}}
+    self.programming_phase = 1
+    self.rate = 0.0
+    self.received = []
+    self.run_time = 0.0
+    self.running_since = None
+    self.stall_after = stall_after
+    self.status = "S"
+    self.verbose = verbose
+    self.is_running = True
+    self.master, self.slave = pty.openpty()
+    tty.setraw(self.slave)
+    self.port_name = os.ttyname(self.slave)
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def close(self):
+    self.is_running = False
+    self.thread.join()
+    os.close(self.master)
+    os.close(self.slave)
+
+  def get_response(self, command):
+    "answer one command, without the carriage return, with the data of the response"
+    self.update_dispensed()
+    # the command may start with the address of the pump
+    words = command.lstrip("0123456789").replace(",", " ").split()
+    if len(words) == 0:
+      return ""
+    name = words[0].upper()
+    # the pump also takes commands written together with their value, like DIA21.59
+    if name not in ["DIS", "PHN", "RAT", "RUN", "STP"] + setting_commands:
+      for setting_command in setting_commands + ["PHN", "RAT"]:
+        if name.startswith(setting_command):
+          words = [setting_command, name[len(setting_command) :]] + words[1 :]
+          name = setting_command
+          break
+    values = words[1 :]
+    if name == "RUN":
+      if len(values) > 0:
+        if not values[0].isdigit():
+          return "?OOR"
+        self.phase = int(values[0])
+      self.alarm = None
+      self.status = "I"
+      if self.phases.get(self.phase, {}).get("DIR") == "WDR":
+        self.status = "W"
+      self.running_since = time.time()
+      return ""
+    if name == "STP":
+      self.alarm = None
+      if self.status in "IW":
+        self.status = "P"
+      else:
+        self.status = "S"
+        self.phase = 1
+      self.running_since = None
+      return ""
+    if name == "DIS":
+      return "I%.3fW0.000ML" % self.dispensed
+    if name == "PHN":
+      if len(values) == 0:
+        return "%02d" % self.programming_phase
+      if not values[0].isdigit():
+        return "?OOR"
+      self.programming_phase = int(values[0])
+      self.phases.setdefault(self.programming_phase, {})
+      return ""
+    if name == "RAT":
+      if len(values) == 0:
+        return "%.3fMH" % (self.rate / rate_units["MH"])
+      units = "MH"
+      if len(values) > 1:
+        units = values[1].upper()
+      if units not in rate_units:
+        return "?OOR"
+      try:
+        self.rate = float(values[0]) * rate_units[units]
+      except ValueError:
+        return "?"
+      return ""
+    if name in setting_commands:
+      if len(values) > 0:
+        self.phases[self.programming_phase][name] = values[0].upper()
+      return ""
+    return "?"
+
+  def parse_command(self, command):
+    if self.verbose:
+      print "pump > " + command
+    self.received.append(command)
+    data = self.get_response(command)
+    status = self.status
+    if self.alarm != None and data == "":
+      status = "A"
+      data = self.alarm
+    response = "%s%02d%s%s%s" % (STX, self.address, status, data, ETX)
+    if self.verbose:
+      print "pump < " + response[1 : -1]
+    os.write(self.master, response)
+
+  def run(self):
+    buffer = ""
+    while self.is_running:
+      if len(select.select([self.master], [], [], 0.05)[0]) > 0:
+        try:
+          buffer += os.read(self.master, 1024)
+        except OSError:
+          return
+      while "\r" in buffer:
+        command, buffer = buffer.split("\r", 1)
+        self.parse_command(command.strip())
+      self.update_dispensed()
+
+  def update_dispensed(self):
+    "add the volume pumped since the last update, and stall when the stall time is over"
+    if self.running_since == None:
+      return
+    now = time.time()
+    self.dispensed += self.rate * (now - self.running_since)
+    self.run_time += now - self.running_since
+    self.running_since = now
+    if self.stall_after != None and self.run_time >= self.stall_after:
+      self.alarm = "?S"
+      self.status = "S"
+      self.running_since = None
+
+
+if __name__ == "__main__":
+  pump = PumpSimulator(verbose="-v" in sys.argv[1 :])
+  print "The pump simulator is listening on " + pump.port_name
+  try:
+    while True:
+      time.sleep(1.0)
+  except KeyboardInterrupt:
+    print "Received %d commands and dispensed %.3f mL" % (len(pump.received), pump.dispensed)
+  pump.close()
@@ -7,6 +7,7 @@ from __future__ import absolute_import
 #Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
 import __init__
 
+import mmap
 import os
 import sys
 import traceback
@@ -18,6 +19,7 @@ __date__ = '$Date: 2008/02/05 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalBufferChunkLength = 16777216
 globalTemporarySettingsPath = os.path.join(os.path.expanduser('~'), '.skeinforge')
 
 
@@ -107,6 +109,21 @@ def getFilePathWithUnderscoredBasename(fileName, suffix):
 	suffixReplacedBaseName = os.path.basename(suffixFileName).replace(' ', '_')
 	return os.path.join(suffixDirectoryName, suffixReplacedBaseName)
 
+def getFileBuffer(fileName, printWarning=True):
+	'Get the read only memory map of a file, or an empty string if the file is empty or does not exist.'
+	try:
+		file = open(fileName, 'rb')
+	except IOError:
+		if printWarning:
+			print('The file ' + fileName + ' does not exist.')
+		return ''
+	try:
+		if os.fstat(file.fileno()).st_size < 1:
+			return ''
+		return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+	finally:
+		file.close()
+
 def getFileText(fileName, printWarning=True, readMode='r'):
 	'Get the entire text of a file.'
 	try:
@@ -184,6 +201,17 @@ def getJoinedPath(path, subName=''):
 		return path
 	return os.path.join(path, subName)
 
+def getMatchGroupsInBuffer(buffer, pattern):
+	'Get the match groups of a multiline pattern in a text or memory mapped buffer, a chunk of whole lines at a time so that the buffer is not copied.'
+	chunkBeginning = 0
+	while chunkBeginning < len(buffer):
+		chunkEnd = buffer.find('\n', chunkBeginning + globalBufferChunkLength) + 1
+		if chunkEnd < 1:
+			chunkEnd = len(buffer)
+		for matchGroups in pattern.findall(buffer, chunkBeginning, chunkEnd):
+			yield matchGroups
+		chunkBeginning = chunkEnd
+
 def getModuleWithDirectoryPath(directoryPath, fileName):
 	'Get the module from the fileName and folder name.'
 	if fileName == '':
@@ -0,0 +1,284 @@
+"""
+Binary_gcode is a collection of utilities to write gcode text as a compact binary move stream and to read the stream back into the same gcode lines.
+
+The stream starts with the beginning bytes, then the header, which is the number of decimal places of the numbers, the units, which are zero for millimeters and one for inches, and the default feed rate, which is the feed rate before the first F word.  After the header come the records, one for each gcode line.
+
+A record of a line which can be encoded starts with the index of its command in globalCommandWords plus one, then the flags of the words it has in globalWordLetters, then for each of those words the difference of its number from the number of the last word with the same letter.  The numbers are in units of the decimal places, so they are integers, and the differences are zig zag varints, so that most of them are one or two bytes.  Every other line, like a comment or a line with words out of order, is written as a record starting with zero, followed by the varint length and the text of the line.
+
+A line is only encoded when the words read back from the record are the same as the words of the line, so reading a stream always gives back the exact text which was written.  This module does not import the rest of skeinforge, so a host can read a stream with only this module.
+
+To check that gcode files are read back into the same text at every number of decimal places from one to five, in a shell type:
+> python binary_gcode.py Screw Holder_export.gcode
+
+With no file names, the gcode files in the skeinforge folder, which are the alterations and the exported model in the models folder, are checked.  The script prints a line for each file and exits with the status one if any file is not read back into the same text.
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+import cStringIO
+import os
+import sys
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/02/05 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalBinaryGcodeBeginning = '\x8bSBG\x01'
+globalCheckedDecimalPlaces = range(1, 6)
+globalCommandWords = [
+	'G1', 'G0', 'G2', 'G3', 'G4', 'G20', 'G21', 'G28', 'G90', 'G91', 'G92',
+	'M101', 'M102', 'M103', 'M104', 'M105', 'M106', 'M107', 'M108', 'M109', 'M110', 'M113',
+	'M140', 'M141', 'M142', 'M143', 'M300']
+globalCommandDictionary = dict([(commandWord, commandIndex + 1) for commandIndex, commandWord in enumerate(globalCommandWords)])
+globalWordLetters = 'XYZFESIJRP'
+
+
+def getBinaryGcode(gcodeText, decimalPlaces=2):
+	'Get the binary gcode of a gcode text.'
+	binaryGcodeWriter = BinaryGcodeWriter(decimalPlaces, getDefaultFeedRate(gcodeText), getIsInches(gcodeText))
+	for line in gcodeText.replace('\r', '\n').split('\n'):
+		if line != '':
+			binaryGcodeWriter.addLine(line)
+	return binaryGcodeWriter.getBinaryGcode()
+
+def getDefaultFeedRate(gcodeText):
+	'Get the feed rate of the first F word of the first move, or zero if there is none.'
+	for line in gcodeText.replace('\r', '\n').split('\n'):
+		splitLine = line.split()
+		if len(splitLine) > 0 and splitLine[0] in ['G0', 'G1', 'G2', 'G3']:
+			for word in splitLine[1 :]:
+				if word.startswith('F'):
+					try:
+						return float(word[1 :])
+					except ValueError:
+						return 0.0
+	return 0.0
+
+def getIsInches(gcodeText):
+	'Determine if the units of the gcode are set to inches by G20 before they are set to millimeters.'
+	for line in gcodeText.replace('\r', '\n').split('\n'):
+		splitLine = line.split()
+		if len(splitLine) > 0:
+			if splitLine[0] == 'G20':
+				return True
+			if splitLine[0] == 'G21':
+				return False
+	return False
+
+def getGcodeLines(gcodeText):
+	'Get the lines of a gcode text without the empty lines, which are the lines written by getBinaryGcode.'
+	gcodeLines = []
+	for line in gcodeText.replace('\r', '\n').split('\n'):
+		if line != '':
+			gcodeLines.append(line)
+	return gcodeLines
+
+def getNumberString(decimalPlaces, integerNumber):
+	'Get the number string of an integer number in units of the decimal places, the same as the string of the number rounded by euclidean.getRoundedToPlacesString.'
+	return str(round(float(integerNumber) / float(10 ** decimalPlaces), max(1, decimalPlaces)))
+
+def getRoundTripMessage(fileName):
+	'Get the message of the round trip check of a gcode file, and whether the file is read back into the same text at every checked number of decimal places.'
+	gcodeFile = open(fileName, 'rb')
+	gcodeText = gcodeFile.read()
+	gcodeFile.close()
+	gcodeLines = getGcodeLines(gcodeText)
+	failedDecimalPlaces = []
+	for decimalPlaces in globalCheckedDecimalPlaces:
+		if not isRoundTrip(getBinaryGcode(gcodeText, decimalPlaces), gcodeText):
+			failedDecimalPlaces.append(decimalPlaces)
+	if len(failedDecimalPlaces) > 0:
+		return 'Warning, %s is not read back into the same text at %s decimal places.' % (fileName, failedDecimalPlaces), False
+	binaryGcodeWriter = BinaryGcodeWriter(2, getDefaultFeedRate(gcodeText), getIsInches(gcodeText))
+	for line in gcodeLines:
+		binaryGcodeWriter.addLine(line)
+	binaryGcodeLength = len(binaryGcodeWriter.getBinaryGcode())
+	return '%s is read back into the same text, at two decimal places %s of its %s lines are encoded and it is %s bytes instead of %s.' % (fileName, binaryGcodeWriter.encodedLineCount, len(gcodeLines), binaryGcodeLength, len(gcodeText)), True
+
+def getSampleFileNames():
+	'Get the gcode file names in the skeinforge folder.'
+	sampleFileNames = []
+	for directoryPath, directoryNames, fileNames in os.walk(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))):
+		for fileName in fileNames:
+			if os.path.splitext(fileName)[1] in ['.gcode', '.ngc']:
+				sampleFileNames.append(os.path.join(directoryPath, fileName))
+	sampleFileNames.sort()
+	return sampleFileNames
+
+def getTextFromBinaryGcode(binaryGcode):
+	'Get the gcode text of a binary gcode string or memory mapped buffer.'
+	output = cStringIO.StringIO()
+	for line in BinaryGcodeReader(binaryGcode):
+		output.write(line + '\n')
+	return output.getvalue()
+
+def getVarintString(number):
+	'Get the little endian base 128 string of an unsigned integer.'
+	varintCharacters = []
+	while number > 127:
+		varintCharacters.append(chr(128 | (number & 127)))
+		number >>= 7
+	varintCharacters.append(chr(number))
+	return ''.join(varintCharacters)
+
+def getZigZag(number):
+	'Get the unsigned zig zag integer of a signed integer, so that small negative numbers are small.'
+	if number < 0:
+		return ((- number) << 1) - 1
+	return number << 1
+
+def isBinaryGcode(text):
+	'Determine if the text or buffer is binary gcode.'
+	return text[: len(globalBinaryGcodeBeginning)] == globalBinaryGcodeBeginning
+
+def isRoundTrip(binaryGcode, gcodeText):
+	'Determine if the binary gcode is read back into the lines of the gcode text, without an error.'
+	try:
+		return list(BinaryGcodeReader(binaryGcode)) == getGcodeLines(gcodeText)
+	except (IndexError, ValueError):
+		return False
+
+
+class BinaryGcodeReader:
+	'A class to read the gcode lines of a binary gcode string or memory mapped buffer, one record at a time.'
+	def __init__(self, buffer):
+		'Read the header.'
+		if not isBinaryGcode(buffer):
+			raise ValueError('The buffer is not binary gcode.')
+		self.buffer = buffer
+		self.index = len(globalBinaryGcodeBeginning)
+		self.decimalPlaces = self.getVarint()
+		self.isInches = self.getVarint() == 1
+		self.scale = 10 ** self.decimalPlaces
+		self.integerNumbers = [0] * len(globalWordLetters)
+		self.integerNumbers[globalWordLetters.find('F')] = self.getVarint()
+		self.defaultFeedRate = float(self.integerNumbers[globalWordLetters.find('F')]) / float(self.scale)
+
+	def __iter__(self):
+		'Get the iterator of the lines.'
+		return self
+
+	def __repr__(self):
+		'Get the string representation of this BinaryGcodeReader.'
+		return '%s, %s, %s' % (self.decimalPlaces, self.isInches, self.defaultFeedRate)
+
+	def getVarint(self):
+		'Get the next unsigned varint.'
+		number = 0
+		shift = 0
+		while True:
+			byte = ord(self.buffer[self.index])
+			self.index += 1
+			number |= (byte & 127) << shift
+			if byte < 128:
+				return number
+			shift += 7
+
+	def next(self):
+		'Get the next gcode line.'
+		if self.index >= len(self.buffer):
+			raise StopIteration
+		commandIndex = ord(self.buffer[self.index])
+		self.index += 1
+		if commandIndex == 0:
+			lineLength = self.getVarint()
+			self.index += lineLength
+			return self.buffer[self.index - lineLength : self.index]
+		if commandIndex > len(globalCommandWords):
+			raise ValueError('The command index %s at byte %s is not in the command words.' % (commandIndex, self.index - 1))
+		words = [globalCommandWords[commandIndex - 1]]
+		flags = self.getVarint()
+		for letterIndex, letter in enumerate(globalWordLetters):
+			if flags & (1 << letterIndex) != 0:
+				zigZag = self.getVarint()
+				if zigZag & 1 == 1:
+					self.integerNumbers[letterIndex] -= (zigZag + 1) >> 1
+				else:
+					self.integerNumbers[letterIndex] += zigZag >> 1
+				words.append(letter + getNumberString(self.decimalPlaces, self.integerNumbers[letterIndex]))
+		return ' '.join(words)
+
+
+class BinaryGcodeWriter:
+	'A class to write gcode lines as a binary gcode string.'
+	def __init__(self, decimalPlaces, defaultFeedRate, isInches):
+		'Write the header.'
+		self.decimalPlaces = decimalPlaces
+		self.encodedLineCount = 0
+		self.integerNumbers = [0] * len(globalWordLetters)
+		self.output = cStringIO.StringIO()
+		self.scale = 10 ** decimalPlaces
+		self.textLineCount = 0
+		self.integerNumbers[globalWordLetters.find('F')] = max(int(round(defaultFeedRate * self.scale)), 0)
+		self.output.write(globalBinaryGcodeBeginning)
+		self.output.write(getVarintString(decimalPlaces))
+		self.output.write(getVarintString(int(isInches)))
+		self.output.write(getVarintString(self.integerNumbers[globalWordLetters.find('F')]))
+
+	def __repr__(self):
+		'Get the string representation of this BinaryGcodeWriter.'
+		return '%s, %s, %s' % (self.decimalPlaces, self.encodedLineCount, self.textLineCount)
+
+	def addLine(self, line):
+		'Add a gcode line as an encoded record if it can be read back exactly, otherwise as a text record.'
+		record = self.getRecord(line)
+		if record == None:
+			self.output.write('\x00' + getVarintString(len(line)) + line)
+			self.textLineCount += 1
+			return
+		self.output.write(record)
+		self.encodedLineCount += 1
+
+	def getBinaryGcode(self):
+		'Get the binary gcode string.'
+		return self.output.getvalue()
+
+	def getRecord(self, line):
+		'Get the encoded record of the line and update the last numbers, or None if the line would not be read back exactly.'
+		splitLine = line.split(' ')
+		if splitLine[0] not in globalCommandDictionary:
+			return None
+		flags = 0
+		integerNumbers = self.integerNumbers[:]
+		lastLetterIndex = -1
+		zigZagStrings = []
+		for word in splitLine[1 :]:
+			if word == '':
+				return None
+			letterIndex = globalWordLetters.find(word[0])
+			if letterIndex <= lastLetterIndex:
+				return None
+			try:
+				integerNumber = int(round(float(word[1 :]) * self.scale))
+			except ValueError:
+				return None
+			if word[1 :] != getNumberString(self.decimalPlaces, integerNumber):
+				return None
+			zigZagStrings.append(getVarintString(getZigZag(integerNumber - integerNumbers[letterIndex])))
+			integerNumbers[letterIndex] = integerNumber
+			flags |= 1 << letterIndex
+			lastLetterIndex = letterIndex
+		self.integerNumbers = integerNumbers
+		return chr(globalCommandDictionary[splitLine[0]]) + getVarintString(flags) + ''.join(zigZagStrings)
+
+
+def main():
+	'Check that the gcode files, or the gcode files in the skeinforge folder if there are none, are read back into the same text.'
+	fileNames = sys.argv[1 :]
+	if len(fileNames) < 1:
+		fileNames = getSampleFileNames()
+	isEveryRoundTrip = True
+	for fileName in fileNames:
+		message, isFileRoundTrip = getRoundTripMessage(fileName)
+		print(message)
+		isEveryRoundTrip = isEveryRoundTrip and isFileRoundTrip
+	if not isEveryRoundTrip:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
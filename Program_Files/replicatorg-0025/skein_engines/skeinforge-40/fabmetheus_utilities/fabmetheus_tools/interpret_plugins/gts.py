@@ -6,6 +6,8 @@ An import plugin is a script in the interpret_plugins folder which has the funct
 
 The getCarving function takes the file name of an gts file and returns the carving.
 
+The file is memory mapped and the lines are parsed in bulk, a chunk of lines at a time, into packed arrays of the vertex coordinates, of the edge vertex indexes and of the face edge indexes, from which the vertexes, edges and faces of the triangle mesh are made.  The garbage collector is paused while the objects are made.  If printing is turned on by triangle_mesh.setIsPrintingParseThroughput, the number of vertexes and faces, the time and the throughput of the parse are printed.
+
 The GNU Triangulated Surface (.gts) format is described at:
 http://gts.sourceforge.net/reference/gts-surfaces.html#GTS-SURFACE-WRITE
 
@@ -25,9 +27,13 @@ import __init__
 
 from fabmetheus_utilities.geometry.geometry_tools import face
 from fabmetheus_utilities.geometry.solids import triangle_mesh
-from fabmetheus_utilities.vector3 import Vector3
 from fabmetheus_utilities import archive
-from fabmetheus_utilities import gcodec
+import array
+import gc
+import itertools
+import operator
+import re
+import time
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
 __credits__ = 'Nophead <http://hydraraptor.blogspot.com/>\nArt of Illusion <http://www.artofillusion.org/>'
@@ -35,46 +41,66 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
-def getFromGNUTriangulatedSurfaceText( gnuTriangulatedSurfaceText, triangleMesh ):
-	"Initialize from a GNU Triangulated Surface Text."
-	if gnuTriangulatedSurfaceText == '':
+globalLinePattern = re.compile(r'^(?![#!])[ \t]*(\S+)[ \t]+(\S+)(?:[ \t]+(\S+))?', re.MULTILINE)
+
+
+def addEdgesGivenArray(edges, edgeVertexIndexArray):
+	'Add the edges of a packed array of vertex index pairs.'
+	for vertexIndex in xrange(0, len(edgeVertexIndexArray), 2):
+		edges.append(face.Edge().getFromVertexIndexes(len(edges), edgeVertexIndexArray[vertexIndex : vertexIndex + 2].tolist()))
+
+def addFacesGivenArray(faceEdgeIndexArray, triangleMesh):
+	'Add the faces of a packed array of edge index triples.'
+	edges = triangleMesh.edges
+	faces = triangleMesh.faces
+	for edgeIndexIndex in xrange(0, len(faceEdgeIndexArray), 3):
+		edgeIndexes = faceEdgeIndexArray[edgeIndexIndex : edgeIndexIndex + 3].tolist()
+		triangleFace = face.Face()
+		triangleFace.index = len(faces)
+		triangleFace.edgeIndexes = edgeIndexes
+		for edgeIndex in edgeIndexes:
+			edges[edgeIndex].faceIndexes.append(triangleFace.index)
+		edgeFirst, edgeSecond, edgeThird = edgeIndexes
+		triangleFace.vertexIndexes = [
+			face.getCommonVertexIndex(edges[edgeFirst], edges[edgeSecond]),
+			face.getCommonVertexIndex(edges[edgeThird], edges[edgeFirst]),
+			face.getCommonVertexIndex(edges[edgeSecond], edges[edgeThird])]
+		faces.append(triangleFace)
+
+def getCarving(fileName):
+	'Get the carving for the gts file.'
+	gnuTriangulatedSurfaceBuffer = archive.getFileBuffer(fileName)
+	if gnuTriangulatedSurfaceBuffer == '':
 		return None
-	lines = archive.getTextLines( gnuTriangulatedSurfaceText )
-	linesWithoutComments = []
-	for line in lines:
-		if len(line) > 0:
-			firstCharacter = line[0]
-			if firstCharacter != '#' and firstCharacter != '!':
-				linesWithoutComments.append(line)
-	splitLine = linesWithoutComments[0].split()
-	numberOfVertexes = int( splitLine[0] )
-	numberOfEdges = int(splitLine[1])
-	numberOfFaces = int( splitLine[2] )
-	faceTriples = []
-	for vertexIndex in xrange( numberOfVertexes ):
-		line = linesWithoutComments[ vertexIndex + 1 ]
-		splitLine = line.split()
-		vertex = Vector3( float( splitLine[0] ), float(splitLine[1]), float( splitLine[2] ) )
-		triangleMesh.vertexes.append(vertex)
-	edgeStart = numberOfVertexes + 1
-	for edgeIndex in xrange( numberOfEdges ):
-		line = linesWithoutComments[ edgeIndex + edgeStart ]
-		splitLine = line.split()
-		vertexIndexes = []
-		for word in splitLine[ : 2 ]:
-			vertexIndexes.append( int(word) - 1 )
-		edge = face.Edge().getFromVertexIndexes( edgeIndex, vertexIndexes )
-		triangleMesh.edges.append( edge )
-	faceStart = edgeStart + numberOfEdges
-	for faceIndex in xrange( numberOfFaces ):
-		line = linesWithoutComments[ faceIndex + faceStart ]
-		splitLine = line.split()
-		edgeIndexes = []
-		for word in splitLine[ : 3 ]:
-			edgeIndexes.append( int(word) - 1 )
-		triangleMesh.faces.append( face.Face().getFromEdgeIndexes( edgeIndexes, triangleMesh.edges, faceIndex ) )
+	numberOfBytes = len(gnuTriangulatedSurfaceBuffer)
+	startTime = time.time()
+	isGarbageCollectionEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		triangleMesh = getFromGNUTriangulatedSurfaceText(gnuTriangulatedSurfaceBuffer, triangle_mesh.TriangleMesh())
+	finally:
+		if isGarbageCollectionEnabled:
+			gc.enable()
+		gnuTriangulatedSurfaceBuffer.close()
+	if triangleMesh != None:
+		triangle_mesh.printParseThroughput(numberOfBytes, fileName, time.time() - startTime, triangleMesh)
 	return triangleMesh
 
-def getCarving(fileName):
-	"Get the carving for the gts file."
-	return getFromGNUTriangulatedSurfaceText( archive.getFileText(fileName), triangle_mesh.TriangleMesh() )
+def getFromGNUTriangulatedSurfaceText(gnuTriangulatedSurfaceText, triangleMesh):
+	'Initialize from a GNU Triangulated Surface text or memory mapped file.'
+	if gnuTriangulatedSurfaceText == '':
+		return None
+	lineWordsGenerator = archive.getMatchGroupsInBuffer(gnuTriangulatedSurfaceText, globalLinePattern)
+	headerWords = lineWordsGenerator.next()
+	numberOfVertexes = int(headerWords[0])
+	numberOfEdges = int(headerWords[1])
+	numberOfFaces = int(headerWords[2])
+	coordinateArray = array.array('d', map(float, itertools.chain.from_iterable(itertools.islice(lineWordsGenerator, numberOfVertexes))))
+	triangle_mesh.addVertexesByCoordinateArray(coordinateArray, triangleMesh.vertexes)
+	edgeVertexIndexPairs = itertools.imap(operator.itemgetter(0, 1), itertools.islice(lineWordsGenerator, numberOfEdges))
+	edgeVertexIndexArray = array.array('i', map((-1).__add__, map(int, itertools.chain.from_iterable(edgeVertexIndexPairs))))
+	addEdgesGivenArray(triangleMesh.edges, edgeVertexIndexArray)
+	faceEdgeIndexes = itertools.chain.from_iterable(itertools.islice(lineWordsGenerator, numberOfFaces))
+	faceEdgeIndexArray = array.array('i', map((-1).__add__, map(int, faceEdgeIndexes)))
+	addFacesGivenArray(faceEdgeIndexArray, triangleMesh)
+	return triangleMesh
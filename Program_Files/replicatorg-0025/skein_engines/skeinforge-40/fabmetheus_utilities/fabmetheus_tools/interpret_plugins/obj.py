@@ -8,6 +8,8 @@ An import plugin is a script in the interpret_plugins folder which has the funct
 
 The getCarving function takes the file name of an obj file and returns the carving.
 
+The file is memory mapped and the vertex and face lines are parsed in bulk, a chunk of lines at a time, into packed arrays of the coordinates and of the vertex indexes, from which the vertexes and faces of the triangle mesh are made.  The garbage collector is paused while the millions of small objects of a large mesh are made, because none of them can be garbage.  Only the first three vertexes of a face are read and the texture and normal indexes are ignored.  If printing is turned on by triangle_mesh.setIsPrintingParseThroughput, the number of vertexes and faces, the time and the throughput of the parse are printed.
+
 From wikipedia, OBJ (or .OBJ) is a geometry definition file format first developed by Wavefront Technologies for its Advanced Visualizer animation package:
 http://en.wikipedia.org/wiki/Obj
 
@@ -24,12 +26,13 @@ from __future__ import absolute_import
 #Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
 import __init__
 
-from fabmetheus_utilities.geometry.geometry_tools import face
 from fabmetheus_utilities.geometry.solids import triangle_mesh
-from fabmetheus_utilities.vector3 import Vector3
 from fabmetheus_utilities import archive
-from fabmetheus_utilities import gcodec
-from struct import unpack
+import array
+import gc
+import itertools
+import re
+import time
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
 __credits__ = 'Nophead <http://hydraraptor.blogspot.com/>\nArt of Illusion <http://www.artofillusion.org/>'
@@ -37,42 +40,34 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
-def addFacesGivenText( objText, triangleMesh ):
-	"Add faces given obj text."
-	lines = archive.getTextLines( objText )
-	for line in lines:
-		splitLine = line.split()
-		firstWord = gcodec.getFirstWord(splitLine)
-		if firstWord == 'v':
-			triangleMesh.vertexes.append( getVertexGivenLine(line) )
-		elif firstWord == 'f':
-			triangleMesh.faces.append( getFaceGivenLine( line, triangleMesh ) )
-
-def getFaceGivenLine( line, triangleMesh ):
-	"Add face given line index and lines."
-	faceGivenLine = face.Face()
-	faceGivenLine.index = len( triangleMesh.faces )
-	splitLine = line.split()
-	for vertexStringIndex in xrange( 1, 4 ):
-		vertexString = splitLine[ vertexStringIndex ]
-		vertexStringWithSpaces = vertexString.replace('/', ' ')
-		vertexStringSplit = vertexStringWithSpaces.split()
-		vertexIndex = int( vertexStringSplit[0] ) - 1
-		faceGivenLine.vertexIndexes.append(vertexIndex)
-	return faceGivenLine
+globalFacePattern = re.compile(r'^[ \t]*f[ \t]+(-?\d+)\S*[ \t]+(-?\d+)\S*[ \t]+(-?\d+)', re.MULTILINE)
+globalVertexPattern = re.compile(r'^[ \t]*v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+
+
+def addFacesGivenText(objText, triangleMesh):
+	'Add faces given obj text or a memory mapped obj file.'
+	coordinateArray = array.array('d', map(float, itertools.chain.from_iterable(archive.getMatchGroupsInBuffer(objText, globalVertexPattern))))
+	triangle_mesh.addVertexesByCoordinateArray(coordinateArray, triangleMesh.vertexes)
+	vertexIndexArray = array.array('i', map(int, itertools.chain.from_iterable(archive.getMatchGroupsInBuffer(objText, globalFacePattern))))
+	triangle_mesh.addFacesByVertexIndexArray(triangleMesh.faces, array.array('i', map((-1).__add__, vertexIndexArray)))
 
 def getCarving(fileName=''):
-	"Get the triangle mesh for the obj file."
+	'Get the triangle mesh for the obj file.'
 	if fileName == '':
 		return None
-	objText = archive.getFileText(fileName, True, 'rb')
-	if objText == '':
+	objBuffer = archive.getFileBuffer(fileName)
+	if objBuffer == '':
 		return None
+	numberOfBytes = len(objBuffer)
+	startTime = time.time()
 	triangleMesh = triangle_mesh.TriangleMesh()
-	addFacesGivenText(objText, triangleMesh)
+	isGarbageCollectionEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		addFacesGivenText(objBuffer, triangleMesh)
+	finally:
+		if isGarbageCollectionEnabled:
+			gc.enable()
+		objBuffer.close()
+	triangle_mesh.printParseThroughput(numberOfBytes, fileName, time.time() - startTime, triangleMesh)
 	return triangleMesh
-
-def getVertexGivenLine(line):
-	"Get vertex given obj vertex line."
-	splitLine = line.split()
-	return Vector3( float(splitLine[1]), float( splitLine[2] ), float( splitLine[3] ) )
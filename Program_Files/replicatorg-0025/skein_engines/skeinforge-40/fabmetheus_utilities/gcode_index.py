@@ -0,0 +1,257 @@
+"""
+Gcode_index is a collection of utilities to index the layers of a gcode file in a sidecar file, so that a viewer or an analyzer can seek straight to a layer instead of reading and splitting the whole file.
+
+The index is made in one pass over the memory mapped gcode, a chunk of whole lines at a time.  For each (<layer> tag it records the byte offset and byte length of the layer, the index and the number of its lines, its z, the bounding box of its extruded moves, and the location, which is None before the first move, and the extruder state before its first line, so that the layer can be parsed by itself.  A layer ends at its (</layer>) tag, or if there is none, at the next layer or at the end of the file.
+
+The index is saved beside the gcode file, with the name of the gcode file followed by _layer_index.txt, in tab separated lines.  When the gcode file is newer than the index, the md5 of the indexed bytes is compared with the md5 in the index, and if the file was only appended to, only the last layer and the appended bytes are indexed again.
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import archive
+import hashlib
+import os
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/02/05 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalIndexBeginning = 'Format is tab separated gcode layer index.'
+globalLayerColumnNames = 'Byte Offset	Byte Length	Line Index	Line Count	Z	Minimum X	Minimum Y	Maximum X	Maximum Y	Start X	Start Y	Start Z	Extruder Active'
+
+
+def getGcodeIndex(fileName):
+	'Get the layer index of a gcode file, from the sidecar file if it is up to date, otherwise index the new part of the file and save the sidecar file.'
+	gcodeIndex = GcodeIndex(fileName)
+	indexFileName = getIndexFileName(fileName)
+	if not os.path.isfile(fileName):
+		return gcodeIndex
+	if os.path.isfile(indexFileName):
+		gcodeIndex.setFromText(archive.getFileText(indexFileName))
+		if os.path.getsize(fileName) == gcodeIndex.fileSize and os.path.getmtime(indexFileName) >= os.path.getmtime(fileName):
+			return gcodeIndex
+	gcodeIndex.update(archive.getFileBuffer(fileName))
+	archive.writeFileText(indexFileName, gcodeIndex.getIndexText())
+	return gcodeIndex
+
+def getIndexedLayerFromIndexLine(indexLine):
+	'Get an indexed layer from a tab separated line of the index.'
+	words = indexLine.split('\t')
+	startLocation = None
+	if words[9] != 'None':
+		startLocation = [float(word) for word in words[9 : 12]]
+	layer = IndexedLayer(int(words[0]), int(words[2]), startLocation, words[12] == '1')
+	layer.byteLength = int(words[1])
+	layer.lineCount = int(words[3])
+	layer.z = float(words[4])
+	if words[5] != 'None':
+		layer.cornerMinimum = complex(float(words[5]), float(words[6]))
+		layer.cornerMaximum = complex(float(words[7]), float(words[8]))
+	return layer
+
+def getIndexFileName(fileName):
+	'Get the file name of the layer index of a gcode file.'
+	return archive.getFilePathWithUnderscoredBasename(fileName, '_layer_index.txt')
+
+def getLocationFromLine(line, oldLocation):
+	'Get the location list from the X, Y and Z words of a gcode line, and the old location for the axes which are not in the line.'
+	location = [0.0, 0.0, 0.0]
+	if oldLocation != None:
+		location = oldLocation[:]
+	for word in line.split(';')[0].split('(')[0].split()[1 :]:
+		axisIndex = 'XYZ'.find(word[: 1])
+		if axisIndex > -1:
+			try:
+				location[axisIndex] = float(word[1 :])
+			except ValueError:
+				pass
+	return location
+
+def getMD5(buffer, beginning, end, md5=None):
+	'Get the md5 of a part of a text or memory mapped buffer, updating the md5 a chunk at a time so that the buffer is not copied whole.'
+	if md5 == None:
+		md5 = hashlib.md5()
+	for chunkBeginning in xrange(beginning, end, archive.globalBufferChunkLength):
+		md5.update(buffer[chunkBeginning : min(chunkBeginning + archive.globalBufferChunkLength, end)])
+	return md5
+
+
+class GcodeIndex:
+	'A class to hold the layer index of a gcode file.'
+	def __init__(self, fileName):
+		'Initialize.'
+		self.buffer = None
+		self.fileName = fileName
+		self.fileSize = 0
+		self.layers = []
+		self.md5 = ''
+
+	def __repr__(self):
+		'Get the string representation of this GcodeIndex.'
+		return '%s, %s, %s' % (self.fileName, self.fileSize, self.layers)
+
+	def getCorners(self):
+		'Get the minimum and maximum complex corners of the extruded moves of all the layers, which are None if nothing is extruded.'
+		cornerMaximum = None
+		cornerMinimum = None
+		for layer in self.layers:
+			if layer.cornerMaximum != None:
+				if cornerMaximum == None:
+					cornerMaximum = layer.cornerMaximum
+					cornerMinimum = layer.cornerMinimum
+				cornerMaximum = complex(max(cornerMaximum.real, layer.cornerMaximum.real), max(cornerMaximum.imag, layer.cornerMaximum.imag))
+				cornerMinimum = complex(min(cornerMinimum.real, layer.cornerMinimum.real), min(cornerMinimum.imag, layer.cornerMinimum.imag))
+		return cornerMinimum, cornerMaximum
+
+	def getHeaderText(self):
+		'Get the gcode text before the first layer, read from the memory mapped file.'
+		if self.buffer == None:
+			self.buffer = archive.getFileBuffer(self.fileName)
+		if len(self.layers) < 1:
+			return self.buffer[:]
+		return self.buffer[: self.layers[0].byteOffset]
+
+	def getIndexText(self):
+		'Get the tab separated text of the index.'
+		indexLines = [globalIndexBeginning, 'File Size\t%s' % self.fileSize, 'MD5\t%s' % self.md5, globalLayerColumnNames]
+		for layer in self.layers:
+			indexLines.append(layer.getIndexLine())
+		return '\n'.join(indexLines) + '\n'
+
+	def getLayerText(self, layerIndex):
+		'Get the gcode text of a layer, read from the memory mapped file.'
+		if self.buffer == None:
+			self.buffer = archive.getFileBuffer(self.fileName)
+		layer = self.layers[layerIndex]
+		return self.buffer[layer.byteOffset : layer.byteOffset + layer.byteLength]
+
+	def parseBuffer(self, buffer, byteOffset, lineIndex, location, isExtruderActive):
+		'Parse the buffer from the byte offset, a chunk of whole lines at a time, and add its layers.'
+		layer = None
+		while byteOffset < len(buffer):
+			chunkEnd = buffer.find('\n', byteOffset + archive.globalBufferChunkLength) + 1
+			if chunkEnd < 1:
+				chunkEnd = len(buffer)
+			for line in buffer[byteOffset : chunkEnd].split('\n'):
+				lineEnd = byteOffset + len(line) + 1
+				splitLine = line.split(None, 1)
+				firstWord = ''
+				if len(splitLine) > 0:
+					firstWord = splitLine[0]
+				if firstWord == 'G1':
+					location = getLocationFromLine(line, location)
+					if layer != None and layer.byteLength == None and isExtruderActive:
+						layer.addPoint(location)
+				elif firstWord == 'M101':
+					isExtruderActive = True
+				elif firstWord == 'M103':
+					isExtruderActive = False
+				elif firstWord == '(<layer>':
+					if layer != None and layer.byteLength == None:
+						layer.setEnd(byteOffset, lineIndex)
+					layer = IndexedLayer(byteOffset, lineIndex, location, isExtruderActive)
+					layer.setZ(line)
+					self.layers.append(layer)
+				elif firstWord == '(</layer>)' and layer != None and layer.byteLength == None:
+					layer.setEnd(min(lineEnd, len(buffer)), lineIndex + 1)
+				if lineEnd <= chunkEnd or line != '':
+					byteOffset = min(lineEnd, chunkEnd)
+					lineIndex += 1
+			byteOffset = chunkEnd
+		if layer != None and layer.byteLength == None:
+			layer.setEnd(len(buffer), lineIndex)
+
+	def setFromText(self, indexText):
+		'Set the index from the tab separated text of the index, leaving it empty if the text is not an index.'
+		indexLines = archive.getTextLines(indexText)
+		if len(indexLines) < 4 or indexLines[0] != globalIndexBeginning or indexLines[3] != globalLayerColumnNames:
+			return
+		self.fileSize = int(indexLines[1].split('\t')[1])
+		self.md5 = indexLines[2].split('\t')[1]
+		for indexLine in indexLines[4 :]:
+			if indexLine != '':
+				self.layers.append(getIndexedLayerFromIndexLine(indexLine))
+
+	def update(self, buffer):
+		'Index the buffer, only from the last layer on if the indexed bytes are unchanged, otherwise from the beginning.'
+		md5 = None
+		if self.fileSize > 0 and self.fileSize <= len(buffer):
+			md5 = getMD5(buffer, 0, self.fileSize)
+			if md5.hexdigest() != self.md5:
+				md5 = None
+		if md5 == None or len(self.layers) < 1:
+			self.layers = []
+			self.parseBuffer(buffer, 0, 0, None, False)
+			md5 = getMD5(buffer, 0, len(buffer))
+		else:
+			lastLayer = self.layers.pop()
+			self.parseBuffer(buffer, lastLayer.byteOffset, lastLayer.lineIndex, lastLayer.startLocation, lastLayer.isExtruderActive)
+			md5 = getMD5(buffer, self.fileSize, len(buffer), md5)
+		self.buffer = buffer
+		self.fileSize = len(buffer)
+		self.md5 = md5.hexdigest()
+
+
+class IndexedLayer:
+	'A class to hold the index of a layer.'
+	def __init__(self, byteOffset, lineIndex, startLocation, isExtruderActive):
+		'Initialize.'
+		self.byteLength = None
+		self.byteOffset = byteOffset
+		self.cornerMaximum = None
+		self.cornerMinimum = None
+		self.isExtruderActive = isExtruderActive
+		self.lineCount = 0
+		self.lineIndex = lineIndex
+		self.startLocation = startLocation
+		self.z = 0.0
+		if startLocation != None:
+			self.z = startLocation[2]
+
+	def __repr__(self):
+		'Get the string representation of this IndexedLayer.'
+		return '%s, %s, %s' % (self.z, self.byteOffset, self.lineCount)
+
+	def addPoint(self, location):
+		'Add an extruded point to the bounding box.'
+		point = complex(location[0], location[1])
+		if self.cornerMaximum == None:
+			self.cornerMaximum = point
+			self.cornerMinimum = point
+			return
+		self.cornerMaximum = complex(max(self.cornerMaximum.real, point.real), max(self.cornerMaximum.imag, point.imag))
+		self.cornerMinimum = complex(min(self.cornerMinimum.real, point.real), min(self.cornerMinimum.imag, point.imag))
+
+	def getIndexLine(self):
+		'Get the tab separated line of the layer.'
+		words = [self.byteOffset, self.byteLength, self.lineIndex, self.lineCount, self.z]
+		if self.cornerMaximum == None:
+			words += [None] * 4
+		else:
+			words += [self.cornerMinimum.real, self.cornerMinimum.imag, self.cornerMaximum.real, self.cornerMaximum.imag]
+		if self.startLocation == None:
+			words += [None] * 3
+		else:
+			words += self.startLocation
+		words.append(int(self.isExtruderActive))
+		return '\t'.join([repr(word) for word in words])
+
+	def setEnd(self, byteEnd, lineEnd):
+		'Set the byte length and the line count from the end of the layer.'
+		self.byteLength = byteEnd - self.byteOffset
+		self.lineCount = lineEnd - self.lineIndex
+
+	def setZ(self, line):
+		'Set the z from the layer tag line, or leave it the z of the start location if there is no z in the tag.'
+		splitLine = line.split()
+		if len(splitLine) > 1:
+			try:
+				self.z = float(splitLine[1])
+			except ValueError:
+				pass
+
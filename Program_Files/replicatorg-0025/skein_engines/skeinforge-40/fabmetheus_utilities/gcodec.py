@@ -35,6 +35,10 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalProcedureLinesTable = None
+globalSplitLineTable = None
+
+
 def addLineAndNewlineIfNecessary(line, output):
 	'Add the line and if the line does not end with a newline add a newline.'
 	output.write(line)
@@ -144,7 +148,38 @@ def getLocationFromSplitLine(oldLocation, splitLine):
 		getDoubleFromCharacterSplitLineValue('Y', splitLine, oldLocation.y),
 		getDoubleFromCharacterSplitLineValue('Z', splitLine, oldLocation.z))
 
+def getProcedureLines(gcodeText):
+	'Get the lines and split lines before the extrusion start which could name a procedure, parsing each text only once if the procedure lines table is being used.'
+	if globalProcedureLinesTable != None:
+		if gcodeText in globalProcedureLinesTable:
+			return globalProcedureLinesTable[gcodeText]
+	procedureLines = []
+	for line in archive.getTextLines(gcodeText):
+		if line.find('procedureName') == -1 and line.find('extrusionStart') == -1:
+			continue
+		withoutBracketsEqualTabQuotes = getWithoutBracketsEqualTab(line).replace('"', '').replace("'", '')
+		splitLine = getWithoutBracketsEqualTab( withoutBracketsEqualTabQuotes ).split()
+		if getFirstWord(splitLine) == 'extrusionStart':
+			break
+		if 'procedureName' in splitLine:
+			procedureLines.append((line, splitLine))
+	if globalProcedureLinesTable != None:
+		if len(globalProcedureLinesTable) > 7:
+			globalProcedureLinesTable.clear()
+		globalProcedureLinesTable[gcodeText] = procedureLines
+	return procedureLines
+
 def getSplitLineBeforeBracketSemicolon(line):
+	'Get the split line before a bracket or semicolon, from the split line table if it is being used.'
+	if globalSplitLineTable != None:
+		if line in globalSplitLineTable:
+			return globalSplitLineTable[line]
+		splitLine = getSplitLineBeforeBracketSemicolonWithoutTable(line)
+		globalSplitLineTable[line] = splitLine
+		return splitLine
+	return getSplitLineBeforeBracketSemicolonWithoutTable(line)
+
+def getSplitLineBeforeBracketSemicolonWithoutTable(line):
 	'Get the split line before a bracket or semicolon.'
 	line = line.split(';')[0]
 	bracketIndex = line.find('(')
@@ -170,24 +205,17 @@ def isProcedureDone(gcodeText, procedure):
 	'Determine if the procedure has been done on the gcode text.'
 	if gcodeText == '':
 		return False
-	lines = archive.getTextLines(gcodeText)
-	for line in lines:
-		withoutBracketsEqualTabQuotes = getWithoutBracketsEqualTab(line).replace('"', '').replace("'", '')
-		splitLine = getWithoutBracketsEqualTab( withoutBracketsEqualTabQuotes ).split()
-		firstWord = getFirstWord(splitLine)
-		if firstWord == 'procedureName':
+	for line, splitLine in getProcedureLines(gcodeText):
+		if splitLine[0] == 'procedureName':
 			if splitLine[1].find(procedure) != -1:
 				return True
-		elif firstWord == 'extrusionStart':
-			return False
 		procedureIndex = line.find(procedure)
 		if procedureIndex != -1:
-			if 'procedureName' in splitLine:
-				nextIndex = splitLine.index('procedureName') + 1
-				if nextIndex < len(splitLine):
-					nextWordSplit = splitLine[nextIndex].split(',')
-					if procedure in nextWordSplit:
-						return True
+			nextIndex = splitLine.index('procedureName') + 1
+			if nextIndex < len(splitLine):
+				nextWordSplit = splitLine[nextIndex].split(',')
+				if procedure in nextWordSplit:
+					return True
 	return False
 
 def isProcedureDoneOrFileIsEmpty(gcodeText, procedure):
@@ -212,6 +240,16 @@ def isThereAFirstWord(firstWord, lines, startIndex):
 			return True
 	return False
 
+def setProcedureLinesTable(procedureLinesTable):
+	'Set the table which shares the procedure lines of the texts of a chain, or turn it off and release the texts if the table is None.'
+	global globalProcedureLinesTable
+	globalProcedureLinesTable = procedureLinesTable
+
+def setSplitLineTable(splitLineTable):
+	'Set the table which shares the split lines between the tools of a chain, or turn it off if the table is None.'
+	global globalSplitLineTable
+	globalSplitLineTable = splitLineTable
+
 
 class BoundingRectangle:
 	'A class to get the corners of a gcode text.'
@@ -4,6 +4,10 @@ http://www.cs.otago.ac.nz/graphics/Mirage/node59.html
 http://en.wikipedia.org/wiki/Heightmap
 http://en.wikipedia.org/wiki/Netpbm_format
 
+The heightmap file can be a Netpbm bitmap or graymap, in the plain text P1 and P2 formats or in the binary P4 and P5 formats.  The file is memory mapped and read into a height grid, which is a list of rows of double arrays, so the binary formats of large heightmaps are read without holding the file text or a float object for each height.  The vertexes of each row are made in one step and the faces of the top are added directly from the vertex indexes.
+
+If the flatTolerance attribute is set, the top is decimated.  The cells are grouped into a quadtree of square blocks, and each block whose heights are all within the flat tolerance of each other is covered by a fan of faces around its center, instead of two faces for each cell.  The vertexes inside the flat blocks are not made, while the vertexes on the perimeters of the blocks are kept so that the top stays watertight.  The flat tolerance is in the units of the height grid, where one is the full height.
+
 """
 
 from __future__ import absolute_import
@@ -12,6 +16,7 @@ import __init__
 
 from fabmetheus_utilities.geometry.creation import lineation
 from fabmetheus_utilities.geometry.creation import solid
+from fabmetheus_utilities.geometry.geometry_tools import face
 from fabmetheus_utilities.geometry.geometry_tools import path
 from fabmetheus_utilities.geometry.geometry_utilities import evaluate
 from fabmetheus_utilities.geometry.solids import triangle_mesh
@@ -19,8 +24,13 @@ from fabmetheus_utilities.vector3 import Vector3
 from fabmetheus_utilities.vector3index import Vector3Index
 from fabmetheus_utilities import archive
 from fabmetheus_utilities import euclidean
+import array
+import itertools
 import math
+import mmap
+import os
 import random
+import sys
 
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
@@ -29,30 +39,90 @@ __date__ = '$Date: 2008/02/05 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
-def addHeightsByBitmap(heights, textLines):
-	'Add heights by bitmap.'
-	for line in textLines[3:]:
-		for integerWord in line.split():
-			heights.append(float(integerWord))
+globalBitHeights = [[float((byte >> bitIndex) & 1) for bitIndex in xrange(7, -1, -1)] for byte in xrange(256)]
+globalNetpbmFormats = ['p1', 'p2', 'p4', 'p5']
+globalNotFlatMaximum = 987654321.0
+
 
-def addHeightsByGraymap(heights, textLines):
-	'Add heights by graymap.'
-	divisor = float(textLines[3])
-	for line in textLines[4:]:
-		for integerWord in line.split():
-			heights.append(float(integerWord) / divisor)
+def addFace(faces, indexBegin, indexCenter, indexEnd):
+	'Add a face with the vertex indexes.'
+	triangleFace = face.Face()
+	triangleFace.index = len(faces)
+	triangleFace.vertexIndexes = [indexBegin, indexCenter, indexEnd]
+	faces.append(triangleFace)
+
+def addFacesByBlock(block, faces, indexedHeightGrid, minimumXY, step, top, vertexes):
+	'Add the faces of a block, two faces for a cell or a fan of faces around the center for a flat block.'
+	rowIndex, columnIndex, size, height = block
+	if size == 1:
+		rowBottom = indexedHeightGrid[rowIndex]
+		rowTop = indexedHeightGrid[rowIndex + 1]
+		addFacesByCell(faces, rowBottom[columnIndex].index, rowBottom[columnIndex + 1].index, rowTop[columnIndex + 1].index, rowTop[columnIndex].index)
+		return
+	halfSize = 0.5 * float(size)
+	center = Vector3Index(len(vertexes), step.real * (float(columnIndex) + halfSize) + minimumXY.real, step.imag * (float(rowIndex) + halfSize) + minimumXY.imag, top * height)
+	vertexes.append(center)
+	perimeter = indexedHeightGrid[rowIndex][columnIndex : columnIndex + size]
+	rowEnd = rowIndex + size
+	columnEnd = columnIndex + size
+	for perimeterRowIndex in xrange(rowIndex, rowEnd):
+		perimeter.append(indexedHeightGrid[perimeterRowIndex][columnEnd])
+	perimeter += indexedHeightGrid[rowEnd][columnEnd : columnIndex : -1]
+	for perimeterRowIndex in xrange(rowEnd, rowIndex, -1):
+		perimeter.append(indexedHeightGrid[perimeterRowIndex][columnIndex])
+	for pointIndex in xrange(len(perimeter)):
+		addFace(faces, center.index, perimeter[pointIndex - 1].index, perimeter[pointIndex].index)
+
+def addFacesByCell(faces, indexBottomBegin, indexBottomEnd, indexTopEnd, indexTopBegin):
+	'Add the two faces of a cell, skipping a degenerate face like triangle_mesh.addFacesByConvex does.'
+	if indexBottomBegin != indexBottomEnd and indexBottomEnd != indexTopEnd and indexTopEnd != indexBottomBegin:
+		addFace(faces, indexBottomBegin, indexBottomEnd, indexTopEnd)
+	if indexBottomBegin != indexTopEnd and indexTopEnd != indexTopBegin and indexTopBegin != indexBottomBegin:
+		addFace(faces, indexBottomBegin, indexTopEnd, indexTopBegin)
+
+def addFacesByIndexedHeightGrid(faces, indexedHeightGrid):
+	'Add the faces of the cells of the indexed heightGrid, in the same order as triangle_mesh.addFacesByGrid.'
+	for rowIndex in xrange(len(indexedHeightGrid) - 1):
+		rowBottom = indexedHeightGrid[rowIndex]
+		rowTop = indexedHeightGrid[rowIndex + 1]
+		for columnIndex in xrange(len(rowBottom) - 1):
+			addFacesByCell(faces, rowBottom[columnIndex].index, rowBottom[columnIndex + 1].index, rowTop[columnIndex + 1].index, rowTop[columnIndex].index)
 
 def getAddIndexedHeightGrid(heightGrid, minimumXY, step, top, vertexes):
 	'Get and add an indexed heightGrid.'
+	columnOffsets = getColumnOffsets(len(heightGrid[0]), minimumXY, step)
+	indexedHeightGrid = []
+	for rowIndex, row in enumerate(heightGrid):
+		rowOffset = step.imag * float(rowIndex) + minimumXY.imag
+		vertexIndex = len(vertexes)
+		indexedRow = map(Vector3Index, xrange(vertexIndex, vertexIndex + len(row)), columnOffsets, [rowOffset] * len(row), map(top.__mul__, row))
+		indexedHeightGrid.append(indexedRow)
+		vertexes += indexedRow
+	return indexedHeightGrid
+
+def getAddIndexedHeightGridByBlocks(blocks, heightGrid, minimumXY, step, top, vertexes):
+	'Get and add an indexed heightGrid which only has the vertexes of the cells and of the perimeters of the flat blocks, the other elements are None.'
+	numberOfColumns = len(heightGrid[0])
+	isUsedRows = []
+	for row in heightGrid:
+		isUsedRows.append(bytearray(numberOfColumns))
+	for rowIndex, columnIndex, size, height in blocks:
+		rowEnd = rowIndex + size
+		columnEnd = columnIndex + size
+		isUsedRows[rowIndex][columnIndex : columnEnd + 1] = '\x01' * (size + 1)
+		isUsedRows[rowEnd][columnIndex : columnEnd + 1] = '\x01' * (size + 1)
+		for perimeterRowIndex in xrange(rowIndex + 1, rowEnd):
+			isUsedRows[perimeterRowIndex][columnIndex] = 1
+			isUsedRows[perimeterRowIndex][columnEnd] = 1
+	columnOffsets = getColumnOffsets(numberOfColumns, minimumXY, step)
 	indexedHeightGrid = []
 	for rowIndex, row in enumerate(heightGrid):
-		indexedRow = []
+		indexedRow = [None] * numberOfColumns
 		indexedHeightGrid.append(indexedRow)
 		rowOffset = step.imag * float(rowIndex) + minimumXY.imag
-		for columnIndex, element in enumerate(row):
-			columnOffset = step.real * float(columnIndex) + minimumXY.real
-			vector3index = Vector3Index(len(vertexes), columnOffset, rowOffset, top * element)
-			indexedRow.append(vector3index)
+		for columnIndex in itertools.compress(xrange(numberOfColumns), isUsedRows[rowIndex]):
+			vector3index = Vector3Index(len(vertexes), columnOffsets[columnIndex], rowOffset, top * row[columnIndex])
+			indexedRow[columnIndex] = vector3index
 			vertexes.append(vector3index)
 	return indexedHeightGrid
 
@@ -87,6 +157,13 @@ def getAddIndexedSegmentedPerimeter(heightGrid, maximumXY, minimumXY, step, vert
 		indexedSegmentedPerimeter.append(vector3index)
 	return indexedSegmentedPerimeter
 
+def getColumnOffsets(numberOfColumns, minimumXY, step):
+	'Get the x offsets of the columns of a heightGrid.'
+	columnOffsets = []
+	for columnIndex in xrange(numberOfColumns):
+		columnOffsets.append(step.real * float(columnIndex) + minimumXY.real)
+	return columnOffsets
+
 def getGeometryOutput(xmlElement):
 	'Get vector3 vertexes from attribute dictionary.'
 	derivation = HeightmapDerivation(xmlElement)
@@ -130,50 +207,151 @@ def getGeometryOutputByHeightGrid(derivation, heightGrid, xmlElement):
 	vertexes = []
 	indexedBottomLoop = getAddIndexedSegmentedPerimeter(heightGrid, inradiusComplex, minimumXY, step, vertexes)
 	indexedLoops = [indexedBottomLoop]
-	indexedGridTop = getAddIndexedHeightGrid(heightGrid, minimumXY, step, top, vertexes)
+	if derivation.flatTolerance == None:
+		indexedGridTop = getAddIndexedHeightGrid(heightGrid, minimumXY, step, top, vertexes)
+		indexedLoops.append(triangle_mesh.getIndexedLoopFromIndexedGrid(indexedGridTop))
+		vertexes = triangle_mesh.getUniqueVertexes(indexedLoops + indexedGridTop)
+		triangle_mesh.addFacesByLoopReversed(faces, indexedLoops[0])
+		triangle_mesh.addFacesByConvexLoops(faces, indexedLoops)
+		addFacesByIndexedHeightGrid(faces, indexedGridTop)
+		return triangle_mesh.getGeometryOutputByFacesVertexes(faces, vertexes)
+	blocks = FlatBlockQuadtree(derivation.flatTolerance, heightGrid).blocks
+	indexedGridTop = getAddIndexedHeightGridByBlocks(blocks, heightGrid, minimumXY, step, top, vertexes)
 	indexedLoops.append(triangle_mesh.getIndexedLoopFromIndexedGrid(indexedGridTop))
-	vertexes = triangle_mesh.getUniqueVertexes(indexedLoops + indexedGridTop)
-	triangle_mesh.addPillarFromConvexLoopsGridTop(faces, indexedGridTop, indexedLoops)
+	usedRows = []
+	for indexedRow in indexedGridTop:
+		usedRows.append([vertex for vertex in indexedRow if vertex != None])
+	originalUsedRows = [usedRow[:] for usedRow in usedRows]
+	vertexes = triangle_mesh.getUniqueVertexes(indexedLoops + usedRows)
+	for originalUsedRow, usedRow in zip(originalUsedRows, usedRows):
+		for originalVertex, uniqueVertex in zip(originalUsedRow, usedRow):
+			originalVertex.index = uniqueVertex.index
+	triangle_mesh.addFacesByLoopReversed(faces, indexedLoops[0])
+	triangle_mesh.addFacesByConvexLoops(faces, indexedLoops)
+	for block in blocks:
+		addFacesByBlock(block, faces, indexedGridTop, minimumXY, step, top, vertexes)
 	return triangle_mesh.getGeometryOutputByFacesVertexes(faces, vertexes)
 
+def getCombinedLevel(function, level, sentinel):
+	'Get the next level of a quadtree level, combining each two by two square of values with the function.'
+	combinedLevel = []
+	for rowIndex in xrange(0, len(level), 2):
+		rowBottom = level[rowIndex]
+		if rowIndex + 1 < len(level):
+			row = map(function, rowBottom, level[rowIndex + 1])
+		else:
+			row = map(function, rowBottom, [sentinel] * len(rowBottom))
+		if len(row) % 2 == 1:
+			row.append(sentinel)
+		combinedLevel.append(array.array('d', map(function, row[: : 2], row[1 : : 2])))
+	return combinedLevel
+
 def getHeightGrid(fileName):
 	'Get heightGrid by fileName.'
 	if 'models/' not in fileName:
 		print('Warning, models/ was not in the absolute file path, so for security nothing will be done for:')
-		print(xmlElement)
-		print('For which the absolute file path is:')
 		print(fileName)
 		print('The heightmap tool can only read a file which has models/ in the file path.')
 		print('To import the file, move the file into a folder called model/ or a subfolder which is inside the model folder tree.')
-		return
-	pgmText = archive.getFileText(fileName)
-	textLines = archive.getTextLines(pgmText)
-	format = textLines[0].lower()
-	sizeWords = textLines[2].split()
-	numberOfColumns = int(sizeWords[0])
-	numberOfRows = int(sizeWords[1])
-	heights = []
-	if format == 'p1':
-		addHeightsByBitmap(heights, textLines)
-	elif format == 'p2':
-		addHeightsByGraymap(heights, textLines)
-	else:
+		return []
+	try:
+		netpbmFile = open(fileName, 'rb')
+	except IOError:
+		print('The file ' + fileName + ' does not exist.')
+		return []
+	try:
+		if os.fstat(netpbmFile.fileno()).st_size < 1:
+			return []
+		netpbmBuffer = mmap.mmap(netpbmFile.fileno(), 0, access=mmap.ACCESS_READ)
+	finally:
+		netpbmFile.close()
+	try:
+		return getHeightGridByNetpbmBuffer(fileName, netpbmBuffer)
+	finally:
+		netpbmBuffer.close()
+
+def getHeightGridByNetpbmBuffer(fileName, netpbmBuffer):
+	'Get heightGrid from the buffer of a Netpbm bitmap or graymap.'
+	format = netpbmBuffer[: 2].lower()
+	if format not in globalNetpbmFormats:
 		print('Warning, the file format was not recognized for:')
 		print(fileName)
 		print('Heightmap can only read the Netpbm Portable bitmap format and the Netpbm Portable graymap format.')
 		print('The Netpbm formats are described at:')
 		print('http://en.wikipedia.org/wiki/Netpbm_format')
 		return []
+	numberOfHeaderWords = 3
+	if format in ['p2', 'p5']:
+		numberOfHeaderWords = 4
+	headerWords, dataIndex = getNetpbmHeaderWordsDataIndex(netpbmBuffer, numberOfHeaderWords)
+	numberOfColumns = int(headerWords[1])
+	numberOfRows = int(headerWords[2])
+	divisor = 1.0
+	if numberOfHeaderWords > 3:
+		divisor = float(headerWords[3])
+	if format == 'p4':
+		return getHeightGridByPackedBits(dataIndex, netpbmBuffer, numberOfColumns, numberOfRows)
+	if format == 'p5':
+		return getHeightGridByBinaryGraymap(dataIndex, divisor, netpbmBuffer, numberOfColumns, numberOfRows)
+	heights = array.array('d')
+	netpbmBuffer.seek(dataIndex)
+	for line in iter(netpbmBuffer.readline, ''):
+		heights.extend(map(divisor.__rtruediv__, map(float, line.split())))
+	heightGrid = []
+	for rowIndex in xrange(numberOfRows):
+		heightIndex = rowIndex * numberOfColumns
+		heightGrid.append(heights[heightIndex : heightIndex + numberOfColumns])
+	return heightGrid
+
+def getHeightGridByBinaryGraymap(dataIndex, divisor, netpbmBuffer, numberOfColumns, numberOfRows):
+	'Get heightGrid from the binary P5 graymap data, which has one byte per height or two big endian bytes if the maximum is over 255.'
+	typeCode = 'B'
+	if divisor > 255.0:
+		typeCode = 'H'
+	heightGrid = []
+	rowLength = numberOfColumns * array.array(typeCode).itemsize
+	for rowIndex in xrange(numberOfRows):
+		rowIndex = dataIndex + rowIndex * rowLength
+		integerRow = array.array(typeCode, netpbmBuffer[rowIndex : rowIndex + rowLength])
+		if typeCode == 'H' and sys.byteorder == 'little':
+			integerRow.byteswap()
+		heightGrid.append(array.array('d', map(divisor.__rtruediv__, map(float, integerRow))))
+	return heightGrid
+
+def getHeightGridByPackedBits(dataIndex, netpbmBuffer, numberOfColumns, numberOfRows):
+	'Get heightGrid from the binary P4 bitmap data, which has eight heights per byte with the first in the high bit and each row padded to a byte.'
 	heightGrid = []
-	heightIndex = 0
+	rowLength = (numberOfColumns + 7) / 8
 	for rowIndex in xrange(numberOfRows):
-		row = []
-		heightGrid.append(row)
-		for columnIndex in xrange(numberOfColumns):
-			row.append(heights[heightIndex])
-			heightIndex += 1
+		rowIndex = dataIndex + rowIndex * rowLength
+		row = array.array('d')
+		for byte in bytearray(netpbmBuffer[rowIndex : rowIndex + rowLength]):
+			row.extend(globalBitHeights[byte])
+		heightGrid.append(row[: numberOfColumns])
 	return heightGrid
 
+def getNetpbmHeaderWordsDataIndex(netpbmBuffer, numberOfHeaderWords):
+	'Get the header words, skipping the comments, and the index of the data after the whitespace which ends the header.'
+	headerWords = []
+	characterIndex = 0
+	word = ''
+	while len(headerWords) < numberOfHeaderWords and characterIndex < len(netpbmBuffer):
+		character = netpbmBuffer[characterIndex]
+		if character == '#' and word == '':
+			characterIndex = netpbmBuffer.find('\n', characterIndex)
+			if characterIndex < 0:
+				characterIndex = len(netpbmBuffer)
+		elif character.isspace():
+			if word != '':
+				headerWords.append(word)
+				word = ''
+		else:
+			word += character
+		characterIndex += 1
+	if word != '':
+		headerWords.append(word)
+	return headerWords, characterIndex
+
 def getNewDerivation(xmlElement):
 	'Get new derivation.'
 	return HeightmapDerivation(xmlElement)
@@ -183,11 +361,7 @@ def getRaisedHeightGrid(heightGrid, start):
 	raisedHeightGrid = []
 	remainingHeight = 1.0 - start
 	for row in heightGrid:
-		raisedRow = []
-		raisedHeightGrid.append(raisedRow)
-		for element in row:
-			raisedElement = remainingHeight * element + start
-			raisedRow.append(raisedElement)
+		raisedHeightGrid.append(array.array('d', [remainingHeight * element + start for element in row]))
 	return raisedHeightGrid
 
 def processXMLElement(xmlElement):
@@ -195,11 +369,67 @@ def processXMLElement(xmlElement):
 	solid.processXMLElementByGeometry(getGeometryOutput(xmlElement), xmlElement)
 
 
+class FlatBlockQuadtree:
+	'A class to divide the cells of a heightGrid into the flat blocks of a quadtree and the remaining cells.'
+	def __init__(self, flatTolerance, heightGrid):
+		'Build the maximum and minimum levels of the quadtree and add the blocks.'
+		self.blocks = []
+		self.flatTolerance = flatTolerance
+		self.numberOfCellColumns = len(heightGrid[0]) - 1
+		self.numberOfCellRows = len(heightGrid) - 1
+		self.maximumLevels = [self.getFirstLevel(heightGrid, max, globalNotFlatMaximum)]
+		self.minimumLevels = [self.getFirstLevel(heightGrid, min, -globalNotFlatMaximum)]
+		while len(self.maximumLevels[-1]) > 1 or len(self.maximumLevels[-1][0]) > 1:
+			self.maximumLevels.append(getCombinedLevel(max, self.maximumLevels[-1], globalNotFlatMaximum))
+			self.minimumLevels.append(getCombinedLevel(min, self.minimumLevels[-1], -globalNotFlatMaximum))
+		self.addBlocks(len(self.maximumLevels) - 1, 0, 0)
+
+	def __repr__(self):
+		'Get the string representation of this FlatBlockQuadtree.'
+		return '%s, %s' % (self.flatTolerance, len(self.blocks))
+
+	def addBlocks(self, levelIndex, rowIndex, columnIndex):
+		'Add the block if it is flat, otherwise add the blocks of its quarters.'
+		size = 2 << levelIndex
+		cellRowIndex = rowIndex * size
+		cellColumnIndex = columnIndex * size
+		if cellRowIndex >= self.numberOfCellRows or cellColumnIndex >= self.numberOfCellColumns:
+			return
+		maximum = self.maximumLevels[levelIndex][rowIndex][columnIndex]
+		minimum = self.minimumLevels[levelIndex][rowIndex][columnIndex]
+		if levelIndex > 0 and maximum - minimum <= self.flatTolerance:
+			self.blocks.append((cellRowIndex, cellColumnIndex, size, 0.5 * (maximum + minimum)))
+			return
+		for quarterRowIndex in xrange(rowIndex + rowIndex, rowIndex + rowIndex + 2):
+			for quarterColumnIndex in xrange(columnIndex + columnIndex, columnIndex + columnIndex + 2):
+				if levelIndex > 0:
+					self.addBlocks(levelIndex - 1, quarterRowIndex, quarterColumnIndex)
+				elif quarterRowIndex < self.numberOfCellRows and quarterColumnIndex < self.numberOfCellColumns:
+					self.blocks.append((quarterRowIndex, quarterColumnIndex, 1, None))
+
+	def getFirstLevel(self, heightGrid, function, sentinel):
+		'Get the level of the two by two blocks of cells, each of which covers three by three heights.'
+		numberOfBlockColumns = self.numberOfCellColumns / 2
+		columnEnd = numberOfBlockColumns + numberOfBlockColumns
+		firstLevel = []
+		for rowIndex in xrange(0, self.numberOfCellRows, 2):
+			if rowIndex + 2 > self.numberOfCellRows:
+				firstLevel.append(array.array('d', [sentinel] * ((self.numberOfCellColumns + 1) / 2)))
+				continue
+			rowThrees = map(function, heightGrid[rowIndex], heightGrid[rowIndex + 1], heightGrid[rowIndex + 2])
+			firstRow = array.array('d', map(function, rowThrees[: columnEnd : 2], rowThrees[1 : columnEnd : 2], rowThrees[2 : columnEnd + 1 : 2]))
+			if self.numberOfCellColumns % 2 == 1:
+				firstRow.append(sentinel)
+			firstLevel.append(firstRow)
+		return firstLevel
+
+
 class HeightmapDerivation:
 	'Class to hold heightmap variables.'
 	def __init__(self, xmlElement):
 		'Set defaults.'
 		self.fileName = evaluate.getEvaluatedString('', 'file', xmlElement)
+		self.flatTolerance = evaluate.getEvaluatedFloat(None, 'flatTolerance', xmlElement)
 		self.heightGrid = evaluate.getEvaluatedValue([], 'heightGrid', xmlElement)
 		self.inradius = evaluate.getVector3ByPrefixes(['demisize', 'inradius'], Vector3(10.0, 10.0, 5.0), xmlElement)
 		self.inradius = evaluate.getVector3ByMultiplierPrefix(2.0, 'size', self.inradius, xmlElement)
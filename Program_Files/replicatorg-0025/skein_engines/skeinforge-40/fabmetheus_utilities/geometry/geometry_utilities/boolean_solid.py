@@ -32,6 +32,9 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalRectangleMargin = 0.0001
+
+
 def addLineLoopsIntersections( loopLoopsIntersections, loops, pointBegin, pointEnd ):
 	'Add intersections of the line with the loops.'
 	normalizedSegment = pointEnd - pointBegin
@@ -58,12 +61,16 @@ def addLineXSegmentIntersection( lineLoopsIntersections, segmentFirstX, segmentS
 	if xIntersection <= max( segmentFirstX, segmentSecondX ):
 		lineLoopsIntersections.append( xIntersection )
 
-def addLoopLoopsIntersections( loop, loopsLoopsIntersections, otherLoops ):
-	'Add intersections of the loop with the other loops.'
+def addLoopLoopsIntersections( loop, loopsLoopsIntersections, otherBoundingLoops ):
+	'Add intersections of the loop with the other loops whose rectangles are near the segments of the loop.'
 	for pointIndex in xrange(len(loop)):
 		pointBegin = loop[pointIndex]
 		pointEnd = loop[(pointIndex + 1) % len(loop)]
-		addLineLoopsIntersections( loopsLoopsIntersections, otherLoops, pointBegin, pointEnd )
+		segmentMaximum = complex(max(pointBegin.real, pointEnd.real), max(pointBegin.imag, pointEnd.imag))
+		segmentMinimum = complex(min(pointBegin.real, pointEnd.real), min(pointBegin.imag, pointEnd.imag))
+		otherLoops = getLoopsNearRectangle(otherBoundingLoops, segmentMaximum, segmentMinimum)
+		if len(otherLoops) > 0:
+			addLineLoopsIntersections( loopsLoopsIntersections, otherLoops, pointBegin, pointEnd )
 
 def addLoopsXSegmentIntersections( lineLoopsIntersections, loops, segmentFirstX, segmentSecondX, segmentYMirror, y ):
 	'Add intersections of the loops with the x segment.'
@@ -90,32 +97,52 @@ def getInBetweenLoopsFromLoops(loops, radius):
 		inBetweenLoops.append(inBetweenLoop)
 	return inBetweenLoops
 
-def getInsetPointsByInsetLoop( insetLoop, inside, loops, radius ):
-	'Get the inset points of the inset loop inside the loops.'
+def getBoundingLoops(loops):
+	'Get the bounding loops of the loops.'
+	boundingLoops = []
+	for loop in loops:
+		if len(loop) > 0:
+			boundingLoops.append(intercircle.BoundingLoop().getFromLoop(loop))
+	return boundingLoops
+
+def getBoundingLoopsNearRectangle(boundingLoops, maximum, minimum):
+	'Get the bounding loops whose rectangles are within the rectangle margin of the rectangle.'
+	maximum += complex(globalRectangleMargin, globalRectangleMargin)
+	minimum -= complex(globalRectangleMargin, globalRectangleMargin)
+	boundingLoopsNearRectangle = []
+	for boundingLoop in boundingLoops:
+		if boundingLoop.minimum.real <= maximum.real and boundingLoop.minimum.imag <= maximum.imag:
+			if boundingLoop.maximum.real >= minimum.real and boundingLoop.maximum.imag >= minimum.imag:
+				boundingLoopsNearRectangle.append(boundingLoop)
+	return boundingLoopsNearRectangle
+
+def getInsetPointsByInsetLoop( insetLoop, inside, loopEdgeTable, radius ):
+	'Get the inset points of the inset loop inside the loops of the loop edge table.'
 	insetPointsByInsetLoop = []
 	for pointIndex in xrange( len( insetLoop ) ):
 		pointBegin = insetLoop[ ( pointIndex + len( insetLoop ) - 1 ) % len( insetLoop ) ]
 		pointCenter = insetLoop[ pointIndex ]
 		pointEnd = insetLoop[ (pointIndex + 1) % len( insetLoop ) ]
-		if getIsInsetPointInsideLoops( inside, loops, pointBegin, pointCenter, pointEnd, radius ):
+		if getIsInsetPointInsideLoops( inside, loopEdgeTable, pointBegin, pointCenter, pointEnd, radius ):
 			insetPointsByInsetLoop.append( pointCenter )
 	return insetPointsByInsetLoop
 
 def getInsetPointsByInsetLoops( insetLoops, inside, loops, radius ):
 	'Get the inset points of the inset loops inside the loops.'
 	insetPointsByInsetLoops = []
+	loopEdgeTable = LoopEdgeTable(loops)
 	for insetLoop in insetLoops:
-		insetPointsByInsetLoops += getInsetPointsByInsetLoop( insetLoop, inside, loops, radius )
+		insetPointsByInsetLoops += getInsetPointsByInsetLoop( insetLoop, inside, loopEdgeTable, radius )
 	return insetPointsByInsetLoops
 
-def getIsInsetPointInsideLoops( inside, loops, pointBegin, pointCenter, pointEnd, radius ):
-	'Determine if the inset point is inside the loops.'
+def getIsInsetPointInsideLoops( inside, loopEdgeTable, pointBegin, pointCenter, pointEnd, radius ):
+	'Determine if the inset point is inside the loops of the loop edge table.'
 	centerMinusBegin = euclidean.getNormalized( pointCenter - pointBegin )
 	centerMinusBeginWiddershins = complex( - centerMinusBegin.imag, centerMinusBegin.real )
 	endMinusCenter = euclidean.getNormalized( pointEnd - pointCenter )
 	endMinusCenterWiddershins = complex( - endMinusCenter.imag, endMinusCenter.real )
 	widdershinsNormalized = euclidean.getNormalized( centerMinusBeginWiddershins + endMinusCenterWiddershins ) * radius
-	return euclidean.getIsInFilledRegion( loops,  pointCenter + widdershinsNormalized ) == inside
+	return loopEdgeTable.getIsInFilledRegion( pointCenter + widdershinsNormalized ) == inside
 
 def getLoopsDifference(importRadius, loopLists):
 	'Get difference loops.'
@@ -159,20 +186,32 @@ def getLoopsIntersectionByPair(importRadius, loopsFirst, loopsLast):
 
 def getLoopsListsIntersections( loopsList ):
 	'Get intersections betweens the loops lists.'
+	boundingLoopsList = []
+	for loops in loopsList:
+		boundingLoopsList.append(getBoundingLoops(loops))
 	loopsListsIntersections = []
-	for loopsIndex in xrange( len( loopsList ) ):
-		loops = loopsList[ loopsIndex ]
-		for otherLoops in loopsList[ : loopsIndex ]:
-			loopsListsIntersections += getLoopsLoopsIntersections( loops, otherLoops )
+	for boundingLoopsIndex in xrange( len( boundingLoopsList ) ):
+		boundingLoops = boundingLoopsList[ boundingLoopsIndex ]
+		for otherBoundingLoops in boundingLoopsList[ : boundingLoopsIndex ]:
+			loopsListsIntersections += getLoopsLoopsIntersections( boundingLoops, otherBoundingLoops )
 	return loopsListsIntersections
 
-def getLoopsLoopsIntersections( loops, otherLoops ):
-	'Get all the intersections of the loops with the other loops.'
+def getLoopsLoopsIntersections( boundingLoops, otherBoundingLoops ):
+	'Get all the intersections of the loops of the bounding loops with the other loops.'
 	loopsLoopsIntersections = []
-	for loop in loops:
-		addLoopLoopsIntersections( loop, loopsLoopsIntersections, otherLoops )
+	for boundingLoop in boundingLoops:
+		nearBoundingLoops = getBoundingLoopsNearRectangle(otherBoundingLoops, boundingLoop.maximum, boundingLoop.minimum)
+		if len(nearBoundingLoops) > 0:
+			addLoopLoopsIntersections( boundingLoop.loop, loopsLoopsIntersections, nearBoundingLoops )
 	return loopsLoopsIntersections
 
+def getLoopsNearRectangle(boundingLoops, maximum, minimum):
+	'Get the loops of the bounding loops whose rectangles are near the rectangle.'
+	loopsNearRectangle = []
+	for boundingLoop in getBoundingLoopsNearRectangle(boundingLoops, maximum, minimum):
+		loopsNearRectangle.append(boundingLoop.loop)
+	return loopsNearRectangle
+
 def getLoopsUnified(importRadius, loopLists):
 	'Get joined loops sliced through shape.'
 	allPoints = []
@@ -198,6 +237,51 @@ def getVisibleObjectLoopsList( importRadius, visibleObjects, z ):
 	return visibleObjectLoopsList
 
 
+class LoopEdgeTable:
+	'A class to hold the edges of loops in scan line buckets by y, so that only the edges near a point are checked for intersections.'
+	def __init__(self, loops):
+		'Add the edges which are not horizontal to the buckets which they span.'
+		edges = []
+		totalHeight = 0.0
+		for loop in loops:
+			for pointIndex in xrange(len(loop)):
+				pointBegin = loop[pointIndex - 1]
+				pointEnd = loop[pointIndex]
+				if pointBegin.imag < pointEnd.imag:
+					edges.append((pointBegin.imag, pointEnd.imag, (pointBegin, pointEnd, pointEnd - pointBegin)))
+					totalHeight += pointEnd.imag - pointBegin.imag
+				elif pointBegin.imag > pointEnd.imag:
+					edges.append((pointEnd.imag, pointBegin.imag, (pointBegin, pointEnd, pointEnd - pointBegin)))
+					totalHeight += pointBegin.imag - pointEnd.imag
+		self.bucketHeight = 1.0
+		if len(edges) > 0:
+			self.bucketHeight = totalHeight / float(len(edges))
+		self.edgeTable = {}
+		for minimumY, maximumY, edge in edges:
+			for bucketIndex in xrange(int(math.floor(minimumY / self.bucketHeight)), int(math.floor(maximumY / self.bucketHeight)) + 1):
+				if bucketIndex in self.edgeTable:
+					self.edgeTable[bucketIndex].append(edge)
+				else:
+					self.edgeTable[bucketIndex] = [edge]
+
+	def getIsInFilledRegion(self, point):
+		'Determine if the point is in the filled region of the loops.'
+		return self.getNumberOfIntersectionsToLeft(point) % 2 == 1
+
+	def getNumberOfIntersectionsToLeft(self, point):
+		'Get the number of intersections through the loops for the line going left, the same as euclidean.getNumberOfIntersectionsToLeftOfLoops.'
+		bucketIndex = int(math.floor(point.imag / self.bucketHeight))
+		if bucketIndex not in self.edgeTable:
+			return 0
+		numberOfIntersectionsToLeft = 0
+		y = point.imag
+		for pointBegin, pointEnd, endMinusBegin in self.edgeTable[bucketIndex]:
+			if (y > pointBegin.imag) != (y > pointEnd.imag):
+				if (y - pointBegin.imag) / endMinusBegin.imag * endMinusBegin.real + pointBegin.real < point.real:
+					numberOfIntersectionsToLeft += 1
+		return numberOfIntersectionsToLeft
+
+
 class BooleanSolid( group.Group ):
 	'A boolean solid object.'
 	def getDifference(self, importRadius, visibleObjectLoopsList):
@@ -25,6 +25,9 @@ __date__ = '$Date: 2008/02/05 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalCompiledExpressionDictionary = {}
+globalEvaluatorSplitWordsDictionary = {}
+globalMaximumExpressionDictionaryLength = 10000
 globalModuleFunctionsDictionary = {}
 
 
@@ -188,6 +191,18 @@ def getCapitalizedSuffixKey(prefix, suffix):
 		return prefix + suffix
 	return prefix + suffix[:1].upper()+suffix[1:]
 
+def getCompiledExpression(words):
+	'Get the cached compiled expression of the split words.'
+	global globalCompiledExpressionDictionary
+	wordsKey = tuple(words)
+	if wordsKey in globalCompiledExpressionDictionary:
+		return globalCompiledExpressionDictionary[wordsKey]
+	if len(globalCompiledExpressionDictionary) >= globalMaximumExpressionDictionaryLength:
+		globalCompiledExpressionDictionary = {}
+	compiledExpression = CompiledExpression(wordsKey)
+	globalCompiledExpressionDictionary[wordsKey] = compiledExpression
+	return compiledExpression
+
 def getDictionarySplitWords(dictionary, value):
 	'Get split line for evaluators.'
 	if getIsQuoted(value):
@@ -261,21 +276,7 @@ def getEvaluatedExpressionValue(value, xmlElement):
 
 def getEvaluatedExpressionValueBySplitLine(words, xmlElement):
 	'Evaluate the expression value.'
-	evaluators = []
-	for wordIndex, word in enumerate(words):
-		nextWord = ''
-		nextWordIndex = wordIndex + 1
-		if nextWordIndex < len(words):
-			nextWord = words[nextWordIndex]
-		evaluator = getEvaluator(evaluators, nextWord, word, xmlElement)
-		if evaluator != None:
-			evaluators.append(evaluator)
-	while getBracketsExist(evaluators):
-		pass
-	evaluatedExpressionValueEvaluators = getEvaluatedExpressionValueEvaluators(evaluators)
-	if len( evaluatedExpressionValueEvaluators ) > 0:
-		return evaluatedExpressionValueEvaluators[0].value
-	return None
+	return getCompiledExpression(words).getEvaluatedValue(xmlElement)
 
 def getEvaluatedExpressionValueEvaluators(evaluators):
 	'Evaluate the expression value from the numeric and operation evaluators.'
@@ -396,7 +397,26 @@ def getEvaluator(evaluators, nextWord, word, xmlElement):
 		return EvaluatorValue(word)
 	return EvaluatorNumeric(word, xmlElement)
 
+def getEvaluatorClass(word):
+	'Get the evaluator class of the word if it can be found without the xml element, otherwise None.'
+	if word in globalSplitDictionary:
+		return globalSplitDictionary[word]
+	if word[: 1].isdigit():
+		return EvaluatorNumeric
+	return None
+
 def getEvaluatorSplitWords(value):
+	'Get split words for evaluators, caching them by the value.'
+	global globalEvaluatorSplitWordsDictionary
+	if value in globalEvaluatorSplitWordsDictionary:
+		return globalEvaluatorSplitWordsDictionary[value][:]
+	if len(globalEvaluatorSplitWordsDictionary) >= globalMaximumExpressionDictionaryLength:
+		globalEvaluatorSplitWordsDictionary = {}
+	evaluatorTransitionWords = getEvaluatorTransitionWords(value)
+	globalEvaluatorSplitWordsDictionary[value] = evaluatorTransitionWords[:]
+	return evaluatorTransitionWords
+
+def getEvaluatorTransitionWords(value):
 	'Get split words for evaluators.'
 	if value.startswith('='):
 		value = value[len('=') :]
@@ -1019,6 +1039,57 @@ class ClassObject:
 			self.selfDictionary[attributeName] = value
 
 
+class CompiledExpression:
+	'A class to hold the split words of an expression with the evaluator classes which can be found without the xml element.'
+	def __init__(self, words):
+		'Find the evaluator classes and determine if the expression only has numbers and arithmetic operators.'
+		self.constantValue = None
+		self.evaluatorClasses = []
+		self.isConstant = len(words) > 0
+		self.words = words
+		for word in words:
+			evaluatorClass = getEvaluatorClass(word)
+			self.evaluatorClasses.append(evaluatorClass)
+			if evaluatorClass != EvaluatorNumeric and word not in globalConstantOperatorSet:
+				self.isConstant = False
+
+	def __repr__(self):
+		'Get the string representation of this CompiledExpression.'
+		return ' '.join(self.words)
+
+	def getEvaluatedValue(self, xmlElement):
+		'Evaluate the expression, so that only the words without an evaluator class are looked up.'
+		if self.constantValue != None:
+			return self.constantValue
+		evaluators = self.getEvaluators(xmlElement)
+		while getBracketsExist(evaluators):
+			pass
+		evaluatedExpressionValueEvaluators = getEvaluatedExpressionValueEvaluators(evaluators)
+		if len( evaluatedExpressionValueEvaluators ) < 1:
+			return None
+		value = evaluatedExpressionValueEvaluators[0].value
+		if self.isConstant and value.__class__ in [bool, float, int, long]:
+			self.constantValue = value
+		return value
+
+	def getEvaluators(self, xmlElement):
+		'Get the evaluators of the words.'
+		evaluators = []
+		for wordIndex, word in enumerate(self.words):
+			evaluatorClass = self.evaluatorClasses[wordIndex]
+			if evaluatorClass != None:
+				evaluators.append(evaluatorClass(word, xmlElement))
+				continue
+			nextWord = ''
+			nextWordIndex = wordIndex + 1
+			if nextWordIndex < len(self.words):
+				nextWord = self.words[nextWordIndex]
+			evaluator = getEvaluator(evaluators, nextWord, word, xmlElement)
+			if evaluator != None:
+				evaluators.append(evaluator)
+		return evaluators
+
+
 class Evaluator:
 	'Base evaluator class.'
 	def __init__(self, word, xmlElement):
@@ -1904,6 +1975,7 @@ class ModuleXMLElement:
 			self.pluginModule.processElse( self.elseElement)
 
 
+globalConstantOperatorSet = set(['!=', '%', '(', ')', '*', '**', '+', '-', '/', '<', '<=', '==', '>', '>='])
 globalCreationDictionary = archive.getGeometryDictionary('creation')
 globalDictionaryOperatorBegin = {
 	'||' : EvaluatorConcatenate,
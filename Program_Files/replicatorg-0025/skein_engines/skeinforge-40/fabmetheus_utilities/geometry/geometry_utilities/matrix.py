@@ -316,16 +316,14 @@ def getTetragridTimesOther(firstTetragrid, otherTetragrid ):
 		return otherTetragrid
 	if otherTetragrid == None:
 		return firstTetragrid
+	otherColumns = zip(*otherTetragrid)
 	tetragridTimesOther = []
-	for row in xrange(4):
-		matrixRow = firstTetragrid[row]
+	for matrixRow in firstTetragrid:
+		first, second, third, fourth = matrixRow
 		tetragridTimesOtherRow = []
 		tetragridTimesOther.append(tetragridTimesOtherRow)
-		for column in xrange(4):
-			dotProduct = 0
-			for elementIndex in xrange(4):
-				dotProduct += matrixRow[elementIndex] * otherTetragrid[elementIndex][column]
-			tetragridTimesOtherRow.append(dotProduct)
+		for otherColumn in otherColumns:
+			tetragridTimesOtherRow.append(0 + first * otherColumn[0] + second * otherColumn[1] + third * otherColumn[2] + fourth * otherColumn[3])
 	return tetragridTimesOther
 
 def getTransformedByList(floatList, point):
@@ -343,9 +341,21 @@ def getTransformedVector3(tetragrid, vector3):
 
 def getTransformedVector3s(tetragrid, vector3s):
 	'Get the vector3s multiplied by a matrix.'
+	if tetragrid == None:
+		transformedVector3s = []
+		for vector3 in vector3s:
+			transformedVector3s.append(vector3.copy())
+		return transformedVector3s
+	xRow, yRow, zRow = tetragrid[: 3]
+	xx, xy, xz, xw = xRow
+	yx, yy, yz, yw = yRow
+	zx, zy, zz, zw = zRow
 	transformedVector3s = []
 	for vector3 in vector3s:
-		transformedVector3s.append(getTransformedVector3(tetragrid, vector3))
+		x = vector3.x
+		y = vector3.y
+		z = vector3.z
+		transformedVector3s.append(Vector3(xx * x + xy * y + xz * z + xw, yx * x + yy * y + yz * z + yw, zx * x + zy * y + zz * z + zw))
 	return transformedVector3s
 
 def getTransformTetragrid(prefix, xmlElement):
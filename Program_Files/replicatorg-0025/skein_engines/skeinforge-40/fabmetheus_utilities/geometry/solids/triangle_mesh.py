@@ -29,6 +29,9 @@ __date__ = '$Date: 2008/02/05 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalIsPrintingParseThroughput = False
+
+
 def addEdgePair( edgePairTable, edges, faceEdgeIndex, remainingEdgeIndex, remainingEdgeTable ):
 	'Add edge pair to the edge pair table.'
 	if faceEdgeIndex == remainingEdgeIndex:
@@ -128,6 +131,14 @@ def addFacesByLoopReversed(faces, indexedLoop):
 	'Add faces from a reversed convex polygon.'
 	addFacesByLoop(faces, indexedLoop[: : -1])
 
+def addFacesByVertexIndexArray(faces, vertexIndexArray):
+	'Add the faces of a packed array of vertex index triples.'
+	for vertexIndex in xrange(0, len(vertexIndexArray), 3):
+		triangleFace = face.Face()
+		triangleFace.index = len(faces)
+		triangleFace.vertexIndexes = vertexIndexArray[vertexIndex : vertexIndex + 3].tolist()
+		faces.append(triangleFace)
+
 def addLoopToPointTable(loop, pointTable):
 	'Add the points in the loop to the point table.'
 	for point in loop:
@@ -187,6 +198,10 @@ def addSymmetricYPaths(outputs, paths, y):
 	for path in paths:
 		addSymmetricYPath(outputs, path, y)
 
+def addVertexesByCoordinateArray(coordinateArray, vertexes):
+	'Add the vertexes of a packed array of x, y, z coordinates.'
+	vertexes += map(Vector3, coordinateArray[: : 3], coordinateArray[1 : : 3], coordinateArray[2 : : 3])
+
 def addWithLeastLength(importRadius, loops, point):
 	'Insert a point into a loop, at the index at which the loop would be shortest.'
 	close = importRadius + importRadius
@@ -411,9 +426,9 @@ def getIsPathEntirelyOutsideTriangle(begin, center, end, vector3Path):
 			return False
 	return True
 
-def getLoopsFromCorrectMesh( edges, faces, vertexes, z ):
+def getLoopsFromCorrectMesh( edges, faces, vertexes, z, edgeZoneTable=None ):
 	'Get loops from a carve of a correct mesh.'
-	remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
+	remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z, edgeZoneTable)
 	remainingValues = remainingEdgeTable.values()
 	for edge in remainingValues:
 		if len( edge.faceIndexes ) < 2:
@@ -446,11 +461,11 @@ def getLoopsFromCorrectMesh( edges, faces, vertexes, z ):
 #		remainingLoops.append( untouchable.loop )
 #	return remainingLoops
 
-def getLoopsFromUnprovenMesh(edges, faces, importRadius, vertexes, z):
+def getLoopsFromUnprovenMesh(edges, faces, importRadius, vertexes, z, edgeZoneTable=None):
 	'Get loops from a carve of an unproven mesh.'
 	edgePairTable = {}
 	corners = []
-	remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
+	remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z, edgeZoneTable)
 	remainingEdgeTableKeys = remainingEdgeTable.keys()
 	for remainingEdgeIndexKey in remainingEdgeTable:
 		edge = remainingEdgeTable[remainingEdgeIndexKey]
@@ -545,8 +560,10 @@ def getPillarsOutput(loopLists):
 		pillarsOutput.append(getPillarOutput(loopList))
 	return getUnifiedOutput(pillarsOutput)
 
-def getRemainingEdgeTable(edges, vertexes, z):
+def getRemainingEdgeTable(edges, vertexes, z, edgeZoneTable=None):
 	'Get the remaining edge hashtable.'
+	if edgeZoneTable != None:
+		return edgeZoneTable.getRemainingEdgeTable(z)
 	remainingEdgeTable = {}
 	if len(edges) > 0:
 		if edges[0].zMinimum == None:
@@ -693,10 +710,22 @@ def isPathAdded( edges, faces, loops, remainingEdgeTable, vertexes, z ):
 	loops.append( getPath( edges, pathIndexes, vertexes, z ) )
 	return True
 
+def printParseThroughput(numberOfBytes, fileName, seconds, triangleMesh):
+	'Print the number of vertexes and faces parsed, the time and the throughput, if printing the parse throughput is turned on.'
+	if not globalIsPrintingParseThroughput:
+		return
+	megabytesPerSecond = float(numberOfBytes) / 1048576.0 / max(seconds, 0.001)
+	print('Parsed %s vertexes and %s faces from %s in %s seconds, %s MB per second.' % (len(triangleMesh.vertexes), len(triangleMesh.faces), fileName, euclidean.getRoundedToPlaces(2, seconds), euclidean.getRoundedToPlaces(1, megabytesPerSecond)))
+
 def processXMLElement(xmlElement):
 	'Process the xml element.'
 	evaluate.processArchivable(TriangleMesh, xmlElement)
 
+def setIsPrintingParseThroughput(isPrintingParseThroughput):
+	'Set whether the import plugins print the number of vertexes and faces parsed, the time and the throughput.'
+	global globalIsPrintingParseThroughput
+	globalIsPrintingParseThroughput = isPrintingParseThroughput
+
 def setEdgeMaximumMinimum(edge, vertexes):
 	'Set the edge maximum and minimum.'
 	beginIndex = edge.vertexIndexes[0]
@@ -736,17 +765,63 @@ class EdgePair:
 		return self
 
 
+class EdgeZoneTable:
+	'A table of the indexes of the sloped edges by the z zones which they cross.'
+	def __init__(self, edges, vertexes):
+		'Set the z range of the edges and add the index of each sloped edge to the zones which it crosses.'
+		self.edges = edges
+		self.numberOfEdges = len(edges)
+		self.zoneHeight = 1.0
+		self.zoneTable = {}
+		slopedEdgeIndexes = []
+		totalHeight = 0.0
+		for edgeIndex in xrange(len(edges)):
+			edge = edges[edgeIndex]
+			setEdgeMaximumMinimum(edge, vertexes)
+			if edge.zMaximum > edge.zMinimum:
+				slopedEdgeIndexes.append(edgeIndex)
+				totalHeight += edge.zMaximum - edge.zMinimum
+		if len(slopedEdgeIndexes) < 1:
+			return
+		self.zoneHeight = totalHeight / float(len(slopedEdgeIndexes))
+		for edgeIndex in slopedEdgeIndexes:
+			edge = edges[edgeIndex]
+			zoneMaximum = int(math.floor(edge.zMaximum / self.zoneHeight))
+			for zoneIndex in xrange(int(math.floor(edge.zMinimum / self.zoneHeight)), zoneMaximum + 1):
+				if zoneIndex in self.zoneTable:
+					self.zoneTable[zoneIndex].append(edgeIndex)
+				else:
+					self.zoneTable[zoneIndex] = [edgeIndex]
+
+	def getRemainingEdgeTable(self, z):
+		'Get the remaining edge hashtable, with the edges added in the same order as getRemainingEdgeTable adds them.'
+		remainingEdgeTable = {}
+		zoneIndex = int(math.floor(z / self.zoneHeight))
+		if zoneIndex not in self.zoneTable:
+			return remainingEdgeTable
+		for edgeIndex in self.zoneTable[zoneIndex]:
+			edge = self.edges[edgeIndex]
+			if (edge.zMinimum < z) and (edge.zMaximum > z):
+				remainingEdgeTable[edgeIndex] = edge
+		return remainingEdgeTable
+
+
 class TriangleMesh( group.Group ):
 	'A triangle mesh.'
 	def __init__(self):
 		'Add empty lists.'
 		group.Group.__init__(self)
 		self.belowLoops = []
+		self.cornerVertexes = None
+		self.edgeTable = {}
+		self.edgeZoneTable = None
 		self.infillInDirectionOfBridge = False
 		self.edges = []
 		self.faces = []
 		self.importCoarseness = 1.0
 		self.isCorrectMesh = True
+		self.numberOfCornerVertexes = 0
+		self.numberOfFacesWithEdges = 0
 		self.oldChainTetragrid = None
 		self.rotatedLoopLayers = []
 		self.transformedVertexes = None
@@ -802,24 +877,32 @@ class TriangleMesh( group.Group ):
 		'Get loops from a carve of a mesh.'
 		originalLoops = []
 		self.setEdgesForAllFaces()
+		transformedVertexes = self.getTransformedVertexes()
+		if self.edgeZoneTable == None or self.edgeZoneTable.numberOfEdges != len(self.edges):
+			self.edgeZoneTable = EdgeZoneTable(self.edges, transformedVertexes)
 		if self.isCorrectMesh:
-			originalLoops = getLoopsFromCorrectMesh( self.edges, self.faces, self.getTransformedVertexes(), z )
+			originalLoops = getLoopsFromCorrectMesh(self.edges, self.faces, transformedVertexes, z, self.edgeZoneTable)
 		if len( originalLoops ) < 1:
-			originalLoops = getLoopsFromUnprovenMesh( self.edges, self.faces, self.importRadius, self.getTransformedVertexes(), z )
+			originalLoops = getLoopsFromUnprovenMesh(self.edges, self.faces, self.importRadius, transformedVertexes, z, self.edgeZoneTable)
 		loops = euclidean.getSimplifiedLoops(originalLoops, self.importRadius)
 		sortLoopsInOrderOfArea(True, loops)
 		return getOrientedLoops(loops)
 
 	def getMinimumZ(self):
-		'Get the minimum z.'
-		self.cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
-		self.cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
+		'Get the minimum z, scanning the transformed vertexes only when they have changed since the last scan.'
 		transformedVertexes = self.getTransformedVertexes()
+		if self.cornerVertexes is not transformedVertexes or self.numberOfCornerVertexes != len(transformedVertexes):
+			self.cornerVertexes = transformedVertexes
+			self.numberOfCornerVertexes = len(transformedVertexes)
+			self.cornerMaximumCache = Vector3(-987654321.0, -987654321.0, -987654321.0)
+			self.cornerMinimumCache = Vector3(987654321.0, 987654321.0, 987654321.0)
+			for point in transformedVertexes:
+				self.cornerMaximumCache.maximize(point)
+				self.cornerMinimumCache.minimize(point)
+		self.cornerMaximum = self.cornerMaximumCache.copy()
+		self.cornerMinimum = self.cornerMinimumCache.copy()
 		if len(transformedVertexes) < 1:
 			return None
-		for point in transformedVertexes:
-			self.cornerMaximum.maximize(point)
-			self.cornerMinimum.minimize(point)
 		return self.cornerMinimum.z
 
 	def getTransformedVertexes(self):
@@ -833,6 +916,7 @@ class TriangleMesh( group.Group ):
 		if self.transformedVertexes == None:
 			if len(self.edges) > 0:
 				self.edges[0].zMinimum = None
+			self.edgeZoneTable = None
 			self.transformedVertexes = matrix.getTransformedVector3s(chainTetragrid, self.vertexes)
 		return self.transformedVertexes
 
@@ -842,6 +926,7 @@ class TriangleMesh( group.Group ):
 
 	def getVertexes(self):
 		'Get all vertexes.'
+		self.cornerVertexes = None
 		self.transformedVertexes = None
 		return self.vertexes
 
@@ -858,6 +943,7 @@ class TriangleMesh( group.Group ):
 		if altitude == None:
 			return
 		lift = altitude - minimumZ
+		self.cornerVertexes = None
 		for vertex in self.vertexes:
 			vertex.z += lift
 
@@ -878,10 +964,10 @@ class TriangleMesh( group.Group ):
 		self.isCorrectMesh = isCorrectMesh
 
 	def setEdgesForAllFaces(self):
-		'Set the face edges of all the faces.'
-		edgeTable = {}
-		for face in self.faces:
-			face.setEdgeIndexesToVertexIndexes( self.edges, edgeTable )
+		'Set the face edges of the faces which have been added since the last call, the edge table is kept so the topology is only built once.'
+		for face in self.faces[self.numberOfFacesWithEdges :]:
+			face.setEdgeIndexesToVertexIndexes(self.edges, self.edgeTable)
+		self.numberOfFacesWithEdges = len(self.faces)
 
 
 class ZoneArrangement:
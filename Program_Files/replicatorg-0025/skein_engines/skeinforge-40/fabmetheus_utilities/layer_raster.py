@@ -0,0 +1,216 @@
+"""
+Layer_raster is a collection of utilities to draw the threads of gcode layers into image buffers and to write them as png images, without Tk.
+
+The threads of each layer are binned into a RasterLayer when the gcode is parsed, so a layer can be drawn by itself, for example in a worker process.  When the layer is drawn zoomed out, the points of each thread which are closer than a pixel to the point drawn before them are dropped.  The decimated threads are cached for each power of two of the pixel size, so the level of detail is shared by the scales which are close to each other.
+
+The pixels of a Raster are in a bytearray of red, green and blue bytes, so a raster can be written as a png image or as a ppm image, which Tk can show in a PhotoImage, and a png image written by layer_raster can be read back into a Raster.
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+import math
+import struct
+import zlib
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/02/05 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalColorDictionary = {
+	'black' : (0, 0, 0),
+	'blue' : (0, 0, 255),
+	'brown' : (165, 42, 42),
+	'gray' : (190, 190, 190),
+	'green' : (0, 128, 0),
+	'orange' : (255, 165, 0),
+	'purple' : (160, 32, 240),
+	'red' : (255, 0, 0),
+	'white' : (255, 255, 255),
+	'yellow' : (255, 255, 0)}
+globalPNGBeginning = '\x89PNG\r\n\x1a\n'
+
+
+def getDecimatedThread(thread, tolerance):
+	'Get the thread without the points which are closer than the tolerance to the point kept before them, always keeping the end points.'
+	if len(thread) < 3:
+		return thread
+	decimatedThread = [thread[0]]
+	for point in thread[1 : -1]:
+		if abs(point - decimatedThread[-1]) >= tolerance:
+			decimatedThread.append(point)
+	decimatedThread.append(thread[-1])
+	return decimatedThread
+
+def getLevelOfDetailTolerance(pixelSize):
+	'Get the largest power of two which is not bigger than the pixel size, so that close scales share a level of detail.'
+	return math.pow(2.0, math.floor(math.log(pixelSize, 2.0)))
+
+def getPNGChunk(chunkType, data):
+	'Get a png chunk with its length and crc.'
+	return struct.pack('>I', len(data)) + chunkType + data + struct.pack('>I', zlib.crc32(chunkType + data) & 0xffffffff)
+
+def getRasterFromPNGString(pngString):
+	'Get a raster from an eight bit rgb png string, like the ones written by a raster, raising ValueError if the string is not such an image or is truncated or corrupt.'
+	if not pngString.startswith(globalPNGBeginning):
+		raise ValueError('The string is not a png image.')
+	chunkIndex = len(globalPNGBeginning)
+	compressedStrings = []
+	textDictionary = {}
+	raster = None
+	while chunkIndex < len(pngString):
+		if chunkIndex + 12 > len(pngString):
+			raise ValueError('The png image is truncated.')
+		chunkLength = struct.unpack_from('>I', pngString, chunkIndex)[0]
+		chunkType = pngString[chunkIndex + 4 : chunkIndex + 8]
+		chunkEnd = chunkIndex + 8 + chunkLength
+		if chunkEnd + 4 > len(pngString):
+			raise ValueError('The png image is truncated.')
+		data = pngString[chunkIndex + 8 : chunkEnd]
+		if struct.unpack_from('>I', pngString, chunkEnd)[0] != zlib.crc32(chunkType + data) & 0xffffffff:
+			raise ValueError('The %r chunk of the png image has the wrong crc.' % chunkType)
+		chunkIndex = chunkEnd + 4
+		if chunkType == 'IHDR':
+			if len(data) != 13:
+				raise ValueError('The png image header has the wrong length.')
+			width, height, bitDepth, colorType, compression, filterMethod, interlace = struct.unpack('>IIBBBBB', data)
+			if bitDepth != 8 or colorType != 2 or interlace != 0:
+				raise ValueError('Only eight bit rgb png images without interlace can be read.')
+			raster = Raster(height, width)
+		elif chunkType == 'IDAT':
+			compressedStrings.append(data)
+		elif chunkType == 'tEXt':
+			if '\x00' not in data:
+				raise ValueError('The png text chunk does not have a keyword.')
+			keyword, text = data.split('\x00', 1)
+			textDictionary[keyword] = text
+	if raster == None:
+		raise ValueError('The png image does not have a header.')
+	try:
+		rowsString = zlib.decompress(''.join(compressedStrings))
+	except zlib.error, error:
+		raise ValueError('The png image data can not be decompressed, %s.' % error)
+	rowLength = 3 * raster.width
+	if len(rowsString) < raster.height * (rowLength + 1):
+		raise ValueError('The png image data is shorter than the image.')
+	for rowIndex in xrange(raster.height):
+		rowStart = rowIndex * (rowLength + 1)
+		if rowsString[rowStart] != '\x00':
+			raise ValueError('Only png images without row filters can be read.')
+		raster.pixels[rowIndex * rowLength : (rowIndex + 1) * rowLength] = rowsString[rowStart + 1 : rowStart + 1 + rowLength]
+	raster.textDictionary = textDictionary
+	return raster
+
+
+class Raster:
+	'A class to draw lines into an rgb image buffer.'
+	def __init__(self, height, width, colorName='white'):
+		'Initialize the pixels to the background color.'
+		self.height = height
+		self.pixels = bytearray(globalColorDictionary[colorName]) * (height * width)
+		self.textDictionary = {}
+		self.width = width
+
+	def __repr__(self):
+		'Get the string representation of this Raster.'
+		return 'Raster %s by %s' % (self.width, self.height)
+
+	def drawLine(self, begin, end, colorName, lineWidth):
+		'Draw a line between the begin and end pixel coordinates, with a square brush of the line width.'
+		segment = end - begin
+		numberOfSteps = int(math.ceil(max(abs(segment.real), abs(segment.imag))))
+		colorRow = bytearray(globalColorDictionary[colorName]) * lineWidth
+		halfWidth = lineWidth / 2
+		oldPixel = None
+		for stepIndex in xrange(numberOfSteps + 1):
+			point = begin
+			if numberOfSteps > 0:
+				point = begin + segment * float(stepIndex) / float(numberOfSteps)
+			pixel = (int(round(point.real)) - halfWidth, int(round(point.imag)) - halfWidth)
+			if pixel != oldPixel:
+				self.drawSquare(colorRow, lineWidth, pixel)
+				oldPixel = pixel
+
+	def drawSquare(self, colorRow, lineWidth, pixel):
+		'Draw a square of the line width, with its corner at the pixel, clipped to the raster.'
+		left = max(pixel[0], 0)
+		right = min(pixel[0] + lineWidth, self.width)
+		if left >= right:
+			return
+		rowSlice = colorRow[: 3 * (right - left)]
+		for y in xrange(max(pixel[1], 0), min(pixel[1] + lineWidth, self.height)):
+			rowStart = 3 * (y * self.width)
+			self.pixels[rowStart + 3 * left : rowStart + 3 * right] = rowSlice
+
+	def drawThread(self, colorName, lineWidth, thread):
+		'Draw a thread of pixel coordinates.'
+		for pointIndex in xrange(len(thread) - 1):
+			self.drawLine(thread[pointIndex], thread[pointIndex + 1], colorName, lineWidth)
+
+	def getPNGString(self):
+		'Get the raster as an eight bit rgb png string, with the text dictionary in text chunks.'
+		rowLength = 3 * self.width
+		rowStrings = []
+		for rowIndex in xrange(self.height):
+			rowStrings.append('\x00')
+			rowStrings.append(str(self.pixels[rowIndex * rowLength : (rowIndex + 1) * rowLength]))
+		pngStrings = [globalPNGBeginning, getPNGChunk('IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0))]
+		for keyword in sorted(self.textDictionary.keys()):
+			pngStrings.append(getPNGChunk('tEXt', '%s\x00%s' % (keyword, self.textDictionary[keyword])))
+		pngStrings.append(getPNGChunk('IDAT', zlib.compress(''.join(rowStrings), 6)))
+		pngStrings.append(getPNGChunk('IEND', ''))
+		return ''.join(pngStrings)
+
+	def getPPMString(self):
+		'Get the raster as a binary ppm string, which can be given to a Tk PhotoImage as its data.'
+		return 'P6\n%s %s\n255\n%s' % (self.width, self.height, str(self.pixels))
+
+
+class RasterLayer:
+	'A class to hold the threads of a layer, with their color names, and to draw them at a scale.'
+	def __init__(self, z):
+		'Initialize.'
+		self.decimatedThreadsDictionary = {}
+		self.threads = []
+		self.z = z
+
+	def __repr__(self):
+		'Get the string representation of this RasterLayer.'
+		return '%s, %s' % (self.z, len(self.threads))
+
+	def addThread(self, colorName, isExtrusion, thread):
+		'Add a thread of complex model coordinates.'
+		if len(thread) > 1:
+			self.threads.append((colorName, isExtrusion, thread))
+
+	def getDecimatedThreads(self, pixelSize):
+		'Get the threads decimated for the level of detail of the pixel size, in millimeters per pixel.'
+		tolerance = getLevelOfDetailTolerance(pixelSize)
+		if tolerance not in self.decimatedThreadsDictionary:
+			decimatedThreads = []
+			for colorName, isExtrusion, thread in self.threads:
+				decimatedThreads.append((colorName, isExtrusion, getDecimatedThread(thread, tolerance)))
+			self.decimatedThreadsDictionary[tolerance] = decimatedThreads
+		return self.decimatedThreadsDictionary[tolerance]
+
+	def getRaster(self, cornerMaximum, cornerMinimum, extrusionWidth, margin, scale, travelWidth):
+		'Draw the layer into a raster, with the complex corners in model coordinates and the scale in pixels per millimeter.'
+		size = scale * (cornerMaximum - cornerMinimum) + complex(margin + margin, margin + margin)
+		raster = Raster(int(math.ceil(size.imag)), int(math.ceil(size.real)))
+		offset = complex(margin - scale * cornerMinimum.real, margin + scale * cornerMaximum.imag)
+		threads = self.getDecimatedThreads(1.0 / scale)
+		for isExtrusionDrawn in [False, True]:
+			for colorName, isExtrusion, thread in threads:
+				lineWidth = travelWidth
+				if isExtrusion:
+					lineWidth = extrusionWidth
+				if isExtrusion == isExtrusionDrawn and lineWidth > 0:
+					pixelThread = []
+					for point in thread:
+						pixelThread.append(offset + complex(scale * point.real, - scale * point.imag))
+					raster.drawThread(colorName, lineWidth, pixelThread)
+		return raster
@@ -5,6 +5,10 @@ Extrude requires pySerial installed for this module to work. If you are using Fe
 (run "sudo yum install pyserial").  To actually control the reprap requires write access to the serial device,
 running as root is one way to get that access.
 
+RepRapArduinoStreamingSender streams g-code without waiting for the "ok" of each block, which keeps the
+firmware planner fed on short segments.  The firmware simulator in firmware_simulator.py can stand in for
+the arduino on a pseudo terminal.
+
 Created by Brendan Erwin on 2008-05-21.
 Copyright (c) 2008 Brendan Erwin. All rights reserved.
 
@@ -30,11 +34,42 @@ except:
 	print('You do not have pySerial installed, which is needed to control the serial port.')
 	print('Information on pySerial is at:\nhttp://pyserial.wiki.sourceforge.net/pySerial')
 
+import collections
 import os
 import sys
+import threading
 import time
 
 
+def getChecksum(line):
+	"""
+		Returns the RepRap checksum of a line, which is the exclusive or of all its characters.
+	"""
+	checksum = 0
+	for character in line:
+		checksum ^= ord(character)
+	return checksum
+
+def getResendLineNumber(response):
+	"""
+		Returns the line number of a "Resend: 12", "Resend:12" or "rs 12" response, or None if there is none.
+	"""
+	words = response.replace(':', ' ').split()
+	for word in reversed(words):
+		word = word.lstrip('Nn')
+		if word.isdigit():
+			return int(word)
+	return None
+
+def getStrippedBlock(block):
+	"""
+		Returns the block without whitespace, because the arduino GCode interperter firmware doesn't like whitespace.
+	"""
+	block = block.strip()
+	block = block.replace(' ', '')
+	return block.replace("\t", '')
+
+
 class RepRapArduinoSerialSender:
 	"""
 		A utility class for communication with the Arduino from python.
@@ -92,9 +127,7 @@ class RepRapArduinoSerialSender:
 
 		# The arduino GCode interperter firmware doesn't like whitespace
 		# and if there's anything other than space and tab, we have other problems.
-		block=block.strip()
-		block=block.replace(' ','')
-		block=block.replace("\t",'')
+		block = getStrippedBlock(block)
 		#Skip blank blocks.
 		if len(block) == 0:
 			return
@@ -127,7 +160,7 @@ class RepRapArduinoSerialSender:
 				print "< " + response
 
 
-	def close():
+	def close(self):
 		"""
 			Closes the serial port, terminating communications with the arduino.
 		"""
@@ -137,3 +170,304 @@ class RepRapArduinoSerialSender:
 
 		if self._verbose:
 			print >> sys.stdout, "Serial Open?: " + str(self.ser.isOpen())
+
+
+class RepRapArduinoStreamingSender(RepRapArduinoSerialSender):
+	"""
+		A utility class which streams g-code to the arduino without waiting for the "ok" of each block.
+		Up to window blocks are kept in flight, as long as their characters fit in the receive buffer
+		of the firmware, so write() only waits when the window or the buffer is full.  A background
+		thread reads the responses and sends the next blocks as the "ok"s come back.
+
+		Each block is sent with a line number and a checksum, like "N12G1X3.2*57".  The firmware is
+		expected to answer every line it receives with exactly one "ok", and to send "Resend: n"
+		before the "ok" of a line it rejects.  The blocks are then sent again from line n, and the
+		resend requests for the lines which were already on their way are ignored.
+	"""
+
+	def __init__(self, port, baud, verbose=False, window=4, bufferSize=63, lineNumbers=True):
+		"""
+			Opens the serial port and starts the reader thread.
+			bufferSize is the number of characters the firmware can receive before it reads them.
+		"""
+		RepRapArduinoSerialSender.__init__(self, port, baud, verbose)
+		# A short timeout lets the reader thread stop when the sender is closed.
+		self.ser.timeout = 0.1
+		self.bufferSize = bufferSize
+		self.condition = threading.Condition()
+		self.inFlight = collections.deque()
+		self.inFlightCharacters = 0
+		self.isReading = True
+		self.isStarted = False
+		self.lineNumber = 0
+		self.lineNumbers = lineNumbers
+		self.pending = collections.deque()
+		self.readerException = None
+		self.rewindSendIndex = 0
+		self.sendIndex = 0
+		self.window = window
+		self.acknowledgedCount = 0
+		self.charactersSent = 0
+		self.errorCount = 0
+		self.resendCount = 0
+		self.roundTripTotal = 0.0
+		self.startTime = None
+		self.readerThread = threading.Thread(target=self.readResponses)
+		self.readerThread.daemon = True
+		self.readerThread.start()
+
+	def acknowledge(self):
+		"""
+			Frees the buffer space of the oldest line in flight when its "ok" arrives.
+		"""
+		if len(self.inFlight) == 0:
+			return
+		lineNumber, line, sendIndex, sendTime = self.inFlight.popleft()
+		self.inFlightCharacters -= len(line) + 1
+		self.acknowledgedCount += 1
+		self.roundTripTotal += time.time() - sendTime
+
+	def addPendingBlock(self, block):
+		"""
+			Adds a block to the lines waiting to be sent, with its line number and checksum.
+		"""
+		line = block
+		if self.lineNumbers:
+			line = 'N%s%s' % (self.lineNumber, block)
+			line = '%s*%s' % (line, getChecksum(line))
+		self.pending.append((self.lineNumber, line))
+		self.lineNumber += 1
+
+	def close(self, timeout=None):
+		"""
+			Waits until all the blocks are acknowledged, or until the timeout in seconds if there is one,
+			then stops the reader thread and closes the serial port.
+		"""
+		try:
+			self.waitUntilDone(timeout)
+		finally:
+			self.isReading = False
+			self.readerThread.join()
+			RepRapArduinoSerialSender.close(self)
+
+	def getMetricsString(self):
+		"""
+			Returns a summary of the throughput of the stream.
+		"""
+		seconds = 0.0
+		if self.startTime != None:
+			seconds = max(time.time() - self.startTime, 0.001)
+		roundTrip = 0.0
+		if self.acknowledgedCount > 0:
+			roundTrip = 1000.0 * self.roundTripTotal / float(self.acknowledgedCount)
+		metricsString = 'Sent %s lines and %s characters in %.1f seconds' % (self.acknowledgedCount, self.charactersSent, seconds)
+		if seconds > 0.0:
+			metricsString += ', %.1f lines and %.0f characters per second' % (self.acknowledgedCount / seconds, self.charactersSent / seconds)
+		return metricsString + ', with an average round trip of %.1f ms, %s resends and %s errors.' % (roundTrip, self.resendCount, self.errorCount)
+
+	def handleResponse(self, response):
+		"""
+			Handles one line of response from the firmware, with the condition acquired.
+		"""
+		lowerResponse = response.lower()
+		if lowerResponse.startswith('ok'):
+			if self._verbose or len(response) > 2:
+				print "< " + response
+			self.acknowledge()
+			return
+		if lowerResponse.startswith('rs') or lowerResponse.startswith('resend'):
+			if self._verbose:
+				print "< " + response
+			self.resend(getResendLineNumber(response))
+			return
+		if lowerResponse.startswith('start'):
+			self.isStarted = True
+			if self._verbose:
+				print "< " + response
+			return
+		if lowerResponse.startswith('error') or lowerResponse.startswith('!!'):
+			self.errorCount += 1
+		#Just print the response since it is useful data or an error message
+		print "< " + response
+
+	def readResponses(self):
+		"""
+			Reads the responses of the firmware in the reader thread, and sends the pending lines as buffer space is freed.
+		"""
+		partialResponse = ''
+		while self.isReading:
+			try:
+				response = self.ser.readline()
+			except Exception, exception:
+				self.condition.acquire()
+				self.readerException = exception
+				self.condition.notifyAll()
+				self.condition.release()
+				return
+			if not response.endswith('\n'):
+				partialResponse += response
+				continue
+			response = (partialResponse + response).strip()
+			partialResponse = ''
+			if len(response) == 0:
+				continue
+			self.condition.acquire()
+			try:
+				self.handleResponse(response)
+				self.sendPendingLines()
+				self.condition.notifyAll()
+			finally:
+				self.condition.release()
+
+	def resend(self, lineNumber):
+		"""
+			Sends the lines again from the line number, unless the request is for a line which was sent before the last rewind.
+		"""
+		if lineNumber == None or len(self.inFlight) == 0:
+			return
+		if self.inFlight[0][2] < self.rewindSendIndex:
+			return
+		self.resendCount += 1
+		lineDictionary = {}
+		for inFlightNumber, line, sendIndex, sendTime in self.inFlight:
+			if inFlightNumber >= lineNumber:
+				lineDictionary[inFlightNumber] = line
+		for pendingNumber, line in self.pending:
+			lineDictionary[pendingNumber] = line
+		self.pending = collections.deque(sorted(lineDictionary.items()))
+		self.rewindSendIndex = self.sendIndex
+
+	def reset(self):
+		"""
+			Resets the arduino by droping DTR for 1 second
+			This will then wait for the reader thread to receive "start", and start the line numbers again.
+		"""
+		if self._verbose:
+			print "Resetting arduino..."
+		self.condition.acquire()
+		try:
+			self.inFlight.clear()
+			self.inFlightCharacters = 0
+			self.isStarted = False
+			self.lineNumber = 0
+			self.pending.clear()
+		finally:
+			self.condition.release()
+		self.ser.setDTR(0)
+		# There is presumably some latency required.
+		time.sleep(1)
+		self.ser.setDTR(1)
+		self.condition.acquire()
+		try:
+			while not self.isStarted:
+				self.waitForResponse()
+		finally:
+			self.condition.release()
+
+	def sendPendingLines(self):
+		"""
+			Sends the pending lines while the window and the receive buffer have room, with the condition acquired.
+		"""
+		while len(self.pending) > 0 and len(self.inFlight) < self.window:
+			lineNumber, line = self.pending[0]
+			lineLength = len(line) + 1
+			if len(self.inFlight) > 0 and self.inFlightCharacters + lineLength > self.bufferSize:
+				return
+			self.pending.popleft()
+			if self._verbose:
+				print "> " + line
+			if self.startTime == None:
+				self.startTime = time.time()
+			self.ser.write(line + "\n")
+			self.charactersSent += lineLength
+			self.inFlight.append((lineNumber, line, self.sendIndex, time.time()))
+			self.inFlightCharacters += lineLength
+			self.sendIndex += 1
+
+	def stop(self):
+		"""
+			Drops the blocks which are not acknowledged yet and sends M112, without a line number, so the firmware stops at once.
+		"""
+		self.condition.acquire()
+		try:
+			self.inFlight.clear()
+			self.inFlightCharacters = 0
+			self.pending.clear()
+			self.ser.write("M112\n")
+			self.condition.notifyAll()
+		finally:
+			self.condition.release()
+
+	def waitForResponse(self, timeout=1.0):
+		"""
+			Waits for the reader thread to handle a response, with the condition acquired.
+			Raises the exception of the reader thread if it stopped.
+		"""
+		if self.readerException != None:
+			raise self.readerException
+		self.condition.wait(timeout)
+
+	def waitUntilDone(self, timeout=None):
+		"""
+			Waits until every line which was written is acknowledged, or until the timeout in seconds if there is one.
+			Returns True if every line is acknowledged.
+		"""
+		endTime = None
+		if timeout != None:
+			endTime = time.time() + timeout
+		self.condition.acquire()
+		try:
+			while len(self.pending) > 0 or len(self.inFlight) > 0:
+				if endTime == None:
+					self.waitForResponse()
+				elif time.time() >= endTime:
+					return False
+				else:
+					self.waitForResponse(min(endTime - time.time(), 1.0))
+			return True
+		finally:
+			self.condition.release()
+
+	def waitUntilSent(self, timeout=None):
+		"""
+			Waits until every line which was written is sent, or until the timeout in seconds if there is one.
+			Returns True if every line is sent.
+		"""
+		endTime = None
+		if timeout != None:
+			endTime = time.time() + timeout
+		self.condition.acquire()
+		try:
+			self.sendPendingLines()
+			while len(self.pending) > 0:
+				if endTime == None:
+					self.waitForResponse()
+				elif time.time() >= endTime:
+					return False
+				else:
+					self.waitForResponse(min(endTime - time.time(), 1.0))
+				self.sendPendingLines()
+			return True
+		finally:
+			self.condition.release()
+
+	def write(self, block, timeout=None):
+		"""
+			Queues one block of g-code and sends it as soon as the window and the receive buffer have room.
+			This version returns when the block is sent, without waiting for its "ok", or after the timeout
+			in seconds if there is one, in which case the reader thread sends the block later.
+			Returns True if the block is sent.
+		"""
+		block = getStrippedBlock(block)
+		#Skip blank blocks.
+		if len(block) == 0:
+			return True
+		self.condition.acquire()
+		try:
+			if self.lineNumbers and self.lineNumber == 0:
+				# M110 sets the line number of the firmware, so the numbers of the stream start at zero.
+				self.addPendingBlock('M110')
+			self.addPendingBlock(block)
+		finally:
+			self.condition.release()
+		return self.waitUntilSent(timeout)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Firmware_simulator simulates a RepRap g-code firmware on a pseudo terminal, so that the serial senders can be
+tested without an arduino.  It requires a posix system, because it uses the pty module.
+
+The simulator has a receive buffer of a limited number of characters, like the serial buffer of the arduino.
+Characters which arrive while the buffer is full are dropped and counted as an overflow.  The simulator takes
+one line out of the buffer every command time, checks its line number and checksum if it has them, and answers
+with exactly one "ok".  A line with a wrong line number or checksum is answered with "Resend: n" before its "ok",
+where n is the line number which is expected next.  To test the resend handling, one of every error interval
+good lines is treated as if its checksum was wrong.  The responses are delayed by the latency, to simulate the
+round trip of a usb serial adapter, which is what the streaming sender hides.  Like the emergency parser of
+the firmware, an M112 is handled as soon as it arrives, even when the buffer is full: the buffer is cleared and the
+simulator stops executing lines.
+
+To run the simulator and stream a file to it, in a shell type:
+> python firmware_simulator.py
+Then in another shell, with the port printed by the simulator, type:
+> python send.py --noreset --stream --port /dev/pts/3 Screw_Holder_export.gcode
+
+Copyright (c) 2008 Brendan Erwin. All rights reserved.
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+
+import collections
+import os
+import pty
+import RepRapArduinoSerialSender
+import select
+import sys
+import threading
+import time
+import tty
+
+
+class FirmwareSimulator:
+	"""
+		A class which answers g-code sent to a pseudo terminal like the arduino firmware.
+		The portName is the name of the pseudo terminal to give to the sender.
+	"""
+
+	def __init__(self, bufferSize=63, commandTime=0.002, errorInterval=0, latency=0.0, verbose=False):
+		"""
+			Opens the pseudo terminal, sends "start" and starts the simulator thread.
+		"""
+		self.bufferSize = bufferSize
+		self.commandTime = commandTime
+		self.errorInterval = errorInterval
+		self.executedBlocks = []
+		self.expectedLineNumber = 1
+		self.goodLineCount = 0
+		self.isHalted = False
+		self.isRunning = True
+		self.latency = latency
+		self.masterFileDescriptor, self.slaveFileDescriptor = pty.openpty()
+		tty.setraw(self.slaveFileDescriptor)
+		self.maximumBufferedCharacters = 0
+		self.overflowCount = 0
+		self.portName = os.ttyname(self.slaveFileDescriptor)
+		self.receivedLineCount = 0
+		self.receiveBuffer = ''
+		self.rejectedLineCount = 0
+		self.responses = collections.deque()
+		self.temperature = 20.0
+		self._verbose = verbose
+		self.writeResponse('start')
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def addReceivedCharacters(self, characters):
+		"""
+			Adds the received characters to the receive buffer, dropping the characters which do not fit.
+			An M112 clears the buffer and halts the simulator.
+		"""
+		if 'M112' in characters:
+			self.executedBlocks.append('M112')
+			self.isHalted = True
+			self.receiveBuffer = ''
+			return
+		if self.isHalted:
+			return
+		roomLength = self.bufferSize - len(self.receiveBuffer)
+		if len(characters) > roomLength:
+			self.overflowCount += len(characters) - roomLength
+			characters = characters[: max(roomLength, 0)]
+		self.receiveBuffer += characters
+		self.maximumBufferedCharacters = max(self.maximumBufferedCharacters, len(self.receiveBuffer))
+
+	def close(self):
+		"""
+			Stops the simulator thread and closes the pseudo terminal.
+		"""
+		self.isRunning = False
+		self.thread.join()
+		os.close(self.masterFileDescriptor)
+		os.close(self.slaveFileDescriptor)
+
+	def executeBlock(self, block):
+		"""
+			Executes a block, which only records it, and returns the response.
+		"""
+		self.executedBlocks.append(block)
+		if block.startswith('M104') or block.startswith('M109'):
+			try:
+				self.temperature = float(block[5 :])
+			except ValueError:
+				pass
+		if block.startswith('M105'):
+			return 'ok T:%s' % self.temperature
+		return 'ok'
+
+	def getRejection(self, body, checksumString, lineNumber):
+		"""
+			Returns the error message if the line number or the checksum of a line is wrong, otherwise returns None.
+		"""
+		lastLineString = ', Last Line: %s' % (self.expectedLineNumber - 1)
+		if checksumString == None:
+			return 'Error:No Checksum with line number' + lastLineString
+		if not checksumString.isdigit() or int(checksumString) != RepRapArduinoSerialSender.getChecksum(body):
+			return 'Error:checksum mismatch' + lastLineString
+		if lineNumber == None:
+			return 'Error:Line Number is not a number' + lastLineString
+		if lineNumber != self.expectedLineNumber:
+			return 'Error:Line Number is not Last Line Number+1' + lastLineString
+		self.goodLineCount += 1
+		if self.errorInterval > 0 and self.goodLineCount % self.errorInterval == 0:
+			return 'Error:checksum mismatch' + lastLineString
+		return None
+
+	def parseLine(self, line):
+		"""
+			Checks and executes a line, then answers it with exactly one "ok".
+		"""
+		self.receivedLineCount += 1
+		if self._verbose:
+			print "> " + line
+		if not line.startswith('N'):
+			self.writeResponse(self.executeBlock(line))
+			return
+		body = line
+		checksumString = None
+		if '*' in line:
+			body, checksumString = line.rsplit('*', 1)
+		numberEnd = 1
+		while numberEnd < len(body) and (body[numberEnd].isdigit() or body[numberEnd] == '-'):
+			numberEnd += 1
+		block = body[numberEnd :]
+		lineNumber = None
+		try:
+			lineNumber = int(body[1 : numberEnd])
+		except ValueError:
+			pass
+		if block.startswith('M110') and lineNumber != None:
+			self.expectedLineNumber = lineNumber
+		rejection = self.getRejection(body, checksumString, lineNumber)
+		if rejection != None:
+			self.rejectedLineCount += 1
+			self.writeResponse(rejection)
+			self.writeResponse('Resend: %s' % self.expectedLineNumber)
+			self.writeResponse('ok')
+			return
+		self.expectedLineNumber += 1
+		self.writeResponse(self.executeBlock(block))
+
+	def run(self):
+		"""
+			Reads the pseudo terminal and parses one line from the receive buffer every command time, until the simulator is closed.
+		"""
+		busyUntil = 0.0
+		while self.isRunning:
+			timeout = 0.05
+			if '\n' in self.receiveBuffer:
+				timeout = max(busyUntil - time.time(), 0.0)
+			if len(self.responses) > 0:
+				timeout = min(timeout, max(self.responses[0][0] - time.time(), 0.0))
+			readableFileDescriptors = select.select([self.masterFileDescriptor], [], [], timeout)[0]
+			if len(readableFileDescriptors) > 0:
+				try:
+					self.addReceivedCharacters(os.read(self.masterFileDescriptor, 1024))
+				except OSError:
+					return
+			now = time.time()
+			while len(self.responses) > 0 and now >= self.responses[0][0]:
+				os.write(self.masterFileDescriptor, self.responses.popleft()[1])
+			if now >= busyUntil and '\n' in self.receiveBuffer:
+				line, self.receiveBuffer = self.receiveBuffer.split('\n', 1)
+				self.parseLine(line.strip())
+				busyUntil = now + self.commandTime
+
+	def writeResponse(self, response):
+		"""
+			Writes a line of response to the sender, after the latency if there is one.
+		"""
+		if self._verbose:
+			print "< " + response
+		if self.latency > 0.0:
+			self.responses.append((time.time() + self.latency, response + '\n'))
+		else:
+			os.write(self.masterFileDescriptor, response + '\n')
+
+
+def main():
+	"""
+		Runs a simulator and prints its port name, until it is interrupted.
+	"""
+	firmwareSimulator = FirmwareSimulator(verbose='-v' in sys.argv[1 :])
+	print "The firmware simulator is listening on " + firmwareSimulator.portName
+	try:
+		while True:
+			time.sleep(1.0)
+	except KeyboardInterrupt:
+		print "Received %s lines, rejected %s lines and dropped %s characters." % (firmwareSimulator.receivedLineCount, firmwareSimulator.rejectedLineCount, firmwareSimulator.overflowCount)
+	firmwareSimulator.close()
+
+if __name__ == "__main__":
+	main()
@@ -91,6 +91,7 @@ def openSerial( port, rate, tout ):
 		print "You do not have permissions to use the serial port, try running as root"
 
 def closeSerial():
+	snap.removePacketReader(serialPort)
 	serialPort.close()
 
 # Convert two 8 bit bytes to one integer
@@ -127,8 +128,9 @@ def scanNetwork():
 		#now get versions
 		print "device", d
 
-def getNotification(serialPort):
-	return snap.getPacket(serialPort)
+# wait for the notification of a command from a device, keeping the other packets for later. Returns False on timeout.
+def getNotification(serialPort, address, command):
+	return snap.getPacketReader(serialPort).getPacket( lambda packet: packet.ACK == 0 and packet.SAB == address and packet.dataBytes[:1] == [command] )
 
 class extruderClass:
 	def __init__(self):
@@ -213,6 +215,26 @@ def checkReplyPacket (packet, numExpectedBytes, command):
 	return False
 				
 
+# get the positions of several axes, sending all the requests before waiting for any reply, so the axes answer at the same time.
+# returns a list with the position of each axis, or False for an axis which did not answer.
+def getPositions(axes):
+	activeAxes = [axis for axis in axes if axis.active]
+	packets = [snap.SNAPPacket( serialPort, axis.address, snap.localAddress, 0, 1, [CMD_GETPOS] ) for axis in activeAxes]
+	positions = {}
+	for axis, sent in zip( activeAxes, snap.sendPackets( packets ) ):
+		if sent:
+			rep = snap.getPacketReader( serialPort ).getPacket( lambda packet: packet.SAB == axis.address and packet.ACK == 0 and packet.dataBytes[:1] == [CMD_GETPOS] )
+			data = checkReplyPacket( rep, 3, CMD_GETPOS )
+			if data:
+				positions[axis.address] = bytes2int( data[1], data[2] )
+	return [positions.get( axis.address, False ) for axis in axes]
+
+# send the same command to several axes, without waiting for the ack of one axis before sending to the next
+def sendToAxes(axes, dataBytes):
+	activeAxes = [axis for axis in axes if axis.active]
+	packets = [snap.SNAPPacket( serialPort, axis.address, snap.localAddress, 0, 1, list(dataBytes) ) for axis in activeAxes]
+	return snap.sendPackets( packets )
+
 class axisClass:
 	def __init__(self, address):
 		self.address = address
@@ -298,8 +320,8 @@ class axisClass:
 			if p.send():
 				if waitArrival:
 					if printDebug: print "    wait notify"
-					notif = getNotification( serialPort )
-					if notif.dataBytes[0] == CMD_SEEK:
+					notif = getNotification( serialPort, self.address, CMD_SEEK )
+					if notif:
 						if printDebug: print "    valid notification for seek"
 					else:
 						return False
@@ -314,8 +336,8 @@ class axisClass:
 			if p.send():
 				if waitArrival:
 					if printDebug: print "reset wait"
-					notif = getNotification( serialPort )
-					if notif.dataBytes[0] == CMD_HOMERESET:
+					notif = getNotification( serialPort, self.address, CMD_HOMERESET )
+					if notif:
 						if printDebug: print "    valid notification for reset"
 					else:
 						return False
@@ -345,8 +367,8 @@ class axisClass:
 			p = snap.SNAPPacket( serialPort, self.address, snap.localAddress, 0, 1, [CMD_DDA, int(speed), masterPosMSB ,masterPosLSB, slaveDeltaMSB, slaveDeltaLSB] ) 	#start sync
 			if p.send():
 				if waitArrival:
-					notif = getNotification( serialPort )
-					if notif.dataBytes[0] == CMD_DDA:
+					notif = getNotification( serialPort, self.address, CMD_DDA )
+					if notif:
 						if printDebug: print "    valid notification for DDA"	# todo: add actual enforement on wrong notification
 					else:
 						return False
@@ -393,7 +415,7 @@ class cartesianClass:
 	# seek to location (all axies). When waitArrival is True, funtion does not return until all seeks are compete
 	# seek will automatically use syncSeek when it is required. Always use the seek function
 	def seek(self, pos, speed, waitArrival = True):
-		curX, curY, curZ = self.x.getPos(), self.y.getPos(), self.z.getPos()
+		curX, curY, curZ = self.getPos()
 		x, y, z = pos
 		if x <= self.x.limit and y <= self.y.limit and z <= self.z.limit:
 			if printDebug: print "seek from [", curX, curY, curZ, "] to [", x, y, z, "]"
@@ -411,7 +433,7 @@ class cartesianClass:
 	
 	# perform syncronised x/y movement. This is called by seek when needed.
 	def syncSeek(self, pos, speed, waitArrival = True):
-		curX, curY = self.x.getPos(), self.y.getPos()
+		curX, curY = getPositions( [self.x, self.y] )	# both positions in one round trip
 		newX, newY, nullZ = pos
 		deltaX = abs( curX - newX )		# calc delta movements
 		deltaY = abs( curY - newY )
@@ -435,23 +457,17 @@ class cartesianClass:
 	
 	# get current position of all three axies	
 	def getPos(self):
-		return self.x.getPos(), self.y.getPos(), self.z.getPos()
+		return tuple( getPositions( [self.x, self.y, self.z] ) )
 	
 	# stop all motors
 	def stop(self):
-		self.x.forward( 0 )
-		self.y.forward( 0 )
-		self.z.forward( 0 )
+		sendToAxes( [self.x, self.y, self.z], [CMD_FORWARD, 0] )
 
 	# free all motors (no current on coils)
 	def free(self):
-		self.x.free()
-		self.y.free()
-		self.z.free()
+		sendToAxes( [self.x, self.y, self.z], [CMD_FREE] )
 	def setPower(self, power):
-		self.x.setPower( power )
-		self.y.setPower( power )
-		self.z.setPower( power )
+		sendToAxes( [self.x, self.y, self.z], [CMD_SETPOWER, int( power * 0.63 )] )
 	#def lockout():
 	#keep sending power down commands to all board every second
 
@@ -24,6 +24,9 @@ import os
 import sys
 import getopt
 import RepRapArduinoSerialSender
+#Init adds the fabmetheus_utilities folder to the path, for the binary gcode reader.
+import __init__
+import binary_gcode
 
 help_message = '''
 Usage:	send [options] <filename or gcode> [<filename or gcode>...]
@@ -42,8 +45,16 @@ Usage:	send [options] <filename or gcode> [<filename or gcode>...]
 	--baud    : Set the baud rate to use
 	       -b : defaults to 19200
 
+	--stream  : Stream the g-code, keeping several numbered lines in the
+	       -s : firmware buffer instead of waiting for each "ok".
+
+	--window  : Set the number of lines in flight when streaming
+	       -w : defaults to 4
+
 You may call this with either a single statement of g-code
 to be sent to the arduino, or with the name of a g-code file.
+The file may also be a binary move stream written by the compact
+binary export plugin, which is read back into g-code lines.
 ------------------------------------------------------------------
 Copyright (C) 2008 Brendan Erwin
 Copyright (C) 2008 John Gilmore
@@ -75,6 +86,8 @@ def main(argv=None):
 	verbose = 1
 	baud = 19200
 	reset = True
+	stream = False
+	window = 4
 	if os.name == "posix":
 		port = "/dev/ttyUSB0"
 	elif os.name == "nt":
@@ -87,7 +100,7 @@ def main(argv=None):
 
 	try:
 		try:
-			opts, argv = getopt.getopt(argv[1:], "vqnhb:p:", ["verbose","quiet","noreset","help","baud=","port="])
+			opts, argv = getopt.getopt(argv[1:], "vqnhsb:p:w:", ["verbose","quiet","noreset","help","stream","baud=","port=","window="])
 		except getopt.error, msg:
 			raise Usage(msg)
 
@@ -110,6 +123,10 @@ def main(argv=None):
 				raise Usage(help_message)
 			elif option in ("-b", "--baud" ):
 					baud = int(value)
+			elif option in ("-s", "--stream" ):
+				stream = True
+			elif option in ("-w", "--window" ):
+				window = int(value)
 
 		if verbose:
 			print "Arduino port set to " + port
@@ -121,16 +138,25 @@ def main(argv=None):
 		return 2
 
 
-	sender = RepRapArduinoSerialSender.RepRapArduinoSerialSender(port, baud, verbose>1)
+	if stream:
+		sender = RepRapArduinoSerialSender.RepRapArduinoStreamingSender(port, baud, verbose>1, window)
+	else:
+		sender = RepRapArduinoSerialSender.RepRapArduinoSerialSender(port, baud, verbose>1)
 	if reset:
 		sender.reset()
 
 	for filename in argv:
 		processfile(filename,sender,verbose)
 
+	if stream:
+		sender.waitUntilDone()
+		if verbose:
+			print sender.getMetricsString()
+	sender.close()
+
 def processfile(filename,sender,verbose):
 	try:
-		datafile = open(filename)
+		datafile = open(filename, "rb")
 	except IOError:
 		#Ignore verbosity settings here, as if it's a typo we'll want to know.
 		line=filename
@@ -144,7 +170,13 @@ def processfile(filename,sender,verbose):
 			sys.exit(-1)
 
 	try:
-		for line in datafile:
+		lines = datafile
+		if binary_gcode.isBinaryGcode(datafile.read(len(binary_gcode.globalBinaryGcodeBeginning))):
+			datafile.seek(0)
+			lines = binary_gcode.BinaryGcodeReader(datafile.read())
+		else:
+			datafile.seek(0)
+		for line in lines:
 			line=line.rstrip()
 			# Ignore lines with comments (not technically correct, should ignore only the comment,
 			# but all gcode files that I've actually seen so far don't have code on comment lines.
@@ -19,6 +19,8 @@ except:
 	print('You do not have pySerial installed, which is needed to control the serial port.')
 	print('Information on pySerial is at:\nhttp://pyserial.wiki.sourceforge.net/pySerial')
 
+import collections
+
 
 offset_payload = 5
 offset_hdb1 = 2
@@ -32,6 +34,10 @@ printOutgoingPackets = False
 printIncomingPackets = False
 printFailedPackets = False
 
+readChunkSize = 64	# most bytes read from serial at once, a packet is at most 6 + 15 bytes
+maximumQueuedPackets = 32	# most unclaimed packets kept by a packet reader, the oldest are dropped when there are more
+packetReaders = {}	# packet reader of each serial port, so bytes read past the end of a packet are kept for the next one
+
 #this is done again in full decode, but needed here so num bytes to expect is known.
 def getPacketLen(buffer):	
 	l = breakHDB1( buffer[offset_hdb1] )
@@ -44,54 +50,155 @@ def getPacketLen(buffer):
 
 #wait for a packet on serial - note : packets addressed to something other than 0 get recieved if you try sending to a non existant pcb (looped round). should we delete or pass on? (they cause errors right now in getpacket)
 def getPacket(ser):
-	buffer = []
-	while 1:
-		byte = ser.read()							# read serial byte.
-		if len(byte) > 0:
-			buffer.append( ord (byte) )					# add serial byte to buffer.
-		else:
-			print "Error: Serial timeout"		#clear buffer on timeout?		
-			return False							# timeout has occured.
-		#TODO - add check for sync on first byte
-		if len(buffer) > 4:							# one packet length is recieved (HDB1?).
-			expectedLength = getPacketLen(buffer) + offset_payload + 1;	# read num data bytes.
-			if len(buffer) >= expectedLength:				# check we have enough data, otherwise continue reading from serial.
-				#print "############PR#############"
-				p = SNAPPacket( ser, 0, 0, 0, 0, [] )			# create empty packet
-				for b in buffer:
-					p.addByte(b)					# add byte to packet
+	return getPacketReader(ser).getPacket()
+
+#get the packet reader which keeps the buffered bytes and the unclaimed packets of a serial port
+def getPacketReader(ser):
+	if ser not in packetReaders:
+		packetReaders[ser] = PacketReader(ser)
+	return packetReaders[ser]
+
+#calculate the checksum of a sequence of bytes with the checksum table
+def getChecksum(checkedBytes):
+	crc = 0
+	for d in checkedBytes:
+		crc = checksumTable[d ^ crc]
+	return crc
+
+#make the checksum table, entry i is the crc of the byte i, computed bit by bit like the PIC code
+def makeChecksumTable():
+	bitCRCs = [0x5e, 0xbc, 0x61, 0xc2, 0x9d, 0x23, 0x46, 0x8c]
+	table = []
+	for i in range(256):
+		crc = 0
+		for bit in range(8):
+			if (i & (1 << bit)) != 0:
+				crc ^= bitCRCs[bit]
+		table.append(crc)
+	return table
+
+checksumTable = makeChecksumTable()
+
+#forget the packet reader of a serial port which is closed, with the bytes and the packets it was keeping
+def removePacketReader(ser):
+	if ser in packetReaders:
+		del packetReaders[ser]
+
+#send packets to different devices back to back, then collect their acknowledgements in whatever order they arrive.
+#this saves a round trip for each extra device, because the devices work on their packets at the same time.
+#the acks only tell which device they are from, so there must be at most one packet for each device.
+#the packets left from earlier packets to the devices are dropped before sending, and a packet which gets a NAK is sent again.
+#returns a list of True or False for the packets, like send does for one packet.
+def sendPackets(packets):
+	results = [False] * len(packets)
+	retriesLeft = retries
+	unacknowledged = range(len(packets))
+	while retriesLeft > 0 and len(unacknowledged) > 0:
+		for i in unacknowledged:
+			getPacketReader(packets[i].serial).discardPackets(packets[i].DAB)
+			packets[i].encode()
+			packets[i].sendBytes()
+		waitingAddresses = {}
+		for i in unacknowledged:
+			waitingAddresses[packets[i].DAB] = i
+		negativelyAcknowledged = []
+		for i in unacknowledged:
+			ack = getPacketReader(packets[i].serial).getPacket(lambda packet: packet.ACK == 1 and packet.SAB in waitingAddresses)
+			if not ack:
+				print "Error: ACK not recieved"
+				break
+			if ack.NAK == 1:
+				print "Error: NAK recieved"
+				negativelyAcknowledged.append(waitingAddresses.pop(ack.SAB))
+				continue
+			results[waitingAddresses.pop(ack.SAB)] = True
+		unacknowledged = waitingAddresses.values() + negativelyAcknowledged
+		retriesLeft = retriesLeft - 1
+	if len(unacknowledged) > 0:
+		print "Error: Packet send FAILED (or reply)"
+	return results
+
+#class for reading packets from serial in chunks.
+#the bytes are framed into packets by a state machine over a bytearray: find the sync byte, wait for the header, then wait for the data and crc.
+#a packet with a wrong crc is dropped and the framing starts again after its sync byte.
+#at most maximumQueuedPackets unclaimed packets are kept, so packets which nothing waits for do not pile up.
+class PacketReader:
+	def __init__(self, serial):
+		self.buffer = bytearray()
+		self.packets = collections.deque(maxlen=maximumQueuedPackets)	# packets which were read while waiting for a different packet
+		self.serial = serial
+
+	#drop the packets from a device, after reading the packets which are already waiting, so an old ack, reply or notification is not taken for the answer to the next packet
+	def discardPackets(self, address):
+		self.readWaitingPackets()
+		for p in list(self.packets):
+			if p.SAB == address:
+				self.packets.remove(p)
+
+	#get the next framed packet from the buffer, or None if the buffer does not have a whole packet yet
+	def framePacket(self):
+		while True:
+			syncIndex = self.buffer.find(chr(0x54))
+			if syncIndex < 0:
+				del self.buffer[:]
+				return None
+			del self.buffer[:syncIndex]
+			if len(self.buffer) < offset_payload:
+				return None
+			packetLength = breakHDB1(self.buffer[offset_hdb1]) + offset_payload + 1
+			if len(self.buffer) < packetLength:
+				return None
+			packetBytes = self.buffer[:packetLength]
+			if getChecksum(packetBytes[1:-1]) == packetBytes[-1]:
+				del self.buffer[:packetLength]
+				p = SNAPPacket( self.serial, 0, 0, 0, 0, [] )
+				p.bytes = list(packetBytes)
 				p.decode()
-				if printIncomingPackets:		
+				if printIncomingPackets:
 					print "###INCOMING PACKET##"
 					p.printPacket()
 					print "###END INCOMING PACKET##"
-				return p						# return recieved packet
-				#need to check if packet is for pc (0), if not send on.
+				return p
+			if printFailedPackets:
+				print "Error: dropped a packet with a bad checksum", list(packetBytes)
+			del self.buffer[:1]
+
+	#wait for a packet, the first one for which isWanted is True if it is given. Returns False on timeout.
+	def getPacket(self, isWanted=None):
+		for p in self.packets:
+			if isWanted == None or isWanted(p):
+				self.packets.remove(p)
+				return p
+		while True:
+			p = self.framePacket()
+			if p != None:
+				if isWanted == None or isWanted(p):
+					return p
+				self.packets.append(p)
+				continue
+			chunk = self.serial.read(max(1, min(self.serial.inWaiting(), readChunkSize)))
+			if len(chunk) == 0:
+				print "Error: Serial timeout"		# timeout has occured.
+				return False
+			self.buffer.extend(chunk)
+
+	#queue the whole packets among the bytes which are waiting on serial, without waiting for more
+	def readWaitingPackets(self):
+		numberWaiting = self.serial.inWaiting()
+		if numberWaiting > 0:
+			self.buffer.extend(self.serial.read(numberWaiting))
+		while True:
+			p = self.framePacket()
+			if p == None:
+				return
+			self.packets.append(p)
 
 #class for checksum calculator
 class SNAPChecksum:
 	def __init__(self):
 		self.crc = 0
 	def addData(self, data): 
-		#byte i = (byte)(data ^ self.crc)
-		i = data ^ self.crc
-		self.crc = 0
-		if((i & 1) != 0):
-			self.crc ^= 0x5e
-		if((i & 2) != 0):
-			self.crc ^= 0xbc
-		if((i & 4) != 0):
-			self.crc ^= 0x61
-		if((i & 8) != 0):
-			self.crc ^= 0xc2
-		if((i & 0x10) != 0):
-			self.crc ^= 0x9d
-		if((i & 0x20) != 0):
-			self.crc ^= 0x23
-		if((i & 0x40) != 0):
-			self.crc ^= 0x46
-		if((i & 0x80) != 0):
-			self.crc ^= 0x8c
+		self.crc = checksumTable[data ^ self.crc]
 		return data
 	def getResult(self):
 		return self.crc
@@ -131,10 +238,7 @@ class SNAPPacket:
 		for d in self.dataBytes:	
 			self.bytes.append( 0xFF & d )				#DATA
 
-		checksum = SNAPChecksum()
-		for d in self.bytes[1:]:
-			checksum.addData(d)
-		self.CRC = checksum.getResult()
+		self.CRC = getChecksum(self.bytes[1:])
 		self.bytes.append( self.CRC )					#CRC
 		#print self.bytes
 		self.encoded = True
@@ -165,10 +269,7 @@ class SNAPPacket:
 
 	#calculate checksum, compare to value in recieved packet
 	def check(self):					
-		newChecksum = SNAPChecksum()
-		for d in self.bytes[1:-1]:
-			newChecksum.addData(d)
-		testCRC = newChecksum.getResult()
+		testCRC = getChecksum(self.bytes[1:-1])
 		if testCRC == self.CRC:
 			self.valid = True
 			return True
@@ -179,9 +280,7 @@ class SNAPPacket:
 	#actual sending of data packet (self.bytes)
 	def sendBytes(self):
 		if self.encoded == True:
-			for d in self.bytes:
-				#print "sending", d, chr(d)
-				self.serial.write(chr(d))	
+			self.serial.write(str(bytearray(self.bytes)))	# send the whole packet in one write
 		else:
 			print "Error: packet not encoded"
 	
@@ -190,6 +289,7 @@ class SNAPPacket:
 		self.encode()
 		retriesLeft = retries
 		while retriesLeft > 0:				# try sending define number of times only
+			getPacketReader(self.serial).discardPackets(self.DAB)	# drop packets left from earlier packets, so only an answer to this one counts
 			self.sendBytes()			# send data
 			if printOutgoingPackets:
 				print "###OUTGOING PACKET##"
@@ -197,10 +297,10 @@ class SNAPPacket:
 				self.printPacket()
 				print "###END OUTGOING PACKET##"			
 				
-			ack = getPacket(self.serial)		# await ack, returns false on timout
+			ack = getPacketReader(self.serial).getPacket(lambda packet: packet.ACK == 1 and packet.SAB == self.DAB)		# await ack, keeping other packets for later, returns false on timout
 			if ack:					
 				ack.decode()
-				if ack.ACK == 1 and ack.SAB == self.DAB:		# check that packet is an acknoledgement and that it is from the device we just messaged.
+				if ack.ACK == 1 and ack.NAK == 0 and ack.SAB == self.DAB:		# check that packet is an acknoledgement, not a nak, and that it is from the device we just messaged.
 					return True
 				#do some check on ack - TODO
 				if printFailedPackets:
@@ -220,9 +320,9 @@ class SNAPPacket:
 		print "Error: Packet send FAILED (or reply)"
 		return False
 		
-	# get a modules reply packet (not ack)
+	# get a modules reply packet (not ack), the first one from the device this packet was sent to with the command of this packet
 	def getReply(self):
-		rep = getPacket(self.serial)
+		rep = getPacketReader(self.serial).getPacket(lambda packet: packet.ACK == 0 and packet.SAB == self.DAB and packet.dataBytes[:1] == self.dataBytes[:1])
 		return rep
 	
 	#print packet info to console
@@ -1,3 +1,6 @@
+#Init adds the skeinforge folder to the path, for the gcode layer index.
+import __init__
+from fabmetheus_utilities import gcode_index
 from vector3 import Vector3
 
 # Get the entire text of a file.
@@ -31,21 +34,49 @@ def getIndexOfStartingWithSecond(letter, splitLine):
     return - 1
 
 
+# Read the threads of the layers of a gcode file or text into the layers list.
+# If there is a layer slice and no text, only the header and the layers in the slice are read, by seeking to them through the layer index of the file.
 class gRead:
-    def __init__(self,fileName, layers,gcodeText = ''):
-        if gcodeText == '':
-            gcodeText = getFileText(fileName)
-        textLines = getTextLines(gcodeText)
+    def __init__(self,fileName, layers,gcodeText = '', layerSlice = None):
         self.last_pos = Vector3()
         self.layers = layers
         self.layer = None
         self.thread = None
         self.skeinforge = 0
         self.max_z = -9999999999
+        if gcodeText == '' and layerSlice != None:
+            if self.parseIndexedLayers(fileName, layerSlice):
+                return
+        if gcodeText == '':
+            gcodeText = getFileText(fileName)
+        textLines = getTextLines(gcodeText)
         for line in textLines:
             self.parseLine(line)
         self.newLayer()
 
+    # Parse the header and then the layers in the slice, each starting from the location in the layer index.
+    # @param  fileName name of the gcode file
+    # @param  layerSlice slice of the layer indexes to read
+    # @return  False if the file has no layer tags, so it has to be parsed whole
+    def parseIndexedLayers(self, fileName, layerSlice):
+        gcodeIndex = gcode_index.getGcodeIndex(fileName)
+        if len(gcodeIndex.layers) < 1:
+            return False
+        for line in getTextLines(gcodeIndex.getHeaderText()):
+            self.parseLine(line)
+        if self.thread:
+            self.thread = []
+        for layerIndex in range(len(gcodeIndex.layers))[layerSlice]:
+            indexedLayer = gcodeIndex.layers[layerIndex]
+            self.newLayer()
+            if indexedLayer.startLocation != None:
+                self.last_pos = Vector3(indexedLayer.startLocation[0], indexedLayer.startLocation[1], indexedLayer.startLocation[2])
+                self.max_z = max(self.max_z, self.last_pos.z)
+            for line in getTextLines(gcodeIndex.getLayerText(layerIndex)):
+                self.parseLine(line)
+        self.newLayer()
+        return True
+
     def parseLine(self, line):
         if line.startswith( "(" ):
             if line.startswith( "(<layer>" ):
@@ -32,6 +32,8 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 globalRepositoryDialogListTable = {}
 globalProfileSaveListenerListTable = {}
 globalCloseListTables = [ globalRepositoryDialogListTable, globalProfileSaveListenerListTable ]
+globalProfileLinesCache = {}
+globalProgressFunction = None
 globalSpreadsheetSeparator = '\t'
 globalTemporaryOverrides = {}
 
@@ -102,6 +104,16 @@ def addPluginsToMenu( directoryPath, menu, pluginFileNames ):
 	for pluginFileName in pluginFileNames:
 		ToolDialog().addPluginToMenu( menu, os.path.join( directoryPath, pluginFileName ) )
 
+def addProfileDirectoryToCache(directory):
+	"Read all the settings files in a profile directory into the profile cache in a single pass."
+	try:
+		directoryListing = os.listdir(directory)
+	except OSError:
+		return
+	for fileName in directoryListing:
+		if fileName.endswith('.csv'):
+			getProfileLines(os.path.join(directory, fileName))
+
 def cancelRepository(repository):
 	"Read the repository then set all the entities to the read repository values."
 	getReadRepository(repository)
@@ -245,6 +257,23 @@ def getProfileBaseNameSynonym(repository):
 		return repository.baseNameSynonym
 	return os.path.join(repository.getProfileDirectory(), repository.baseNameSynonym)
 
+def getProfileLines(fileName):
+	"Get the lines of a settings file, from the profile cache if the file has not been modified since it was read."
+	global globalProfileLinesCache
+	try:
+		fileStat = os.stat(fileName)
+	except OSError:
+		removeProfileFromCache(fileName)
+		return []
+	fileStamp = (fileStat.st_mtime, fileStat.st_size)
+	if fileName in globalProfileLinesCache:
+		cachedStamp, cachedLines = globalProfileLinesCache[fileName]
+		if cachedStamp == fileStamp:
+			return cachedLines
+	lines = archive.getTextLines(archive.getFileText(fileName, False))
+	globalProfileLinesCache[fileName] = (fileStamp, lines)
+	return lines
+
 def getProfilesDirectoryInAboveDirectory(subName=''):
 	"Get the profiles directory path in the above directory."
 	aboveProfilesDirectory = archive.getSkeinforgePath('profiles')
@@ -266,11 +295,11 @@ def getRadioPluginsAddPluginFrame( directoryPath, importantFileNames, names, rep
 
 def getReadRepository(repository):
 	"Read and return settings from a file."
-	text = archive.getFileText(archive.getProfilesPath(getProfileBaseName(repository)), False)
-	if text == '':
+	lines = getProfileLines(archive.getProfilesPath(getProfileBaseName(repository)))
+	if len(lines) == 0:
 		if repository.baseNameSynonym != None:
-			text = archive.getFileText(archive.getProfilesPath(getProfileBaseNameSynonym(repository)), False)
-	if text == '':
+			lines = getProfileLines(archive.getProfilesPath(getProfileBaseNameSynonym(repository)))
+	if len(lines) == 0:
 		print('The default %s will be written in the .skeinforge folder in the home directory.' % repository.title.lower() )
 		text = archive.getFileText(getProfilesDirectoryInAboveDirectory(getProfileBaseName(repository)), False)
 		if text != '':
@@ -278,7 +307,7 @@ def getReadRepository(repository):
 		writeSettings(repository)
 		temporaryApplyOverrides(repository)
 		return repository
-	readSettingsFromText(repository, text)
+	readSettingsFromLines(repository, lines)
 	temporaryApplyOverrides(repository)
 	return repository
 
@@ -412,7 +441,10 @@ def printProgress(layerIndex, procedureName):
 	printProgressByString('%s layer count %s...' % (procedureName.capitalize(), layerIndex + 1))
 
 def printProgressByString(progressString):
-	"Print progress string."
+	"Print progress string, or pass it to the progress function if there is one."
+	if globalProgressFunction != None:
+		globalProgressFunction(progressString)
+		return
 	sys.stdout.write(progressString)
 	sys.stdout.write(chr(27) + '\r')
 	sys.stdout.flush()
@@ -435,15 +467,24 @@ def quitWindows( event=None ):
 	for globalRepositoryDialogValue in globalRepositoryDialogValues:
 		quitWindow(globalRepositoryDialogValue.root)
 
-def readSettingsFromText( repository, text ):
-	"Read settings from a text."
-	lines = archive.getTextLines(text)
+def readSettingsFromLines(repository, lines):
+	"Read settings from the lines of a settings file."
 	shortDictionary = {}
 	for setting in repository.preferences:
 		shortDictionary[getShortestUniqueSettingName(setting.name, repository.preferences)] = setting
 	for lineIndex in xrange(len(lines)):
 		setRepositoryToLine(lineIndex, lines, shortDictionary)
 
+def readSettingsFromText( repository, text ):
+	"Read settings from a text."
+	readSettingsFromLines(repository, archive.getTextLines(text))
+
+def removeProfileFromCache(fileName):
+	"Remove a settings file from the profile cache, if it is there."
+	global globalProfileLinesCache
+	if fileName in globalProfileLinesCache:
+		del globalProfileLinesCache[fileName]
+
 def saveAll():
 	"Save all the dialogs."
 	for globalRepositoryDialogValue in getGlobalRepositoryDialogValues():
@@ -582,6 +623,7 @@ def writeSettings(repository):
 	profilesDirectoryPath = archive.getProfilesPath(getProfileBaseName(repository))
 	archive.makeDirectory(os.path.dirname(profilesDirectoryPath))
 	archive.writeFileText(profilesDirectoryPath, getRepositoryText(repository))
+	removeProfileFromCache(profilesDirectoryPath)
 	for setting in repository.preferences:
 		setting.updateSaveListeners()
 
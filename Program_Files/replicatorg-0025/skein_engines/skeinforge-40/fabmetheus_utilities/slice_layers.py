@@ -0,0 +1,134 @@
+"""
+Slice_layers is a collection of utilities to write and read slice layers in a compact binary format, which the craft chain hands from carve to preface instead of svg text.
+
+The slice layers text starts with the lines of the slice dictionary in the key=value format, so that the procedure names can be found the same way as in svg and gcode text, and the lines end with an empty line.  After that come the original xml comment, the number of layers and the offsets of the layers, then for each layer its z, its bridge rotation, the number of points of each loop and the little endian double coordinates of the points.  Because the layers are indexed, a layer can be read without reading the layers before it.
+
+The z and the coordinates are rounded to the decimal places carried, so the layers read are the same as the layers read from the svg of the same procedure.  The slice dictionary also has the unrounded corners, layer thickness, perimeter width and volume, so that the svg written from slice layers text is the same as the svg written directly by the procedure.
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import euclidean
+import array
+import cStringIO
+import struct
+import sys
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/02/05 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalIsHandingOff = False
+globalLayerStruct = struct.Struct('<dBddI')
+globalSliceLayersBeginning = 'sliceLayers=1\n'
+
+
+def getCoordinatesString(coordinates):
+	'Get the little endian string of the double coordinates.'
+	coordinatesArray = array.array('d', coordinates)
+	if sys.byteorder != 'little':
+		coordinatesArray.byteswap()
+	return coordinatesArray.tostring()
+
+def getLayerString(decimalPlacesCarried, rotatedLoopLayer):
+	'Get the binary string of a rotated loop layer.'
+	coordinates = []
+	loopLengths = []
+	for loop in rotatedLoopLayer.loops:
+		if len(loop) > 0:
+			loopLengths.append(len(loop))
+			for point in loop:
+				coordinates.append(euclidean.getRoundedToPlaces(decimalPlacesCarried, point.real))
+				coordinates.append(euclidean.getRoundedToPlaces(decimalPlacesCarried, point.imag))
+	rotation = complex()
+	if rotatedLoopLayer.rotation != None:
+		rotation = complex(str(rotatedLoopLayer.rotation).replace('(', '').replace(')', ''))
+	z = euclidean.getRoundedToPlaces(decimalPlacesCarried, rotatedLoopLayer.z)
+	layerString = globalLayerStruct.pack(z, rotatedLoopLayer.rotation != None, rotation.real, rotation.imag, len(loopLengths))
+	return layerString + struct.pack('<%sI' % len(loopLengths), *loopLengths) + getCoordinatesString(coordinates)
+
+def getSliceLayersText(decimalPlacesCarried, sliceDictionary, rotatedLoopLayers, commentText=''):
+	'Get the slice layers text of the slice dictionary, the rotated loop layers and the original xml comment.'
+	output = cStringIO.StringIO()
+	output.write(globalSliceLayersBeginning)
+	for key in sorted(sliceDictionary.keys()):
+		output.write('%s=%s\n' % (key, sliceDictionary[key]))
+	output.write('\n')
+	output.write(struct.pack('<I', len(commentText)))
+	output.write(commentText)
+	layerStrings = []
+	for rotatedLoopLayer in rotatedLoopLayers:
+		layerStrings.append(getLayerString(decimalPlacesCarried, rotatedLoopLayer))
+	output.write(struct.pack('<I', len(layerStrings)))
+	layerOffset = output.tell() + 8 * len(layerStrings)
+	for layerString in layerStrings:
+		output.write(struct.pack('<Q', layerOffset))
+		layerOffset += len(layerString)
+	for layerString in layerStrings:
+		output.write(layerString)
+	return output.getvalue()
+
+def isSliceLayersText(text):
+	'Determine if the text is slice layers text.'
+	return text.startswith(globalSliceLayersBeginning)
+
+def setIsHandingOff(isHandingOff):
+	'Set whether the craft procedures hand slice layers text to each other instead of svg text.'
+	global globalIsHandingOff
+	globalIsHandingOff = isHandingOff
+
+
+class SliceLayersReader:
+	'A class to read the layers of slice layers text.'
+	def __init__(self, sliceLayersBuffer):
+		'Read the slice dictionary, the original xml comment and the layer offsets.'
+		self.sliceLayersBuffer = sliceLayersBuffer
+		self.sliceDictionary = {}
+		headerEnd = sliceLayersBuffer.find('\n\n')
+		for line in sliceLayersBuffer[len(globalSliceLayersBeginning) : headerEnd].split('\n'):
+			key, value = line.split('=', 1)
+			self.sliceDictionary[key] = value
+		commentIndex = headerEnd + 2 + 4
+		commentLength = struct.unpack_from('<I', sliceLayersBuffer, headerEnd + 2)[0]
+		self.commentText = sliceLayersBuffer[commentIndex : commentIndex + commentLength]
+		numberOfLayersIndex = commentIndex + commentLength
+		self.numberOfLayers = struct.unpack_from('<I', sliceLayersBuffer, numberOfLayersIndex)[0]
+		self.layerOffsets = struct.unpack_from('<%sQ' % self.numberOfLayers, sliceLayersBuffer, numberOfLayersIndex + 4)
+
+	def __len__(self):
+		'Get the number of layers.'
+		return self.numberOfLayers
+
+	def getRotatedLoopLayer(self, layerIndex):
+		'Read the rotated loop layer at the layer index.'
+		layerOffset = self.layerOffsets[layerIndex]
+		z, hasRotation, rotationReal, rotationImaginary, numberOfLoops = globalLayerStruct.unpack_from(self.sliceLayersBuffer, layerOffset)
+		rotatedLoopLayer = euclidean.RotatedLoopLayer(z)
+		if hasRotation:
+			rotatedLoopLayer.rotation = complex(rotationReal, rotationImaginary)
+		loopLengthsIndex = layerOffset + globalLayerStruct.size
+		loopLengths = struct.unpack_from('<%sI' % numberOfLoops, self.sliceLayersBuffer, loopLengthsIndex)
+		coordinatesIndex = loopLengthsIndex + 4 * numberOfLoops
+		coordinates = array.array('d')
+		coordinates.fromstring(self.sliceLayersBuffer[coordinatesIndex : coordinatesIndex + 16 * sum(loopLengths)])
+		if sys.byteorder != 'little':
+			coordinates.byteswap()
+		coordinateIndex = 0
+		for loopLength in loopLengths:
+			loopEnd = coordinateIndex + loopLength + loopLength
+			loopCoordinates = coordinates[coordinateIndex : loopEnd]
+			rotatedLoopLayer.loops.append(map(complex, loopCoordinates[: : 2], loopCoordinates[1 : : 2]))
+			coordinateIndex = loopEnd
+		return rotatedLoopLayer
+
+	def getRotatedLoopLayers(self):
+		'Read all the rotated loop layers.'
+		rotatedLoopLayers = []
+		for layerIndex in xrange(self.numberOfLayers):
+			rotatedLoopLayers.append(self.getRotatedLoopLayer(layerIndex))
+		return rotatedLoopLayers
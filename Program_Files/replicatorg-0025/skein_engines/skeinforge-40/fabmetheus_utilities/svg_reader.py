@@ -1,6 +1,10 @@
 """
 Svg reader.
 
+The glyph outlines of a font in the fonts folder are precompiled into a binary glyphs file in the font_glyphs folder in the .skeinforge folder, for example gentium_basic_regular.glyphs, the first time the font is used, so that the program folder does not have to be writable.  The glyphs file holds the size and modification time of the svg font, the units per em, a table of the characters with their horizontal advance and the little endian double coordinates of the glyph loops for each y axis orientation.  After that the glyphs file is memory mapped instead of parsing the svg font, and each glyph is read when it is first used.  If the svg font changes the glyphs file is made again, and if the font_glyphs folder can not be written the font is parsed every time as before.
+
+The laid out loops of the most recently used texts are kept in a least recently used cache, keyed by the font, the size, the text and the y axis orientation, so a label which is repeated is only laid out once.
+
 """
 
 
@@ -15,9 +19,13 @@ from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import gcodec
 from fabmetheus_utilities import intercircle
 from fabmetheus_utilities import settings
+from fabmetheus_utilities import slice_layers
 from fabmetheus_utilities import svg_writer
+import array
+import collections
 import math
 import os
+import struct
 import sys
 import traceback
 
@@ -179,6 +187,34 @@ def getLabelString(dictionary):
 			return dictionary[key]
 	return ''
 
+def getLoopArraysFromBuffer(buffer, loopsIndex):
+	"Get the real and imaginary arrays of the loops which are at the index of a glyphs buffer."
+	numberOfLoops = struct.unpack_from('<I', buffer, loopsIndex)[0]
+	loopLengths = struct.unpack_from('<%sI' % numberOfLoops, buffer, loopsIndex + 4)
+	coordinatesIndex = loopsIndex + 4 + 4 * numberOfLoops
+	coordinates = array.array('d')
+	coordinates.fromstring(buffer[coordinatesIndex : coordinatesIndex + 16 * sum(loopLengths)])
+	if sys.byteorder != 'little':
+		coordinates.byteswap()
+	loopArrays = []
+	coordinateIndex = 0
+	for loopLength in loopLengths:
+		loopEnd = coordinateIndex + loopLength + loopLength
+		loopArrays.append((coordinates[coordinateIndex : loopEnd : 2], coordinates[coordinateIndex + 1 : loopEnd : 2]))
+		coordinateIndex = loopEnd
+	return loopArrays
+
+def getLoopsString(loops):
+	"Get the binary string of the number of loops, the loop lengths and the coordinates."
+	coordinates = []
+	loopLengths = []
+	for loop in loops:
+		loopLengths.append(len(loop))
+		for point in loop:
+			coordinates.append(point.real)
+			coordinates.append(point.imag)
+	return struct.pack('<I%sI' % len(loopLengths), len(loopLengths), *loopLengths) + slice_layers.getCoordinatesString(coordinates)
+
 def getMatrixSVG(xmlElement):
 	"Get matrixSVG by svgElement."
 	matrixSVG = MatrixSVG()
@@ -249,9 +285,23 @@ def getStyleValue(defaultValue, key, xmlElement):
 	return getStyleValue(defaultValue, key, xmlElement.parent)
 
 def getTextComplexLoops(fontFamily, fontSize, text, yAxisPointingUpward=True):
-	"Get text as complex loops."
+	"Get text as complex loops, from the cache of recently laid out texts if the text is there."
+	textKey = (fontFamily.lower().replace(' ', '_'), fontSize, text, yAxisPointingUpward)
+	if textKey in globalTextComplexLoopsDictionary:
+		textComplexLoops = globalTextComplexLoopsDictionary.pop(textKey)
+	else:
+		textComplexLoops = getTextComplexLoopsByFontReader(getFontReader(fontFamily), fontSize, text, yAxisPointingUpward)
+		if len(globalTextComplexLoopsDictionary) >= globalMaximumTextComplexLoopsLength:
+			globalTextComplexLoopsDictionary.popitem(False)
+	globalTextComplexLoopsDictionary[textKey] = textComplexLoops
+	copiedLoops = []
+	for textComplexLoop in textComplexLoops:
+		copiedLoops.append(textComplexLoop[:])
+	return copiedLoops
+
+def getTextComplexLoopsByFontReader(fontReader, fontSize, text, yAxisPointingUpward):
+	"Get text as complex loops by the font reader."
 	textComplexLoops = []
-	fontReader = getFontReader(fontFamily)
 	horizontalAdvanceX = 0.0
 	for character in text:
 		glyph = fontReader.getGlyph(character, yAxisPointingUpward)
@@ -496,55 +546,161 @@ class FontReader:
 		"Initialize."
 		self.fontFamily = fontFamily
 		self.glyphDictionary = {}
+		self.glyphsBuffer = None
+		self.glyphTable = {}
 		self.glyphXMLElementDictionary = {}
-		self.missingGlyph = None
-		fileName = os.path.join(getFontsDirectoryPath(), fontFamily + '.svg')
-		self.xmlParser = XMLSimpleReader(fileName, None, archive.getFileText(fileName))
+		self.fileName = os.path.join(getFontsDirectoryPath(), fontFamily + '.svg')
+		self.glyphsFileName = os.path.join(archive.getSettingsPath('font_glyphs'), fontFamily + '.glyphs')
+		if self.readGlyphsFile():
+			return
+		self.xmlParser = XMLSimpleReader(self.fileName, None, archive.getFileText(self.fileName))
 		self.fontXMLElement = self.xmlParser.getRoot().getFirstChildWithClassName('defs').getFirstChildWithClassName('font')
 		self.fontFaceXMLElement = self.fontXMLElement.getFirstChildWithClassName('font-face')
 		self.unitsPerEM = float(self.fontFaceXMLElement.attributeDictionary['units-per-em'])
 		glyphXMLElements = self.fontXMLElement.getChildrenWithClassName('glyph')
 		for glyphXMLElement in glyphXMLElements:
 			self.glyphXMLElementDictionary[glyphXMLElement.attributeDictionary['unicode']] = glyphXMLElement
+		self.glyphXMLElementDictionary[''] = self.fontXMLElement.getFirstChildWithClassName('missing-glyph')
+		self.writeGlyphsFile()
+
+	def getFontStatTuple(self):
+		"Get the size and modification time of the svg font, which are stored in the glyphs file so that it is made again when the font changes."
+		fontStat = os.stat(self.fileName)
+		return (fontStat.st_size, fontStat.st_mtime)
 
 	def getGlyph(self, character, yAxisPointingUpward):
-		"Get the glyph for the character."
-		if character not in self.glyphXMLElementDictionary:
-			if self.missingGlyph == None:
-				missingGlyphXMLElement = self.fontXMLElement.getFirstChildWithClassName('missing-glyph')
-				self.missingGlyph = Glyph(self.unitsPerEM, missingGlyphXMLElement, yAxisPointingUpward)
-			return self.missingGlyph
-		if character not in self.glyphDictionary:
-			self.glyphDictionary[character] = Glyph(self.unitsPerEM, self.glyphXMLElementDictionary[character], yAxisPointingUpward)
-		return self.glyphDictionary[character]
+		"Get the glyph for the character, or the missing glyph if the font does not have the character."
+		if character not in self.glyphTable and character not in self.glyphXMLElementDictionary:
+			character = ''
+		glyphKey = (character, yAxisPointingUpward)
+		if glyphKey in self.glyphDictionary:
+			return self.glyphDictionary[glyphKey]
+		if self.glyphsBuffer == None:
+			glyph = Glyph(self.unitsPerEM, self.glyphXMLElementDictionary[character], yAxisPointingUpward)
+		else:
+			horizontalAdvanceX, upwardLoopsIndex, downwardLoopsIndex = self.glyphTable[character]
+			loopsIndex = downwardLoopsIndex
+			if yAxisPointingUpward:
+				loopsIndex = upwardLoopsIndex
+			glyph = Glyph(self.unitsPerEM, None, yAxisPointingUpward)
+			glyph.setByLoopArrays(horizontalAdvanceX, getLoopArraysFromBuffer(self.glyphsBuffer, loopsIndex))
+		self.glyphDictionary[glyphKey] = glyph
+		return glyph
+
+	def readGlyphsFile(self):
+		"Memory map the glyphs file and read its glyph table.  Return True if the glyphs file was read and is up to date."
+		try:
+			glyphsBuffer = archive.getFileBuffer(self.glyphsFileName, False)
+			if glyphsBuffer[: len(globalFontGlyphsBeginning)] != globalFontGlyphsBeginning:
+				return False
+			headerIndex = len(globalFontGlyphsBeginning)
+			fontSize, fontModifiedTime, unitsPerEM, numberOfGlyphs = globalFontGlyphsStruct.unpack_from(glyphsBuffer, headerIndex)
+			if (fontSize, fontModifiedTime) != self.getFontStatTuple():
+				return False
+			glyphTable = {}
+			glyphIndex = headerIndex + globalFontGlyphsStruct.size
+			for glyphNumber in xrange(numberOfGlyphs):
+				characterLength = struct.unpack_from('<H', glyphsBuffer, glyphIndex)[0]
+				glyphIndex += 2
+				character = glyphsBuffer[glyphIndex : glyphIndex + characterLength]
+				glyphIndex += characterLength
+				glyphTable[character] = globalGlyphStruct.unpack_from(glyphsBuffer, glyphIndex)
+				glyphIndex += globalGlyphStruct.size
+		except (EnvironmentError, struct.error):
+			return False
+		self.glyphsBuffer = glyphsBuffer
+		self.glyphTable = glyphTable
+		self.unitsPerEM = unitsPerEM
+		return True
+
+	def writeGlyphsFile(self):
+		"Write the glyph outlines of both y axis orientations to the glyphs file, storing the outlines once if they are the same, and replace the old file in one step so that another process never reads a partial file."
+		characters = sorted(self.glyphXMLElementDictionary.keys())
+		try:
+			fontSize, fontModifiedTime = self.getFontStatTuple()
+		except EnvironmentError:
+			return
+		header = globalFontGlyphsBeginning + globalFontGlyphsStruct.pack(fontSize, fontModifiedTime, self.unitsPerEM, len(characters))
+		loopsIndex = len(header)
+		for character in characters:
+			loopsIndex += 2 + len(character) + globalGlyphStruct.size
+		glyphTableStrings = []
+		loopsStrings = []
+		for character in characters:
+			glyphLoopsIndexes = []
+			oldLoopsString = None
+			for yAxisPointingUpward in [True, False]:
+				glyph = self.getGlyph(character, yAxisPointingUpward)
+				loopsString = getLoopsString(glyph.loops)
+				if loopsString == oldLoopsString:
+					glyphLoopsIndexes.append(glyphLoopsIndexes[-1])
+				else:
+					glyphLoopsIndexes.append(loopsIndex)
+					loopsStrings.append(loopsString)
+					loopsIndex += len(loopsString)
+				oldLoopsString = loopsString
+			glyphString = globalGlyphStruct.pack(glyph.horizontalAdvanceX, glyphLoopsIndexes[0], glyphLoopsIndexes[1])
+			glyphTableStrings.append(struct.pack('<H', len(character)) + character + glyphString)
+		archive.makeDirectory(os.path.dirname(self.glyphsFileName))
+		temporaryFileName = '%s.%s' % (self.glyphsFileName, os.getpid())
+		try:
+			temporaryFile = open(temporaryFileName, 'wb')
+			try:
+				temporaryFile.write(header + ''.join(glyphTableStrings) + ''.join(loopsStrings))
+			finally:
+				temporaryFile.close()
+			if os.path.exists(self.glyphsFileName):
+				os.remove(self.glyphsFileName)
+			os.rename(temporaryFileName, self.glyphsFileName)
+		except EnvironmentError:
+			if os.path.exists(temporaryFileName):
+				os.remove(temporaryFileName)
 
 
 class Glyph:
 	"Class to handle a glyph."
 	def __init__(self, unitsPerEM, xmlElement, yAxisPointingUpward):
-		"Initialize."
-		self.horizontalAdvanceX = float(xmlElement.attributeDictionary['horiz-adv-x'])
+		"Initialize, if there is no xmlElement the glyph is set later by its loop arrays."
+		self.horizontalAdvanceX = 0.0
+		self.loopArrays = None
 		self.loops = []
 		self.unitsPerEM = unitsPerEM
+		if xmlElement == None:
+			return
+		self.horizontalAdvanceX = float(xmlElement.attributeDictionary['horiz-adv-x'])
 		xmlElement.attributeDictionary['fill'] = ''
 		if 'd' not in xmlElement.attributeDictionary:
 			return
 		PathReader(self.loops, xmlElement, yAxisPointingUpward)
 
+	def getLoopArrays(self):
+		"Get the real and imaginary arrays of the loops."
+		if self.loopArrays == None:
+			self.loopArrays = []
+			for loop in self.loops:
+				self.loopArrays.append((array.array('d', [point.real for point in loop]), array.array('d', [point.imag for point in loop])))
+		return self.loopArrays
+
 	def getSizedAdvancedLoops(self, fontSize, horizontalAdvanceX, yAxisPointingUpward=True):
 		"Get loops for font size, advanced horizontally."
-		multiplierX = fontSize / self.unitsPerEM
+		multiplierX = float(fontSize) / self.unitsPerEM
 		multiplierY = multiplierX
 		if not yAxisPointingUpward:
 			multiplierY = -multiplierY
+		horizontalAdvanceX = float(horizontalAdvanceX)
 		sizedLoops = []
-		for loop in self.loops:
-			sizedLoop = []
-			sizedLoops.append(sizedLoop)
-			for point in loop:
-				sizedLoop.append( complex(multiplierX * (point.real + horizontalAdvanceX), multiplierY * point.imag))
+		for reals, imaginaries in self.getLoopArrays():
+			sizedLoops.append(map(complex, map(multiplierX.__mul__, map(horizontalAdvanceX.__add__, reals)), map(multiplierY.__mul__, imaginaries)))
 		return sizedLoops
 
+	def setByLoopArrays(self, horizontalAdvanceX, loopArrays):
+		"Set the horizontal advance and the loops by the real and imaginary arrays of the loops."
+		self.horizontalAdvanceX = horizontalAdvanceX
+		self.loopArrays = loopArrays
+		self.loops = []
+		for reals, imaginaries in loopArrays:
+			self.loops.append(map(complex, reals, imaginaries))
+
 
 class MatrixSVG:
 	"Two by three svg matrix."
@@ -847,6 +1003,8 @@ class SVGReader:
 	def __init__(self):
 		"Add empty lists."
 		self.bridgeRotation = None
+		self.commentText = ''
+		self.root = None
 		self.rotatedLoopLayers = []
 		self.sliceDictionary = None
 		self.stopProcessing = False
@@ -862,6 +1020,12 @@ class SVGReader:
 			isInsideLoops = euclidean.getIsInFilledRegion(rotatedLoopLayer.loops[: loopIndex], euclidean.getLeftPoint(loop))
 			intercircle.directLoop((not isInsideLoops), loop)
 
+	def getCommentElement(self):
+		"Get the comment element which holds the original xml, or None if there is none."
+		if self.root == None:
+			return svg_writer.getCommentElementByText(self.commentText)
+		return svg_writer.getCommentElement(self.root)
+
 	def getRotatedLoopLayer(self):
 		"Return the rotated loop layer."
 		if self.z != None:
@@ -874,6 +1038,9 @@ class SVGReader:
 	def parseSVG(self, fileName, svgText):
 		"Parse SVG text and store the layers."
 		self.fileName = fileName
+		if slice_layers.isSliceLayersText(svgText):
+			self.parseSliceLayers(slice_layers.SliceLayersReader(svgText))
+			return
 		xmlParser = XMLSimpleReader(fileName, None, svgText)
 		self.root = xmlParser.getRoot()
 		if self.root == None:
@@ -891,6 +1058,13 @@ class SVGReader:
 			for rotatedLoopLayer in self.rotatedLoopLayers:
 				self.flipDirectLayer(rotatedLoopLayer)
 
+	def parseSliceLayers(self, sliceLayersReader):
+		"Store the layers of the slice layers reader."
+		self.commentText = sliceLayersReader.commentText
+		self.rotatedLoopLayers = sliceLayersReader.getRotatedLoopLayers()
+		self.sliceDictionary = sliceLayersReader.sliceDictionary
+		self.yAxisPointingUpward = True
+
 	def processXMLElement(self, xmlElement):
 		"Process the xml element."
 		if self.stopProcessing:
@@ -909,8 +1083,12 @@ class SVGReader:
 
 
 globalFontFileNames = None
+globalFontGlyphsBeginning = 'fontGlyphs=1\n'
+globalFontGlyphsStruct = struct.Struct('<QddI')
 globalFontReaderDictionary = {}
 globalGetTricomplexDictionary = {}
+globalGlyphStruct = struct.Struct('<dQQ')
+globalMaximumTextComplexLoopsLength = 1000
 globalGetTricomplexFunctions = [
 	getTricomplexmatrix,
 	getTricomplexrotate,
@@ -952,6 +1130,7 @@ globalProcessSVGElementFunctions = [
 	processSVGElementrect,
 	processSVGElementtext ]
 globalSideAngle = 0.5 * math.pi / float( globalNumberOfCornerPoints )
+globalTextComplexLoopsDictionary = collections.OrderedDict()
 
 
 addFunctionsToDictionary( globalGetTricomplexDictionary, globalGetTricomplexFunctions, 'getTricomplex')
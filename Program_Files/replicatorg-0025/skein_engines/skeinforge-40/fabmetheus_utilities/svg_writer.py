@@ -15,6 +15,7 @@ from fabmetheus_utilities.xml_simple_reader import XMLSimpleReader
 from fabmetheus_utilities import archive
 from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import gcodec
+from fabmetheus_utilities import slice_layers
 from fabmetheus_utilities import xml_simple_reader
 from fabmetheus_utilities import xml_simple_writer
 import cStringIO
@@ -45,6 +46,37 @@ def getCommentElement(xmlElement):
 				return child
 	return None
 
+def getCommentElementByText(commentText):
+	'Get a comment element with the text, or None if the text is empty.'
+	if commentText == '':
+		return None
+	commentElement = xml_simple_reader.XMLElement()
+	commentElement.className = 'comment'
+	commentElement.text = commentText
+	return commentElement
+
+def getOriginalCommentText(xmlElement):
+	'Get the text of the comment which holds the original xmlElement, or an empty string if there is no xmlElement.'
+	if xmlElement == None:
+		return ''
+	if xmlElement.className == 'comment':
+		return xmlElement.text
+	xmlElementOutput = cStringIO.StringIO()
+	xmlElement.addXML(0, xmlElementOutput)
+	textLines = archive.getTextLines(xmlElementOutput.getvalue())
+	commentElementOutput = cStringIO.StringIO()
+	isComment = False
+	for textLine in textLines:
+		lineStripped = textLine.strip()
+		if lineStripped[: len('<!--')] == '<!--':
+			isComment = True
+		if not isComment:
+			if len(textLine) > 0:
+				commentElementOutput.write(textLine + '\n')
+		if '-->' in lineStripped:
+			isComment = False
+	return '%s%s-->\n' % (globalOriginalTextString, commentElementOutput.getvalue())
+
 def getSliceDictionary(xmlElement):
 	'Get the metadata slice attribute dictionary.'
 	for metadataElement in xmlElement.getChildrenWithClassName('metadata'):
@@ -64,6 +96,28 @@ def getSliceXMLElements(xmlElement):
 				sliceXMLElements.append(gXMLElement)
 	return sliceXMLElements
 
+def getSVGBySliceLayersText(fileName, sliceLayersText):
+	'Get the svg text of slice layers text.'
+	sliceLayersReader = slice_layers.SliceLayersReader(sliceLayersText)
+	sliceDictionary = sliceLayersReader.sliceDictionary
+	cornerMaximum = Vector3(getUnroundedFloat(sliceDictionary, 'maxX'), getUnroundedFloat(sliceDictionary, 'maxY'), getUnroundedFloat(sliceDictionary, 'maxZ'))
+	cornerMinimum = Vector3(getUnroundedFloat(sliceDictionary, 'minX'), getUnroundedFloat(sliceDictionary, 'minY'), getUnroundedFloat(sliceDictionary, 'minZ'))
+	perimeterWidth = None
+	if 'perimeterWidth' in sliceDictionary:
+		perimeterWidth = getUnroundedFloat(sliceDictionary, 'perimeterWidth')
+	svgWriter = SVGWriter(
+		euclidean.getBooleanFromValue(sliceDictionary['addLayerTemplateToSVG']),
+		cornerMaximum,
+		cornerMinimum,
+		int(sliceDictionary['decimalPlacesCarried']),
+		getUnroundedFloat(sliceDictionary, 'layerThickness'),
+		perimeterWidth)
+	if 'unroundedVolume' in sliceDictionary:
+		svgWriter.volume = float(sliceDictionary['unroundedVolume'])
+	rotatedLoopLayers = sliceLayersReader.getRotatedLoopLayers()
+	commentElement = getCommentElementByText(sliceLayersReader.commentText)
+	return svgWriter.getReplacedSVGTemplate(fileName, sliceDictionary['procedureName'], rotatedLoopLayers, commentElement)
+
 def getSVGByLoopLayers(addLayerTemplateToSVG, carving, rotatedLoopLayers):
 	'Get the svg text.'
 	if len(rotatedLoopLayers) < 1:
@@ -77,10 +131,23 @@ def getSVGByLoopLayers(addLayerTemplateToSVG, carving, rotatedLoopLayers):
 		carving.getCarveLayerThickness())
 	return svgWriter.getReplacedSVGTemplate(carving.fileName, 'basic', rotatedLoopLayers, carving.getFabmetheusXML())
 
+def getSVGTextIfSliceLayers(fileName, text):
+	'Get the svg text if the text is slice layers text, otherwise return the text.'
+	if slice_layers.isSliceLayersText(text):
+		return getSVGBySliceLayersText(fileName, text)
+	return text
+
 def getTruncatedRotatedBoundaryLayers(repository, rotatedLoopLayers):
 	'Get the truncated rotated boundary layers.'
 	return rotatedLoopLayers[repository.layersFrom.value : repository.layersTo.value]
 
+def getUnroundedFloat(sliceDictionary, key):
+	'Get the unrounded float of a slice dictionary value, or the rounded float if the unrounded value is not in the dictionary.'
+	unroundedKey = 'unrounded' + key[: 1].upper() + key[1 :]
+	if unroundedKey in sliceDictionary:
+		return float(sliceDictionary[unroundedKey])
+	return float(sliceDictionary[key])
+
 def setSVGCarvingCorners(cornerMaximum, cornerMinimum, layerThickness, rotatedLoopLayers):
 	'Parse SVG text and store the layers.'
 	for rotatedLoopLayer in rotatedLoopLayers:
@@ -108,10 +175,12 @@ class SVGWriter:
 		self.cornerMaximum = cornerMaximum
 		self.cornerMinimum = cornerMinimum
 		self.decimalPlacesCarried = decimalPlacesCarried
+		self.decimalPlacesRounded = max(1, int(round(decimalPlacesCarried)))
 		self.layerThickness = layerThickness
 		self.perimeterWidth = perimeterWidth
 		self.textHeight = 22.5
 		self.unitScale = 3.7
+		self.volume = None
 
 	def addLayerBegin(self, layerIndex, rotatedLoopLayer):
 		'Add the start lines for the layer.'
@@ -137,24 +206,7 @@ class SVGWriter:
 		if xmlElement.className == 'comment':
 			xmlElement.setParentAddToChildren(self.svgElement)
 			return
-		commentElement = xml_simple_reader.XMLElement()
-		commentElement.className = 'comment'
-		xmlElementOutput = cStringIO.StringIO()
-		xmlElement.addXML(0, xmlElementOutput)
-		textLines = archive.getTextLines(xmlElementOutput.getvalue())
-		commentElementOutput = cStringIO.StringIO()
-		isComment = False
-		for textLine in textLines:
-			lineStripped = textLine.strip()
-			if lineStripped[: len('<!--')] == '<!--':
-				isComment = True
-			if not isComment:
-				if len(textLine) > 0:
-					commentElementOutput.write(textLine + '\n')
-			if '-->' in lineStripped:
-				isComment = False
-		commentElement.text = '%s%s-->\n' % (globalOriginalTextString, commentElementOutput.getvalue())
-		commentElement.setParentAddToChildren(self.svgElement)
+		getCommentElementByText(getOriginalCommentText(xmlElement)).setParentAddToChildren(self.svgElement)
 
 	def addRotatedLoopLayerToOutput(self, layerIndex, rotatedLoopLayer):
 		'Add rotated boundary layer to the output.'
@@ -216,11 +268,7 @@ class SVGWriter:
 		self.setDimensionTexts('dimY', 'Y: ' + self.getRounded(self.extent.y))
 		self.setDimensionTexts('dimZ', 'Z: ' + self.getRounded(self.extent.z))
 		self.setTexts('numberOfLayers', 'Number of Layers: %s' % len(rotatedLoopLayers))
-		volume = 0.0
-		for rotatedLoopLayer in rotatedLoopLayers:
-			volume += euclidean.getAreaLoops(rotatedLoopLayer.loops)
-		volume *= 0.001
-		self.setTexts('volume', 'Volume: %s cm3' % self.getRounded(volume))
+		self.setTexts('volume', 'Volume: %s cm3' % self.getRounded(self.getVolume(rotatedLoopLayers)))
 		if not self.addLayerTemplateToSVG:
 			self.svgElement.getFirstChildWithClassName('script').removeFromIDNameParent()
 			self.svgElement.getXMLElementByID('isoControlBox').removeFromIDNameParent()
@@ -241,6 +289,40 @@ class SVGWriter:
 		'Get the rounded complex string.'
 		return self.getRounded( point.real ) + ' ' + self.getRounded( point.imag )
 
+	def getSliceLayersText(self, procedureName, rotatedLoopLayers, xmlElement=None):
+		'Get the slice layers text, with the same slice dictionary as the svg text.'
+		sliceDictionary = {
+			'addLayerTemplateToSVG' : str(self.addLayerTemplateToSVG).lower(),
+			'decimalPlacesCarried' : str(self.decimalPlacesCarried),
+			'layerThickness' : self.getRounded(self.layerThickness),
+			'maxX' : self.getRounded(self.cornerMaximum.x),
+			'maxY' : self.getRounded(self.cornerMaximum.y),
+			'maxZ' : self.getRounded(self.cornerMaximum.z),
+			'minX' : self.getRounded(self.cornerMinimum.x),
+			'minY' : self.getRounded(self.cornerMinimum.y),
+			'minZ' : self.getRounded(self.cornerMinimum.z),
+			'procedureName' : procedureName,
+			'unroundedLayerThickness' : repr(self.layerThickness),
+			'unroundedMaxX' : repr(self.cornerMaximum.x),
+			'unroundedMaxY' : repr(self.cornerMaximum.y),
+			'unroundedMaxZ' : repr(self.cornerMaximum.z),
+			'unroundedMinX' : repr(self.cornerMinimum.x),
+			'unroundedMinY' : repr(self.cornerMinimum.y),
+			'unroundedMinZ' : repr(self.cornerMinimum.z),
+			'unroundedVolume' : repr(self.getVolume(rotatedLoopLayers)),
+			'yAxisPointingUpward' : 'true'}
+		if self.perimeterWidth != None:
+			sliceDictionary['perimeterWidth'] = self.getRounded(self.perimeterWidth)
+			sliceDictionary['unroundedPerimeterWidth'] = repr(self.perimeterWidth)
+		commentText = getOriginalCommentText(xmlElement)
+		return slice_layers.getSliceLayersText(self.decimalPlacesCarried, sliceDictionary, rotatedLoopLayers, commentText)
+
+	def getSliceText(self, fileName, procedureName, rotatedLoopLayers, xmlElement=None):
+		'Get the slice layers text if the craft chain is handing off slice layers, otherwise get the svg text.'
+		if slice_layers.globalIsHandingOff:
+			return self.getSliceLayersText(procedureName, rotatedLoopLayers, xmlElement)
+		return self.getReplacedSVGTemplate(fileName, procedureName, rotatedLoopLayers, xmlElement)
+
 	def getSVGStringForLoop( self, loop ):
 		'Get the svg loop string.'
 		if len(loop) < 1:
@@ -257,14 +339,20 @@ class SVGWriter:
 		return loopString
 
 	def getSVGStringForPath( self, path ):
-		'Get the svg path string.'
-		svgLoopString = ''
-		for point in path:
-			stringBeginning = 'M '
-			if len( svgLoopString ) > 0:
-				stringBeginning = ' L '
-			svgLoopString += stringBeginning + self.getRoundedComplexString(point)
-		return svgLoopString
+		'Get the svg path string, rounding the points to the decimal places rounded, the same as getRoundedComplexString.'
+		if len(path) < 1:
+			return ''
+		decimalPlacesRounded = self.decimalPlacesRounded
+		return 'M ' + ' L '.join(['%s %s' % (round(point.real, decimalPlacesRounded), round(point.imag, decimalPlacesRounded)) for point in path])
+
+	def getVolume(self, rotatedLoopLayers):
+		'Get the volume of the rotated loop layers in cubic centimeters, or the volume which was set from the unrounded layers.'
+		if self.volume != None:
+			return self.volume
+		volume = 0.0
+		for rotatedLoopLayer in rotatedLoopLayers:
+			volume += euclidean.getAreaLoops(rotatedLoopLayer.loops)
+		return 0.001 * volume
 
 	def setMetadataNoscriptElement(self, key, prefix, value):
 		'Set the metadata value and the text.'
@@ -3,6 +3,8 @@ The xml_simple_reader.py script is an xml parser that can parse a line separated
 
 This xml parser will read a line seperated xml text and produce a tree of the xml with a root element.  Each element can have an attribute table, children, a class name, parent, text and a link to the root element.
 
+Well formed xml is parsed by the expat parser of the standard library, which is imported as pyexpat because the xml package would hide the xml interpret plugin, and which is much faster than parsing the lines in python.  The entities in the attribute values and text are escaped again, so the tree is the same as the tree from the line parser, which is used for the xml which expat can not parse.
+
 This example gets an xml tree for the xml file boolean.xml.  This example is run in a terminal in the folder which contains boolean.xml and xml_simple_reader.py.
 
 
@@ -39,6 +41,7 @@ from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import gcodec
 from fabmetheus_utilities import xml_simple_writer
 import cStringIO
+import pyexpat
 
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
@@ -62,6 +65,24 @@ def addXMLLine(line, xmlLines):
 				return
 	xmlLines.append(line)
 
+def getEscapedAttributeValue(value):
+	'Get the attribute value with the ampersands and less than signs escaped, like it was in the xml text.'
+	if '&' in value:
+		value = value.replace('&', '&amp;')
+	if '<' in value:
+		value = value.replace('<', '&lt;')
+	return value
+
+def getEscapedText(text):
+	'Get the text with the ampersands, less than and greater than signs escaped, like it was in the xml text.'
+	if '&' in text:
+		text = text.replace('&', '&amp;')
+	if '<' in text:
+		text = text.replace('<', '&lt;')
+	if '>' in text:
+		text = text.replace('>', '&gt;')
+	return text
+
 def getXMLLines(text):
 	'Get the all the xml lines of a text.'
 	accumulatedOutput = None
@@ -132,6 +153,111 @@ def getXMLTagSplitLines(combinedLine):
 	return xmlTagSplitLines
 
 
+class ExpatTreeBuilder:
+	'A class to build the xml tree of an xml simple reader with the expat parser.'
+	def __init__(self, xmlParser):
+		'Initialize and set the expat handlers.'
+		self.isCDATA = False
+		self.parent = xmlParser.parent
+		self.textPiecesList = []
+		self.xmlParser = xmlParser
+		self.xmlText = xmlParser.xmlText.replace('\r', '\n').replace('\n\n', '\n')
+		self.expatParser = pyexpat.ParserCreate()
+		self.expatParser.buffer_text = True
+		self.expatParser.returns_unicode = False
+		self.expatParser.CharacterDataHandler = self.addCharacterData
+		self.expatParser.CommentHandler = self.addComment
+		self.expatParser.EndCdataSectionHandler = self.endCDATA
+		self.expatParser.EndElementHandler = self.endXMLElement
+		self.expatParser.StartCdataSectionHandler = self.startCDATA
+		self.expatParser.StartElementHandler = self.startXMLElement
+
+	def addCharacterData(self, data):
+		'Add the character data to the text pieces of the xml element.'
+		if len(self.textPiecesList) < 1:
+			return
+		if self.isCDATA:
+			self.textPiecesList[-1].append(data)
+		else:
+			self.textPiecesList[-1].append(getEscapedText(data))
+
+	def addComment(self, data):
+		'Add a comment xml element with the indentation of its line.'
+		if self.parent == None:
+			return
+		commentIndex = self.expatParser.CurrentByteIndex
+		indentation = self.xmlText[self.xmlText.rfind('\n', 0, commentIndex) + 1 : commentIndex]
+		if indentation.strip() != '':
+			indentation = ''
+		xmlElement = XMLElement()
+		xmlElement.className = 'comment'
+		xmlElement.text = '%s<!--%s-->\n' % (indentation, data)
+		xmlElement.setParentAddToChildren(self.parent)
+
+	def endCDATA(self):
+		'End the CDATA section.'
+		self.isCDATA = False
+		self.textPiecesList[-1].append(']]>')
+
+	def endXMLElement(self, className):
+		'Set the text of the xml element and go back to its parent.'
+		text = ''.join(self.textPiecesList.pop())
+		if text.strip() != '':
+			self.parent.text = text
+		self.parent = self.parent.parent
+
+	def getIsParsed(self):
+		'Parse the xml text and return True, or remove the partly built tree and return False if the xml is not well formed.'
+		originalParent = self.parent
+		originalRoot = self.xmlParser.root
+		if originalParent != None:
+			numberOfOriginalChildren = len(originalParent.children)
+		try:
+			self.expatParser.Parse(self.xmlText, True)
+		except pyexpat.ExpatError:
+			if originalParent != None:
+				for child in originalParent.children[numberOfOriginalChildren :]:
+					child.removeFromIDNameParent()
+			self.xmlParser.beforeRoot = ''
+			self.xmlParser.root = originalRoot
+			return False
+		self.xmlParser.parent = self.parent
+		return True
+
+	def setBeforeRoot(self):
+		'Set the before root text of the xml simple reader to the lines before the root.'
+		rootIndex = self.expatParser.CurrentByteIndex
+		lineBeginIndex = self.xmlText.rfind('\n', 0, rootIndex) + 1
+		if self.xmlText[lineBeginIndex : rootIndex].strip() == '':
+			rootIndex = lineBeginIndex
+		beforeRootLines = getXMLLines(self.xmlText[: rootIndex])
+		if len(beforeRootLines) > 0:
+			if beforeRootLines[-1] == '':
+				del beforeRootLines[-1]
+		for beforeRootLine in beforeRootLines:
+			self.xmlParser.beforeRoot += beforeRootLine + '\n'
+
+	def startCDATA(self):
+		'Start the CDATA section.'
+		self.isCDATA = True
+		self.textPiecesList[-1].append('<![CDATA[')
+
+	def startXMLElement(self, className, attributeDictionary):
+		'Add an xml element to the parent and make it the parent.'
+		xmlElement = XMLElement()
+		xmlElement.className = className
+		for key, value in attributeDictionary.iteritems():
+			xmlElement.attributeDictionary[key] = getEscapedAttributeValue(value)
+		xmlElement.setParentAddToChildren(self.parent)
+		xmlElement.addToIdentifierDictionaryIFIdentifierExists()
+		if self.xmlParser.root == None:
+			self.xmlParser.root = xmlElement
+			xmlElement.parser = self.xmlParser
+			self.setBeforeRoot()
+		self.parent = xmlElement
+		self.textPiecesList.append([])
+
+
 class XMLElement:
 	'An xml element.'
 	def __init__(self):
@@ -352,9 +478,10 @@ class XMLElement:
 
 	def getRoot(self):
 		'Get the root element.'
-		if self.parent == None:
-			return self
-		return self.parent.getRoot()
+		root = self
+		while root.parent != None:
+			root = root.parent
+		return root
 
 	def getSubChildWithID( self, idReference ):
 		'Get the child which has the idReference.'
@@ -513,11 +640,14 @@ class XMLSimpleReader:
 		self.root = None
 		if parent != None:
 			self.root = parent.getRoot()
+		self.xmlText = xmlText
+		if isinstance(xmlText, str) and xmlText.lstrip().startswith('<?xml'):
+			if ExpatTreeBuilder(self).getIsParsed():
+				return
 		self.lines = getXMLLines(xmlText)
 		for self.lineIndex, line in enumerate(self.lines):
 			self.parseLine(line)
-		self.xmlText = xmlText
-	
+
 	def __repr__(self):
 		'Get the string representation of this parser.'
 		return str( self.root )
@@ -40,6 +40,11 @@ python skeinforge_application/skeinforge_plugins/craft.py test.stl
 
 will slice the file and bring up the analyze windows only and then skeinforge will wait for user input.
 
+To keep skeinforge running as a slicing service, which accepts jobs on a local address, for example:
+python skeinforge_application/skeinforge.py --server localhost:4250
+
+will start the server, which is described in skeinforge_utilities/skeinforge_server.py.
+
 ===Contribute===
 You can contribute by helping develop the manual at:
 http://fabmetheus.crsndoo.com/wiki/index.php/Skeinforge
@@ -226,6 +231,7 @@ from optparse import OptionParser
 from skeinforge_application.skeinforge_utilities import skeinforge_craft
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
+from skeinforge_application.skeinforge_utilities import skeinforge_server
 import os
 import sys
 
@@ -592,6 +598,8 @@ def main():
 	parser.add_option(
 		'-o', '--option', help='set an individual option in the format "module:preference=value"',
 		action='append', type='string', dest='preferences')
+	parser.add_option(
+		'--server', help='serve slicing jobs on an address, host:port for TCP or a path for a Unix socket', action='store', type='string', dest='serverAddress')
 	(options, args) = parser.parse_args()
 	if options.preferencesDirectory:
 		archive.globalTemporarySettingsPath = options.preferencesDirectory
@@ -601,7 +609,9 @@ def main():
 			(prefName, valueName) = prefSpec.split('=', 1)
 			settings.temporaryAddPreferenceOverride(moduleName, prefName, valueName)
 	sys.argv = [sys.argv[0]] + args
-	if len( args ) > 0:
+	if options.serverAddress:
+		skeinforge_server.startServer(options.serverAddress)
+	elif len( args ) > 0:
 		writeOutput( ' '.join(args) )
 	else:
 		settings.startMainLoopFromConstructor(getNewRepository())
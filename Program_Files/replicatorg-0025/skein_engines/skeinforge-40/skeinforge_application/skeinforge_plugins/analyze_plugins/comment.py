@@ -47,6 +47,15 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+def getLineVisitor(fileNameSuffix, gcodeText):
+	'Get the comment skein as a line visitor for the shared parse of skeinforge_analyze, if activate comment is selected.'
+	repository = settings.getReadRepository(CommentRepository())
+	if not repository.activateComment.value:
+		return None
+	skein = CommentSkein()
+	skein.fileName = fileNameSuffix
+	return skein
+
 def getNewRepository():
 	'Get new repository.'
 	return CommentRepository()
@@ -59,8 +68,9 @@ def getWindowAnalyzeFile(fileName):
 def getWindowAnalyzeFileGivenText(fileName, gcodeText):
 	"Write a commented gcode file for a gcode file."
 	skein = CommentSkein()
+	skein.fileName = fileName
 	skein.parseGcode(gcodeText)
-	archive.writeFileMessageEnd('_comment.gcode', fileName, skein.output.getvalue(), 'The commented file is saved as ')
+	skein.getWindow()
 
 def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	"Write a commented gcode file for a skeinforge gcode file, if 'Write Commented File for Skeinforge Chain' is selected."
@@ -104,6 +114,10 @@ class CommentSkein:
 		self.addComment( "Linear move to " + str( location ) + "." );
 		self.oldLocation = location
 
+	def getWindow(self):
+		"Write the commented gcode file."
+		archive.writeFileMessageEnd('_comment.gcode', self.fileName, self.output.getvalue(), 'The commented file is saved as ')
+
 	def parseGcode( self, gcodeText ):
 		"Parse gcode text and store the commented gcode."
 		lines = archive.getTextLines(gcodeText)
@@ -112,7 +126,19 @@ class CommentSkein:
 
 	def parseLine(self, line):
 		"Parse a gcode line and add it to the commented gcode."
-		splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
+		self.visitLine(line, gcodec.getSplitLineBeforeBracketSemicolon(line))
+
+	def setHelicalMoveEndpoint( self, splitLine ):
+		"Get the endpoint of a helical move."
+		if self.oldLocation == None:
+			print( "A helical move is relative and therefore must not be the first move of a gcode file." )
+			return
+		location = gcodec.getLocationFromSplitLine(self.oldLocation, splitLine)
+		location += self.oldLocation
+		self.oldLocation = location
+
+	def visitLine(self, line, splitLine):
+		"Add a gcode line and its split line to the commented gcode."
 		if len(splitLine) < 1:
 			return
 		firstWord = splitLine[0]
@@ -148,15 +174,6 @@ class CommentSkein:
 			self.addComment( "Set extruder speed to " + str( gcodec.getDoubleAfterFirstLetter(splitLine[1]) ) + "." )
 		self.output.write(line + '\n')
 
-	def setHelicalMoveEndpoint( self, splitLine ):
-		"Get the endpoint of a helical move."
-		if self.oldLocation == None:
-			print( "A helical move is relative and therefore must not be the first move of a gcode file." )
-			return
-		location = gcodec.getLocationFromSplitLine(self.oldLocation, splitLine)
-		location += self.oldLocation
-		self.oldLocation = location
-
 
 def main():
 	"Display the comment dialog."
@@ -0,0 +1,342 @@
+"""
+This page is in the table of contents.
+Skeinpreview is a script to write a png preview image of each layer of a gcode file, without a display, so that a skein can be previewed on a machine without Tk.
+
+Skeinpreview draws the layers in the skeinlayer colors.  The extruded lines are in the resistor colors red, orange, yellow, green, blue, purple & brown, and when the extruder is off, the travel line is grey.  The lines of each layer are binned into the layer when the gcode is parsed, then the layers are drawn in the layer worker processes of skeinforge_parallel, each into its own image buffer.  When the layer is drawn zoomed out, the points which are closer than a pixel to the point drawn before them are dropped, so a large file does not draw many lines into the same pixels.
+
+The images are saved in a folder beside the gcode file, with the name of the gcode file followed by _skeinpreview, as layer_0000.png, layer_0001.png and so on.  Each image holds a key of the gcode and the settings it was drawn with, and when the key is the same the image is not drawn again.  A viewer can get the cached image of a layer with getLayerRaster, and show it in a Tk PhotoImage with the getPPMString of the raster.  When the gcode has layer tags, getLayerRaster reads the layer from the gcode file with the layer index of gcode_index, so only that layer is parsed.
+
+==Operation==
+The default 'Activate Skeinpreview' checkbox is off.  When it is on, the functions described below will work when called from the skeinforge toolchain, when it is off, the functions will not be called from the toolchain.  The functions will still be called, whether or not the 'Activate Skeinpreview' checkbox is on, when skeinpreview is run directly.
+
+==Settings==
+===Draw Travel===
+Default is on.
+
+When selected, the travel when the extruder is off will be drawn in grey under the extruded lines.
+
+===Layers===
+====Layers From====
+Default is zero.
+
+The "Layers From" is the index of the bottom layer that will be drawn.  If the layer from index is negative, then the images will start from the layer from index below the top layer.
+
+====Layers To====
+Default is a huge number, which will be limited to the highest index layer.
+
+The "Layers To" is the index of the top layer that will be drawn.  If the layer to index is negative, then the images will go to the layer to index below the top layer.  The layer from until layer to index is a python slice.
+
+===Pixels per Millimeter===
+Default is five.
+
+The scale of the images.  The points of the lines are decimated by the power of two which is not bigger than the pixel size, so when the scale is small, fewer lines are drawn.
+
+===Width===
+====Width of Extrusion Thread====
+Default is three pixels.
+
+The width of the extruded lines.
+
+====Width of Travel Thread====
+Default is one pixel.
+
+The width of the travel lines.
+
+==Examples==
+Below are examples of skeinpreview being used.  These examples are run in a terminal in the folder which contains Screw Holder_penultimate.gcode and skeinpreview.py.
+
+> python skeinpreview.py
+This brings up the skeinpreview dialog.
+
+> python skeinpreview.py Screw Holder_penultimate.gcode
+The skeinpreview images are saved in the Screw_Holder_penultimate_skeinpreview folder.
+
+"""
+
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities.vector3 import Vector3
+from fabmetheus_utilities import archive
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import gcode_index
+from fabmetheus_utilities import gcodec
+from fabmetheus_utilities import layer_raster
+from fabmetheus_utilities import settings
+from skeinforge_application.skeinforge_utilities import skeinforge_parallel
+from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
+from skeinforge_application.skeinforge_utilities import skeinforge_profile
+import hashlib
+import os
+import sys
+import time
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__credits__ = 'Nophead <http://hydraraptor.blogspot.com/>'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalColorNames = ['brown', 'red', 'orange', 'yellow', 'green', 'blue', 'purple']
+globalMargin = 10
+
+
+def getCacheKey(gcodeMD5, repository):
+	'Get the key of the images drawn from the gcode with the md5 and with the settings.'
+	cacheKey = gcodeMD5
+	for setting in [repository.drawTravel, repository.pixelsPerMillimeter, repository.widthOfExtrusionThread, repository.widthOfTravelThread]:
+		cacheKey += ' %s' % setting.value
+	return cacheKey
+
+def getLayerFileName(layerIndex, previewDirectory):
+	'Get the file name of the image of a layer.'
+	return os.path.join(previewDirectory, 'layer_%04d.png' % layerIndex)
+
+def getLayerRaster(fileName, layerIndex, repository=None):
+	'Get the raster of a layer of a gcode file, from the cached image if it was drawn with the same gcode and settings, otherwise draw the layer and cache it.'
+	if repository == None:
+		repository = settings.getReadRepository(SkeinpreviewRepository())
+	skein = SkeinpreviewSkein()
+	gcodeIndex = gcode_index.getGcodeIndex(fileName)
+	if layerIndex < len(gcodeIndex.layers):
+		skein.setIndexedValues(gcodeIndex, repository)
+	else:
+		skein.parseGcode(fileName, archive.getFileText(fileName), repository)
+	raster = skein.getCachedRaster(layerIndex)
+	if raster != None:
+		return raster
+	if layerIndex < len(gcodeIndex.layers):
+		skein.parseIndexedLayer(gcodeIndex, layerIndex)
+	skein.writeLayer(layerIndex)
+	return skein.getCachedRaster(layerIndex)
+
+def getLineVisitor(fileNameSuffix, gcodeText):
+	'Get the skeinpreview skein as a line visitor for the shared parse of skeinforge_analyze, if activate skeinpreview is selected.'
+	repository = settings.getReadRepository(SkeinpreviewRepository())
+	if not repository.activateSkeinpreview.value:
+		return None
+	skein = SkeinpreviewSkein()
+	skein.startTime = time.time()
+	skein.setInitialValues(fileNameSuffix, gcodeText, repository)
+	return skein
+
+def getNewRepository():
+	'Get new repository.'
+	return SkeinpreviewRepository()
+
+def getPreviewDirectory(fileName):
+	'Get the folder of the layer images of a gcode file.'
+	previewDirectory = fileName[: fileName.rfind('.')] + '_skeinpreview'
+	return os.path.join(os.path.dirname(previewDirectory), os.path.basename(previewDirectory).replace(' ', '_'))
+
+def getWindowAnalyzeFile(fileName):
+	'Write the layer images for a gcode file.'
+	gcodeText = archive.getFileText(fileName)
+	return getWindowAnalyzeFileGivenText(fileName, gcodeText)
+
+def getWindowAnalyzeFileGivenText(fileName, gcodeText, repository=None):
+	'Write the layer images for a gcode file given the settings.'
+	if gcodeText == '':
+		return None
+	if repository == None:
+		repository = settings.getReadRepository(SkeinpreviewRepository())
+	skein = SkeinpreviewSkein()
+	skein.startTime = time.time()
+	skein.parseGcode(fileName, gcodeText, repository)
+	skein.getWindow()
+
+def writeOutput(fileName, fileNameSuffix, gcodeText=''):
+	'Write the layer images for a skeinforge gcode file, if activate skeinpreview is selected.'
+	repository = settings.getReadRepository(SkeinpreviewRepository())
+	if not repository.activateSkeinpreview.value:
+		return
+	gcodeText = archive.getTextIfEmpty(fileNameSuffix, gcodeText)
+	getWindowAnalyzeFileGivenText(fileNameSuffix, gcodeText, repository)
+
+
+class SkeinpreviewRepository:
+	'A class to handle the skeinpreview settings.'
+	def __init__(self):
+		'Set the default settings, execute title & settings fileName.'
+		skeinforge_profile.addListsToCraftTypeRepository('skeinforge_application.skeinforge_plugins.analyze_plugins.skeinpreview.html', self)
+		self.activateSkeinpreview = settings.BooleanSetting().getFromValue('Activate Skeinpreview', self, False)
+		self.fileNameInput = settings.FileNameInput().getFromFileName([('Gcode text files', '*.gcode')], 'Open File for Skeinpreview', self, '')
+		self.drawTravel = settings.BooleanSetting().getFromValue('Draw Travel', self, True)
+		settings.LabelSeparator().getFromRepository(self)
+		settings.LabelDisplay().getFromName('- Layers -', self)
+		self.layersFrom = settings.IntSpin().getFromValue(0, 'Layers From (index):', self, 20, 0)
+		self.layersTo = settings.IntSpin().getSingleIncrementFromValue(0, 'Layers To (index):', self, 912345678, 912345678)
+		settings.LabelSeparator().getFromRepository(self)
+		self.pixelsPerMillimeter = settings.FloatSpin().getFromValue(0.5, 'Pixels per Millimeter (ratio):', self, 20.0, 5.0)
+		settings.LabelSeparator().getFromRepository(self)
+		settings.LabelDisplay().getFromName('- Width -', self)
+		self.widthOfExtrusionThread = settings.IntSpin().getSingleIncrementFromValue(0, 'Width of Extrusion Thread (pixels):', self, 5, 3)
+		self.widthOfTravelThread = settings.IntSpin().getSingleIncrementFromValue(0, 'Width of Travel Thread (pixels):', self, 5, 1)
+		self.executeTitle = 'Skeinpreview'
+
+	def execute(self):
+		'Write button has been clicked.'
+		fileNames = skeinforge_polyfile.getFileOrGcodeDirectory(self.fileNameInput.value, self.fileNameInput.wasCancelled)
+		for fileName in fileNames:
+			getWindowAnalyzeFile(fileName)
+
+
+class SkeinpreviewSkein:
+	'A class to bin the threads of a gcode skein into raster layers and write their images.'
+	def addRasterLayer(self, z):
+		'Add a raster layer.'
+		self.addThread()
+		self.rasterLayer = layer_raster.RasterLayer(z)
+		self.rasterLayers.append(self.rasterLayer)
+
+	def addThread(self):
+		'Add the thread to the raster layer, if it is extruded or the travel is drawn.'
+		if len(self.thread) > 1 and (self.extruderActive or self.repository.drawTravel.value):
+			colorName = 'gray'
+			if self.extruderActive:
+				colorName = globalColorNames[self.extrusionNumber % len(globalColorNames)]
+			self.rasterLayer.addThread(colorName, self.extruderActive, self.thread)
+		self.thread = []
+
+	def addLayer(self, sliceIndex):
+		'Write the image of a layer in the layer slice, for skeinforge_parallel.'
+		layerIndex = self.layerIndexes[sliceIndex]
+		if self.getCachedRaster(layerIndex) == None:
+			self.writeLayer(layerIndex)
+		self.distanceFeedRate.addLine(getLayerFileName(layerIndex, self.previewDirectory))
+
+	def getCachedRaster(self, layerIndex):
+		'Get the raster of the cached image of a layer, or None if there is no image drawn with the same gcode and settings, deleting the image if it can not be read.'
+		layerFileName = getLayerFileName(layerIndex, self.previewDirectory)
+		if not os.path.isfile(layerFileName):
+			return None
+		try:
+			raster = layer_raster.getRasterFromPNGString(archive.getFileText(layerFileName, False, 'rb'))
+		except Exception:
+			print('Warning, the cached skeinpreview image %s can not be read, so it will be drawn again.' % archive.getSummarizedFileName(layerFileName))
+			try:
+				os.remove(layerFileName)
+			except OSError:
+				pass
+			return None
+		if raster.textDictionary.get('skeinpreview') != self.cacheKey:
+			return None
+		return raster
+
+	def getWindow(self):
+		'Write the images of the layers in the layer slice.'
+		self.addThread()
+		self.layerIndexes = range(len(self.rasterLayers))[self.repository.layersFrom.value : self.repository.layersTo.value]
+		skeinforge_parallel.getLayerTexts(self, len(self.layerIndexes), 'skeinpreview')
+		print('The skeinpreview images are saved in ' + archive.getSummarizedFileName(self.previewDirectory))
+		print('It took %s to write the skeinpreview images.' % euclidean.getDurationString(time.time() - self.startTime))
+
+	def linearMove(self, splitLine):
+		'Add a linear move to the thread.'
+		location = gcodec.getLocationFromSplitLine(self.oldLocation, splitLine)
+		if not self.isThereALayerStartWord and self.extruderActive:
+			if self.rasterLayer == None or location.z != self.rasterLayer.z:
+				self.addRasterLayer(location.z)
+		if self.rasterLayer != None and self.oldLocation != None:
+			if len(self.thread) == 0:
+				self.thread = [self.oldLocation.dropAxis()]
+			self.thread.append(location.dropAxis())
+			if self.extruderActive:
+				self.cornerMaximum.maximize(location)
+				self.cornerMinimum.minimize(location)
+		self.oldLocation = location
+
+	def parseGcode(self, fileName, gcodeText, repository):
+		'Parse gcode text and bin its threads into raster layers.'
+		self.setInitialValues(fileName, gcodeText, repository)
+		for line in archive.getTextLines(gcodeText):
+			self.parseSplitLine(gcodec.getSplitLineBeforeBracketSemicolon(line))
+		self.addThread()
+
+	def parseIndexedLayer(self, gcodeIndex, layerIndex):
+		'Parse only the gcode text of a layer, read from the file with its index, into the raster layer of the layer index.'
+		indexedLayer = gcodeIndex.layers[layerIndex]
+		self.extruderActive = indexedLayer.isExtruderActive
+		if indexedLayer.startLocation != None:
+			self.oldLocation = Vector3(indexedLayer.startLocation[0], indexedLayer.startLocation[1], indexedLayer.startLocation[2])
+		self.rasterLayers = [None] * layerIndex
+		for line in archive.getTextLines(gcodeIndex.getLayerText(layerIndex)):
+			self.parseSplitLine(gcodec.getSplitLineBeforeBracketSemicolon(line))
+		self.addThread()
+
+	def parseSplitLine(self, splitLine):
+		'Parse a split gcode line and add it to the threads.'
+		if len(splitLine) < 1:
+			return
+		firstWord = splitLine[0]
+		if firstWord == 'G1':
+			self.linearMove(splitLine)
+		elif firstWord == 'M101':
+			self.addThread()
+			self.extruderActive = True
+			self.extrusionNumber += 1
+		elif firstWord == 'M103':
+			self.addThread()
+			self.extruderActive = False
+		elif firstWord == '(<layer>':
+			self.extrusionNumber = 0
+			self.addRasterLayer(float(splitLine[1]))
+
+	def setInitialValues(self, fileName, gcodeText, repository):
+		'Set the threads to their values before the first line.'
+		self.cacheKey = getCacheKey(hashlib.md5(gcodeText).hexdigest(), repository)
+		self.cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
+		self.cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
+		self.distanceFeedRate = gcodec.DistanceFeedRate()
+		self.extruderActive = False
+		self.extrusionNumber = 0
+		self.fileName = fileName
+		self.isThereALayerStartWord = '(<layer>' in gcodeText
+		self.layerWindow = 0
+		self.oldLocation = None
+		self.previewDirectory = getPreviewDirectory(fileName)
+		self.rasterLayer = None
+		self.rasterLayers = []
+		self.repository = repository
+		self.thread = []
+
+	def setIndexedValues(self, gcodeIndex, repository):
+		'Set the values before the first line from the layer index of the gcode, without reading the gcode.'
+		self.setInitialValues(gcodeIndex.fileName, '', repository)
+		self.cacheKey = getCacheKey(gcodeIndex.md5, repository)
+		cornerMinimum, cornerMaximum = gcodeIndex.getCorners()
+		if cornerMaximum != None:
+			self.cornerMaximum = Vector3(cornerMaximum.real, cornerMaximum.imag, 0.0)
+			self.cornerMinimum = Vector3(cornerMinimum.real, cornerMinimum.imag, 0.0)
+		self.isThereALayerStartWord = True
+
+	def visitLine(self, line, splitLine):
+		'Add a gcode line and its split line to the threads.'
+		self.parseSplitLine(splitLine)
+
+	def writeLayer(self, layerIndex):
+		'Draw a layer and write its image, with the cache key.'
+		raster = self.rasterLayers[layerIndex].getRaster(
+			self.cornerMaximum.dropAxis(),
+			self.cornerMinimum.dropAxis(),
+			self.repository.widthOfExtrusionThread.value,
+			globalMargin,
+			self.repository.pixelsPerMillimeter.value,
+			self.repository.widthOfTravelThread.value)
+		raster.textDictionary['skeinpreview'] = self.cacheKey
+		if not os.path.isdir(self.previewDirectory):
+			os.makedirs(self.previewDirectory)
+		archive.writeFileText(getLayerFileName(layerIndex, self.previewDirectory), raster.getPNGString(), 'wb')
+
+
+def main():
+	'Display the skeinpreview dialog.'
+	if len(sys.argv) > 1:
+		getWindowAnalyzeFile(' '.join(sys.argv[1 :]))
+	else:
+		settings.startMainLoopFromConstructor(getNewRepository())
+
+if __name__ == '__main__':
+	main()
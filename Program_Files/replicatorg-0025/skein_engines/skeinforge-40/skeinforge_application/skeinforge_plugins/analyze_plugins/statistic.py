@@ -8,12 +8,36 @@ http://fabmetheus.crsndoo.com/wiki/index.php/Skeinforge_Statistic
 ==Operation==
 The default 'Activate Statistic' checkbox is on.  When it is on, the functions described below will work when called from the skeinforge toolchain, when it is off, the functions will not be called from the toolchain.  The functions will still be called, whether or not the 'Activate Statistic' checkbox is on, when statistic is run directly.
 
+Besides the totals, statistic records the time and distance of each feature in each layer.  The features are the perimeters, the loops and the infill which are extruded, the travel without extrusion and the G4 dwells.  The layers start at the layer tags of skeinforge gcode, or if the tags were deleted by export, at each new height of the extrusion.  The 'Build time' is the distance over the feed rate, as before.  The 'Build time with acceleration' and the feature and layer times come from a trapezoidal acceleration model, in which each move accelerates from its entry speed to its feed rate and decelerates to its exit speed.  The speed at a corner is limited by the maximum jerk and the machine stops at the end and before a dwell, then the entry and exit speeds are planned by looking ahead through the moves.
+
 ==Settings==
 ===Extrusion Diameter over Thickness===
 Default is 1.25.
 
 The 'Extrusion Diameter over Thickness is the ratio of the extrusion diameter over the layer thickness, the default is 1.25.  The extrusion fill density ratio that is printed to the console, ( it is derived quantity not a parameter ) is the area of the extrusion diameter over the extrusion width over the layer thickness.  Assuming the extrusion diameter is correct, a high value means the filament will be packed tightly, and the object will be almost as dense as the filament.  If the fill density ratio is too high, there could be too little room for the filament, and the extruder will end up plowing through the extra filament.  A low fill density ratio means the filaments will be far away from each other, the object will be leaky and light.  The fill density ratio with the default extrusion settings is around 0.68.
 
+===Layer Statistics===
+====Save Layer Statistics as CSV====
+Default is off.
+
+When the 'Save Layer Statistics as CSV' checkbox is on, the time, distance and material of each layer, and the time and distance of each feature in the layer, will be saved as a _layers.csv file, with a row for each layer.
+
+====Save Layer Statistics as JSON====
+Default is off.
+
+When the 'Save Layer Statistics as JSON' checkbox is on, the layer statistics and the totals of each feature will be saved as a _layers.json file.
+
+===Machine Limits===
+====Maximum Acceleration====
+Default is 1000 mm/s2.
+
+The 'Maximum Acceleration' is the acceleration used by the time model to speed up and slow down the moves.
+
+====Maximum Jerk====
+Default is 20 mm/s.
+
+The 'Maximum Jerk' is the largest change of velocity which the machine makes without accelerating.  The speed through a corner is the speed at which the change of direction is the maximum jerk, so a sharp corner is slower than a shallow corner.
+
 ===Print Statistics===
 Default is on.
 
@@ -57,6 +81,8 @@ from fabmetheus_utilities import settings
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
 import cStringIO
+import csv
+import json
 import math
 import sys
 
@@ -66,27 +92,51 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalFeatureNames = ['dwell', 'infill', 'loop', 'perimeter', 'travel']
+
+
+def getLineVisitor(fileNameSuffix, gcodeText):
+	'Get the statistic skein as a line visitor for the shared parse of skeinforge_analyze, if activate statistic is selected.'
+	repository = settings.getReadRepository(StatisticRepository())
+	if not repository.activateStatistic.value:
+		return None
+	skein = StatisticSkein()
+	skein.fileName = fileNameSuffix
+	skein.setInitialValues(repository)
+	return skein
+
 def getNewRepository():
 	'Get new repository.'
 	return StatisticRepository()
 
+def getTrapezoidTime(acceleration, distance, entrySpeed, exitSpeed, speed):
+	'Get the time of a move which accelerates from the entry speed to at most the speed, then decelerates to the exit speed.'
+	doubleAcceleration = acceleration + acceleration
+	accelerationDistance = (speed * speed - entrySpeed * entrySpeed) / doubleAcceleration
+	decelerationDistance = (speed * speed - exitSpeed * exitSpeed) / doubleAcceleration
+	cruiseDistance = distance - accelerationDistance - decelerationDistance
+	if cruiseDistance >= 0.0:
+		return (speed + speed - entrySpeed - exitSpeed) / acceleration + cruiseDistance / speed
+	peakSpeed = math.sqrt(0.5 * (doubleAcceleration * distance + entrySpeed * entrySpeed + exitSpeed * exitSpeed))
+	return (peakSpeed + peakSpeed - entrySpeed - exitSpeed) / acceleration
+
 def getWindowAnalyzeFile(fileName):
 	"Write statistics for a gcode file."
 	return getWindowAnalyzeFileGivenText( fileName, archive.getFileText(fileName) )
 
 def getWindowAnalyzeFileGivenText( fileName, gcodeText, repository=None):
 	"Write statistics for a gcode file."
-	print('')
-	print('')
-	print('Statistics are being generated for the file ' + archive.getSummarizedFileName(fileName) )
+	printStatisticsHeading(fileName)
 	if repository == None:
 		repository = settings.getReadRepository( StatisticRepository() )
 	skein = StatisticSkein()
-	statisticGcode = skein.getCraftedGcode(gcodeText, repository)
-	if repository.printStatistics.value:
-		print( statisticGcode )
-	if repository.saveStatistics.value:
-		archive.writeFileMessageEnd('.txt', fileName, statisticGcode, 'The statistics file is saved as ')
+	writeStatistics(fileName, skein, skein.getCraftedGcode(gcodeText, repository))
+
+def printStatisticsHeading(fileName):
+	'Print the heading of the statistics of a file.'
+	print('')
+	print('')
+	print('Statistics are being generated for the file ' + archive.getSummarizedFileName(fileName) )
 
 def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	"Write statistics for a skeinforge gcode file, if 'Write Statistics File for Skeinforge Chain' is selected."
@@ -96,6 +146,137 @@ def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	if repository.activateStatistic.value:
 		getWindowAnalyzeFileGivenText( fileNameSuffix, gcodeText, repository )
 
+def writeStatistics(fileName, skein, statisticGcode):
+	'Print or save the statistics and save the layer statistics, depending on the settings.'
+	repository = skein.repository
+	if repository.printStatistics.value:
+		print( statisticGcode )
+	if repository.saveStatistics.value:
+		archive.writeFileMessageEnd('.txt', fileName, statisticGcode, 'The statistics file is saved as ')
+	if repository.saveLayerStatisticsCSV.value:
+		archive.writeFileMessageEnd('_layers.csv', fileName, skein.getLayerStatisticsCSV(), 'The layer statistics csv file is saved as ')
+	if repository.saveLayerStatisticsJSON.value:
+		archive.writeFileMessageEnd('_layers.json', fileName, skein.getLayerStatisticsJSON(fileName), 'The layer statistics json file is saved as ')
+
+
+class AccelerationPlanner:
+	"A class to get the times of moves with a trapezoidal acceleration profile, looking ahead through the moves until the machine stops or until the moves after them can not change their speeds."
+	def __init__(self, maximumAcceleration, maximumJerk):
+		"Initialize."
+		self.distances = []
+		self.junctionSpeeds = []
+		self.maximumAcceleration = maximumAcceleration
+		self.maximumJerk = maximumJerk
+		self.oldUnitDirection = None
+		self.speeds = []
+		self.targets = []
+		self.totalTime = 0.0
+
+	def addMove(self, distance, featureName, layerStatistic, speed, unitDirection):
+		"Add a move, with the largest speed at its start for the change of direction from the move before."
+		junctionSpeed = min(speed, self.maximumJerk)
+		if self.oldUnitDirection != None:
+			junctionSpeed = min(speed, self.speeds[-1])
+			directionChange = math.sqrt(
+				(unitDirection[0] - self.oldUnitDirection[0]) ** 2 + (unitDirection[1] - self.oldUnitDirection[1]) ** 2 + (unitDirection[2] - self.oldUnitDirection[2]) ** 2)
+			if directionChange > 0.0:
+				junctionSpeed = min(junctionSpeed, self.maximumJerk / directionChange)
+		self.distances.append(distance)
+		self.junctionSpeeds.append(junctionSpeed)
+		self.oldUnitDirection = unitDirection
+		self.speeds.append(speed)
+		self.targets.append((layerStatistic, featureName))
+
+	def addPlannedTimes(self, numberOfMoves, stopSpeed):
+		"Plan the first moves so that the speed after them is at most the stop speed, add the time of each move to its layer and feature, remove them and return the speed after them."
+		acceleration = self.maximumAcceleration
+		distances = self.distances
+		speeds = self.speeds
+		if acceleration <= 0.0:
+			for moveIndex in xrange(numberOfMoves):
+				self.addTime(moveIndex, distances[moveIndex] / speeds[moveIndex])
+			self.removeMoves(numberOfMoves)
+			return stopSpeed
+		doubleAcceleration = acceleration + acceleration
+		entrySpeeds = self.junctionSpeeds
+		junctionSpeed = stopSpeed
+		for moveIndex in xrange(numberOfMoves - 1, -1, -1):
+			junctionSpeed = min(entrySpeeds[moveIndex], math.sqrt(junctionSpeed * junctionSpeed + doubleAcceleration * distances[moveIndex]))
+			entrySpeeds[moveIndex] = junctionSpeed
+		entrySpeed = entrySpeeds[0]
+		for moveIndex in xrange(numberOfMoves):
+			distance = distances[moveIndex]
+			exitSpeed = stopSpeed
+			if moveIndex < numberOfMoves - 1:
+				exitSpeed = entrySpeeds[moveIndex + 1]
+			exitSpeed = min(exitSpeed, math.sqrt(entrySpeed * entrySpeed + doubleAcceleration * distance))
+			self.addTime(moveIndex, getTrapezoidTime(acceleration, distance, entrySpeed, exitSpeed, speeds[moveIndex]))
+			entrySpeed = exitSpeed
+		self.removeMoves(numberOfMoves)
+		return entrySpeed
+
+	def addTime(self, moveIndex, time):
+		"Add the time of a move to its layer and feature, and to the total time."
+		layerStatistic, featureName = self.targets[moveIndex]
+		layerStatistic.featureTimes[featureName] += time
+		self.totalTime += time
+
+	def flush(self):
+		"Add the times of the moves before the last junction which is at its largest speed even if the machine stops after the last move, so the moves after them can not change their speeds."
+		numberOfMoves = len(self.distances)
+		if numberOfMoves < 2:
+			return
+		if self.maximumAcceleration <= 0.0:
+			self.addPlannedTimes(numberOfMoves - 1, 0.0)
+			return
+		doubleAcceleration = self.maximumAcceleration + self.maximumAcceleration
+		junctionSpeed = 0.0
+		for moveIndex in xrange(numberOfMoves - 1, 0, -1):
+			junctionSpeed = min(self.junctionSpeeds[moveIndex], math.sqrt(junctionSpeed * junctionSpeed + doubleAcceleration * self.distances[moveIndex]))
+			if junctionSpeed == self.junctionSpeeds[moveIndex]:
+				entrySpeed = self.addPlannedTimes(moveIndex, junctionSpeed)
+				self.junctionSpeeds[0] = entrySpeed
+				return
+
+	def removeMoves(self, numberOfMoves):
+		"Remove the first moves, which have been planned."
+		del self.distances[: numberOfMoves]
+		del self.junctionSpeeds[: numberOfMoves]
+		del self.speeds[: numberOfMoves]
+		del self.targets[: numberOfMoves]
+
+	def stop(self):
+		"Plan the moves so that the machine stops after the last move, then add the time of each move to its layer and feature, the next move starts from rest."
+		if len(self.distances) > 0:
+			self.addPlannedTimes(len(self.distances), min(self.speeds[-1], self.maximumJerk))
+		self.oldUnitDirection = None
+
+
+class LayerStatistic:
+	"A class to hold the distance and time of each feature of a layer."
+	def __init__(self, index, z):
+		"Initialize."
+		self.featureDistances = dict.fromkeys(globalFeatureNames, 0.0)
+		self.featureTimes = dict.fromkeys(globalFeatureNames, 0.0)
+		self.index = index
+		self.z = z
+
+	def __repr__(self):
+		"Get the string representation of this LayerStatistic."
+		return '%s, %s, %s' % (self.index, self.z, self.getTime())
+
+	def getDistance(self):
+		"Get the distance of all the features."
+		return sum(self.featureDistances.values())
+
+	def getExtrudedDistance(self):
+		"Get the distance of the extruded features."
+		return self.featureDistances['infill'] + self.featureDistances['loop'] + self.featureDistances['perimeter']
+
+	def getTime(self):
+		"Get the time of all the features."
+		return sum(self.featureTimes.values())
+
 
 class StatisticRepository:
 	"A class to handle the statistics settings."
@@ -114,6 +295,14 @@ class StatisticRepository:
 		self.fileNameInput = settings.FileNameInput().getFromFileName( [ ('Gcode text files', '*.gcode') ], 'Open File to Generate Statistics for', self, '')
 		self.printStatistics = settings.BooleanSetting().getFromValue('Print Statistics', self, True )
 		self.saveStatistics = settings.BooleanSetting().getFromValue('Save Statistics', self, False )
+		settings.LabelSeparator().getFromRepository(self)
+		settings.LabelDisplay().getFromName('- Layer Statistics -', self )
+		self.saveLayerStatisticsCSV = settings.BooleanSetting().getFromValue('Save Layer Statistics as CSV', self, False )
+		self.saveLayerStatisticsJSON = settings.BooleanSetting().getFromValue('Save Layer Statistics as JSON', self, False )
+		settings.LabelSeparator().getFromRepository(self)
+		settings.LabelDisplay().getFromName('- Machine Limits -', self )
+		self.maximumAcceleration = settings.FloatSpin().getFromValue( 100.0, 'Maximum Acceleration (mm/s2):', self, 5000.0, 1000.0 )
+		self.maximumJerk = settings.FloatSpin().getFromValue( 1.0, 'Maximum Jerk (mm/s):', self, 50.0, 20.0 )
 		self.executeTitle = 'Generate Statistics'
 
 	def execute(self):
@@ -132,16 +321,68 @@ class StatisticSkein:
 		self.output = cStringIO.StringIO()
 		self.version = None
 
+	def addFeatureLines(self):
+		"Add the time and distance of each feature, if there are any moves."
+		if self.accelerationPlanner.totalTime <= 0.0:
+			return
+		self.addLine('Features')
+		for featureName in globalFeatureNames:
+			distance = 0.0
+			time = 0.0
+			for layerStatistic in self.layerStatistics:
+				distance += layerStatistic.featureDistances[featureName]
+				time += layerStatistic.featureTimes[featureName]
+			percent = euclidean.getThreeSignificantFigures(100.0 * time / self.accelerationPlanner.totalTime)
+			featureString = '%s takes %s, %s percent of the time' % (featureName.capitalize(), euclidean.getDurationString(time), percent)
+			if distance > 0.0:
+				featureString += ', over %s mm' % euclidean.getThreeSignificantFigures(distance)
+			self.addLine(featureString + '.')
+		self.addLine(' ')
+
+	def addLayerLines(self):
+		"Add the number of layers and the slowest layers, if there are any layers."
+		if len(self.layerStatistics) < 1:
+			return
+		self.addLine('Layers')
+		self.addLine('There are %s layers, with an average time of %s.' % (len(self.layerStatistics), euclidean.getDurationString(self.accelerationPlanner.totalTime / float(len(self.layerStatistics)))))
+		slowestLayerStatistics = sorted(self.layerStatistics, key=lambda layerStatistic: - layerStatistic.getTime())[: 3]
+		slowestStrings = []
+		for layerStatistic in slowestLayerStatistics:
+			slowestStrings.append('%s at z %s mm with %s' % (layerStatistic.index, euclidean.getThreeSignificantFigures(layerStatistic.z), euclidean.getDurationString(layerStatistic.getTime())))
+		self.addLine('The slowest layers are %s.' % ', '.join(slowestStrings))
+		self.addLine(' ')
+
+	def addLayerStatistic(self, z):
+		"Add a layer statistic at the height z, after adding the times of the moves which the moves of the new layer can not change."
+		self.accelerationPlanner.flush()
+		self.layerStatistic = LayerStatistic(len(self.layerStatistics), z)
+		self.layerStatistics.append(self.layerStatistic)
+
 	def addLine(self, line):
 		"Add a line of text and a newline to the output."
 		self.output.write(line + '\n')
 
+	def addMoveStatistic(self, location, travel):
+		"Add the distance of a move to its layer and feature, and add the move to the acceleration planner."
+		if travel <= 0.0:
+			return
+		featureName = self.getFeatureName()
+		layerStatistic = self.getLayerStatistic(location.z)
+		layerStatistic.featureDistances[featureName] += travel
+		if self.feedRateMinute <= 0.0:
+			return
+		oneOverTravel = 1.0 / travel
+		unitDirection = (
+			oneOverTravel * (location.x - self.oldLocation.x), oneOverTravel * (location.y - self.oldLocation.y), oneOverTravel * (location.z - self.oldLocation.z))
+		self.accelerationPlanner.addMove(travel, featureName, layerStatistic, self.feedRateMinute / 60.0, unitDirection)
+
 	def addToPath(self, location):
 		"Add a point to travel and maybe extrusion."
 		if self.oldLocation != None:
 			travel = location.distance( self.oldLocation )
 			if self.feedRateMinute > 0.0:
 				self.totalBuildTime += 60.0 * travel / self.feedRateMinute
+			self.addMoveStatistic(location, travel)
 			self.totalDistanceTraveled += travel
 			if self.extruderActive:
 				self.totalDistanceExtruded += travel
@@ -149,6 +390,17 @@ class StatisticSkein:
 				self.cornerMinimum.minimize(location)
 		self.oldLocation = location
 
+	def dwell(self, splitLine):
+		"Stop the machine and add the time of a dwell, which is in milliseconds after P or in seconds after S."
+		self.accelerationPlanner.stop()
+		dwellTime = 0.001 * gcodec.getDoubleFromCharacterSplitLineValue('P', splitLine, 0.0)
+		dwellTime += gcodec.getDoubleFromCharacterSplitLineValue('S', splitLine, 0.0)
+		layerZ = 0.0
+		if self.oldLocation != None:
+			layerZ = self.oldLocation.z
+		self.getLayerStatistic(layerZ).featureTimes['dwell'] += dwellTime
+		self.accelerationPlanner.totalTime += dwellTime
+
 	def extruderSet( self, active ):
 		"Maybe increment the number of times the extruder was toggled."
 		if self.extruderActive != active:
@@ -157,24 +409,93 @@ class StatisticSkein:
 
 	def getCraftedGcode(self, gcodeText, repository):
 		"Parse gcode text and store the statistics."
-		self.absolutePerimeterWidth = 0.4
-		self.characters = 0
-		self.cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
-		self.cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
-		self.extruderActive = False
-		self.extruderSpeed = None
-		self.extruderToggled = 0
-		self.feedRateMinute = 600.0
-		self.layerThickness = 0.4
-		self.numberOfLines = 0
-		self.procedures = []
-		self.repository = repository
-		self.totalBuildTime = 0.0
-		self.totalDistanceExtruded = 0.0
-		self.totalDistanceTraveled = 0.0
+		self.setInitialValues(repository)
 		lines = archive.getTextLines(gcodeText)
 		for line in lines:
 			self.parseLine(line)
+		return self.getStatisticGcode()
+
+	def getFeatureName(self):
+		"Get the name of the feature which is being moved through."
+		if not self.extruderActive:
+			return 'travel'
+		if self.isPerimeter:
+			return 'perimeter'
+		if self.isLoop:
+			return 'loop'
+		return 'infill'
+
+	def getLayerStatistic(self, z):
+		"Get the layer statistic of a move, adding a layer when the extrusion reaches a new height if there are no layer tags."
+		if self.layerStatistic == None:
+			self.addLayerStatistic(z)
+		elif not self.isThereALayerStartWord and self.extruderActive and z != self.layerStatistic.z:
+			if self.layerStatistic.getExtrudedDistance() > 0.0:
+				self.addLayerStatistic(z)
+			else:
+				self.layerStatistic.z = z
+		return self.layerStatistic
+
+	def getLayerStatisticsCSV(self):
+		"Get the layer statistics as comma separated values, with a row for each layer."
+		output = cStringIO.StringIO()
+		csvWriter = csv.writer(output, lineterminator='\n')
+		header = ['layer', 'z', 'time', 'distance', 'volume', 'mass']
+		for featureName in globalFeatureNames:
+			header += [featureName + 'Time', featureName + 'Distance']
+		csvWriter.writerow(header)
+		for layerStatistic in self.layerStatistics:
+			extrudedDistance = layerStatistic.getExtrudedDistance()
+			row = [layerStatistic.index, layerStatistic.z, euclidean.getRoundedToPlaces(3, layerStatistic.getTime()), euclidean.getRoundedToPlaces(3, layerStatistic.getDistance())]
+			row += [euclidean.getRoundedToPlaces(6, self.getVolume(extrudedDistance)), euclidean.getRoundedToPlaces(6, self.getMass(extrudedDistance))]
+			for featureName in globalFeatureNames:
+				row += [euclidean.getRoundedToPlaces(3, layerStatistic.featureTimes[featureName]), euclidean.getRoundedToPlaces(3, layerStatistic.featureDistances[featureName])]
+			csvWriter.writerow(row)
+		return output.getvalue()
+
+	def getLayerStatisticsJSON(self, fileName):
+		"Get the layer statistics and the feature totals as json text."
+		featureTotals = {}
+		for featureName in globalFeatureNames:
+			featureTotals[featureName] = {'distance' : 0.0, 'time' : 0.0}
+		layers = []
+		for layerStatistic in self.layerStatistics:
+			features = {}
+			for featureName in globalFeatureNames:
+				distance = layerStatistic.featureDistances[featureName]
+				time = layerStatistic.featureTimes[featureName]
+				features[featureName] = {'distance' : euclidean.getRoundedToPlaces(3, distance), 'time' : euclidean.getRoundedToPlaces(3, time)}
+				featureTotals[featureName]['distance'] += distance
+				featureTotals[featureName]['time'] += time
+			extrudedDistance = layerStatistic.getExtrudedDistance()
+			layers.append({
+				'distance' : euclidean.getRoundedToPlaces(3, layerStatistic.getDistance()),
+				'features' : features,
+				'index' : layerStatistic.index,
+				'mass' : euclidean.getRoundedToPlaces(6, self.getMass(extrudedDistance)),
+				'time' : euclidean.getRoundedToPlaces(3, layerStatistic.getTime()),
+				'volume' : euclidean.getRoundedToPlaces(6, self.getVolume(extrudedDistance)),
+				'z' : layerStatistic.z})
+		for featureTotal in featureTotals.values():
+			featureTotal['distance'] = euclidean.getRoundedToPlaces(3, featureTotal['distance'])
+			featureTotal['time'] = euclidean.getRoundedToPlaces(3, featureTotal['time'])
+		layerStatisticsDictionary = {
+			'features' : featureTotals,
+			'fileName' : fileName,
+			'layers' : layers,
+			'machineLimits' : {'maximumAcceleration' : self.repository.maximumAcceleration.value, 'maximumJerk' : self.repository.maximumJerk.value},
+			'time' : euclidean.getRoundedToPlaces(3, self.accelerationPlanner.totalTime),
+			'timeWithoutAcceleration' : euclidean.getRoundedToPlaces(3, self.totalBuildTime)}
+		return json.dumps(layerStatisticsDictionary, indent=1, sort_keys=True) + '\n'
+
+	def getMass(self, extrudedDistance):
+		"Get the mass in grams of the extruded distance, in the same way as the mass of the total."
+		return 1000.0 * self.getVolume(extrudedDistance) / self.repository.density.value
+
+	def getStatisticGcode(self):
+		"Get the statistics text of the parsed lines."
+		repository = self.repository
+		self.accelerationPlanner.stop()
 		averageFeedRate = self.totalDistanceTraveled / self.totalBuildTime
 		self.characters += self.numberOfLines
 		kilobytes = round( self.characters / 1024.0 )
@@ -190,6 +511,7 @@ class StatisticSkein:
 		crossSectionArea = 0.9 * self.absolutePerimeterWidth * self.layerThickness # 0.9 if from the typical fill density
 		if self.extrusionDiameter != None:
 			crossSectionArea = math.pi / 4.0 * self.extrusionDiameter * self.extrusionDiameter
+		self.crossSectionArea = crossSectionArea
 		volumeExtruded = 0.001 * crossSectionArea * self.totalDistanceExtruded
 		mass = volumeExtruded / repository.density.value
 		machineTimeCost = repository.machineTime.value * self.totalBuildTime / 3600.0
@@ -207,6 +529,7 @@ class StatisticSkein:
 		self.addLine(' ')
 		self.addLine('Extruder')
 		self.addLine( "Build time is %s." % euclidean.getDurationString( self.totalBuildTime ) )
+		self.addLine( "Build time with acceleration is %s." % euclidean.getDurationString( self.accelerationPlanner.totalTime ) )
 		self.addLine( "Distance extruded is %s mm." % euclidean.getThreeSignificantFigures( self.totalDistanceExtruded ) )
 		self.addLine( "Distance traveled is %s mm." % euclidean.getThreeSignificantFigures( self.totalDistanceTraveled ) )
 		if self.extruderSpeed != None:
@@ -218,12 +541,14 @@ class StatisticSkein:
 			self.addLine( "Operating flow rate is %s mm3/s." % euclidean.getThreeSignificantFigures( flowRate ) )
 		self.addLine( "Feed rate average is %s mm/s, (%s mm/min)." % ( euclidean.getThreeSignificantFigures( averageFeedRate ), euclidean.getThreeSignificantFigures( 60.0 * averageFeedRate ) ) )
 		self.addLine(' ')
+		self.addFeatureLines()
 		self.addLine('Filament')
 		self.addLine( "Cross section area is %s mm2." % euclidean.getThreeSignificantFigures( crossSectionArea ) )
 		if self.extrusionDiameter != None:
 			self.addLine( "Extrusion diameter is %s mm." % euclidean.getThreeSignificantFigures( self.extrusionDiameter ) )
 		self.addLine('Extrusion fill density ratio is %s' % euclidean.getThreeSignificantFigures( crossSectionArea / self.absolutePerimeterWidth / self.layerThickness ) )
 		self.addLine(' ')
+		self.addLayerLines()
 		self.addLine('Material')
 		self.addLine( "Mass extruded is %s grams." % euclidean.getThreeSignificantFigures( 1000.0 * mass ) )
 		self.addLine( "Volume extruded is %s cc." % euclidean.getThreeSignificantFigures( volumeExtruded ) )
@@ -251,6 +576,15 @@ class StatisticSkein:
 			self.feedRateMinute = gcodec.getDoubleAfterFirstLetter( splitLine[indexOfF] )
 		return location
 
+	def getVolume(self, extrudedDistance):
+		"Get the volume in cubic centimeters of the extruded distance."
+		return 0.001 * self.crossSectionArea * extrudedDistance
+
+	def getWindow(self):
+		"Write the statistics of the visited lines."
+		printStatisticsHeading(self.fileName)
+		writeStatistics(self.fileName, self, self.getStatisticGcode())
+
 	def helicalMove( self, isCounterclockwise, splitLine ):
 		"Get statistics for a helical move."
 		if self.oldLocation == None:
@@ -299,9 +633,44 @@ class StatisticSkein:
 
 	def parseLine(self, line):
 		"Parse a gcode line and add it to the statistics."
+		self.visitLine(line, gcodec.getSplitLineBeforeBracketSemicolon(line))
+
+	def setInitialValues(self, repository):
+		"Set the statistics to their values before the first line."
+		self.absolutePerimeterWidth = 0.4
+		self.accelerationPlanner = AccelerationPlanner(repository.maximumAcceleration.value, repository.maximumJerk.value)
+		self.characters = 0
+		self.cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
+		self.cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
+		self.extruderActive = False
+		self.extruderSpeed = None
+		self.extruderToggled = 0
+		self.feedRateMinute = 600.0
+		self.isLoop = False
+		self.isPerimeter = False
+		self.isThereALayerStartWord = False
+		self.layerStatistic = None
+		self.layerStatistics = []
+		self.layerThickness = 0.4
+		self.numberOfLines = 0
+		self.procedures = []
+		self.repository = repository
+		self.totalBuildTime = 0.0
+		self.totalDistanceExtruded = 0.0
+		self.totalDistanceTraveled = 0.0
+
+	def setLayerStart(self, z):
+		"Start a layer statistic at a layer tag, the moves before the first layer tag are counted in the first layer."
+		if self.isThereALayerStartWord or self.layerStatistic == None:
+			self.addLayerStatistic(z)
+		else:
+			self.layerStatistic.z = z
+		self.isThereALayerStartWord = True
+
+	def visitLine(self, line, splitLine):
+		"Add a gcode line and its split line to the statistics."
 		self.characters += len(line)
 		self.numberOfLines += 1
-		splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
 		if len(splitLine) < 1:
 			return
 		firstWord = splitLine[0]
@@ -311,6 +680,8 @@ class StatisticSkein:
 			self.helicalMove( False, splitLine )
 		elif firstWord == 'G3':
 			self.helicalMove( True, splitLine )
+		elif firstWord == 'G4':
+			self.dwell(splitLine)
 		elif firstWord == 'M101':
 			self.extruderSet( True )
 		elif firstWord == 'M102':
@@ -319,11 +690,21 @@ class StatisticSkein:
 			self.extruderSet( False )
 		elif firstWord == 'M108':
 			self.extruderSpeed = gcodec.getDoubleAfterFirstLetter(splitLine[1])
+		elif firstWord == '(<layer>':
+			self.setLayerStart(float(splitLine[1]))
 		elif firstWord == '(<layerThickness>':
 			self.layerThickness = float(splitLine[1])
 			self.extrusionDiameter = self.repository.extrusionDiameterOverThickness.value * self.layerThickness
 		elif firstWord == '(<operatingFeedRatePerSecond>':
 			self.operatingFeedRatePerSecond = float(splitLine[1])
+		elif firstWord == '(<loop>':
+			self.isLoop = True
+		elif firstWord == '(</loop>)':
+			self.isLoop = False
+		elif firstWord == '(<perimeter>':
+			self.isPerimeter = True
+		elif firstWord == '(</perimeter>)':
+			self.isPerimeter = False
 		elif firstWord == '(<perimeterWidth>':
 			self.absolutePerimeterWidth = abs(float(splitLine[1]))
 		elif firstWord == '(<procedureName>':
@@ -8,6 +8,8 @@ http://fabmetheus.crsndoo.com/wiki/index.php/Skeinforge_Vectorwrite
 Vectorwrite generates a Scalable Vector Graphics file which can be opened by an SVG viewer or an SVG capable browser like Mozilla:
 http://www.mozilla.com/firefox/
 
+The gcode is parsed a line at a time, and each layer is turned into its svg path strings as soon as it is parsed, and the strings are written to a temporary file, so only the layer being parsed is held in memory.  When the gcode is parsed, the svg files are written from the template, with the layers copied from the temporary file one at a time, starting from the recorded position of the first layer of each file.
+
 ==Operation==
 The default 'Activate Vectorwrite' checkbox is on.  When it is on, the functions described below will work when called from the skeinforge toolchain, when it is off, the functions will not be called from the toolchain.  The functions will still be called, whether or not the 'Activate Vectorwrite' checkbox is on, when vectorwrite is run directly.
 
@@ -38,6 +40,11 @@ Default is a huge number, which will be limited to the highest index layer.
 
 The "Layers To" is the index of the top layer that will be displayed.  If the layer to index is a huge number like the default, the display will go to the top of the model, at least until we model habitats:)  If the layer to index is negative, then the display will go to the layer to index below the top layer.  The layer from until layer to index is a python slice.
 
+===Layers per File===
+Default is zero.
+
+When the "Layers per File" is zero, all the layers are written in one file.  Otherwise the layers are written in files of that many layers, which are numbered, like Screw_Holder_penultimate_vectorwrite_0.svg, so that a large model can be opened a part at a time.  The layers of every file are drawn to the same scale.
+
 ===SVG Viewer===
 Default is webbrowser.
 
@@ -68,8 +75,8 @@ from fabmetheus_utilities import svg_writer
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
 import cStringIO
-import os
 import sys
+import tempfile
 import time
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
@@ -78,33 +85,65 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+globalLayersComment = '<!--Vectorwrite Layers-->'
+
+
+def getLineVisitor(fileNameSuffix, gcodeText):
+	'Get the vectorwrite skein as a line visitor for the shared parse of skeinforge_analyze, if activate vectorwrite is selected.'
+	repository = settings.getReadRepository(VectorwriteRepository())
+	if not repository.activateVectorwrite.value:
+		return None
+	skein = VectorwriteSkein()
+	skein.fileName = fileNameSuffix
+	skein.startTime = time.time()
+	skein.setInitialValues(repository)
+	return skein
+
 def getNewRepository():
 	'Get new repository.'
 	return VectorwriteRepository()
 
+def getPathStringFromWord(word):
+	'Get the path string from a word of the layer file, or None if the word is a dash.'
+	if word == '-':
+		return None
+	return word
+
+def getSuffixFileName(fileName, fileIndex, numberOfFiles):
+	'Get the file name of a vectorwrite file, numbered if the layers are written in more than one file.'
+	if numberOfFiles > 1:
+		return archive.getFilePathWithUnderscoredBasename(fileName, '_vectorwrite_%s.svg' % fileIndex)
+	return archive.getFilePathWithUnderscoredBasename(fileName, '_vectorwrite.svg')
+
 def getWindowAnalyzeFile(fileName):
-	'Write scalable vector graphics for a gcode file.'
-	gcodeText = archive.getFileText(fileName)
-	return getWindowAnalyzeFileGivenText(fileName, gcodeText)
+	'Write scalable vector graphics for a gcode file, reading the file a line at a time.'
+	try:
+		gcodeFile = open(fileName, 'rU')
+	except IOError:
+		print('The file ' + fileName + ' does not exist.')
+		return None
+	try:
+		return getWindowAnalyzeFileGivenLines(fileName, gcodeFile)
+	finally:
+		gcodeFile.close()
+
+def getWindowAnalyzeFileGivenLines(fileName, lines, repository=None):
+	'Write scalable vector graphics for the lines of a gcode file given the settings.'
+	if repository == None:
+		repository = settings.getReadRepository( VectorwriteRepository() )
+	skein = VectorwriteSkein()
+	skein.fileName = fileName
+	skein.startTime = time.time()
+	skein.parseLines(lines, repository)
+	skein.getWindow()
 
 def getWindowAnalyzeFileGivenText( fileName, gcodeText, repository=None):
 	'Write scalable vector graphics for a gcode file given the settings.'
 	if gcodeText == '':
 		return None
-	if repository == None:
-		repository = settings.getReadRepository( VectorwriteRepository() )
-	startTime = time.time()
-	vectorwriteGcode = VectorwriteSkein().getCarvedSVG( fileName, gcodeText, repository )
-	if vectorwriteGcode == '':
-		return None
-	suffixFileName = fileName[ : fileName.rfind('.') ] + '_vectorwrite.svg'
-	suffixDirectoryName = os.path.dirname(suffixFileName)
-	suffixReplacedBaseName = os.path.basename(suffixFileName).replace(' ', '_')
-	suffixFileName = os.path.join( suffixDirectoryName, suffixReplacedBaseName )
-	archive.writeFileText( suffixFileName, vectorwriteGcode )
-	print('The vectorwrite file is saved as ' + archive.getSummarizedFileName(suffixFileName) )
-	print('It took %s to vectorwrite the file.' % euclidean.getDurationString( time.time() - startTime ) )
-	settings.openSVGPage( suffixFileName, repository.svgViewer.value )
+	if '\n' not in gcodeText:
+		gcodeText = gcodeText.replace('\r', '\n')
+	getWindowAnalyzeFileGivenLines(fileName, cStringIO.StringIO(gcodeText), repository)
 
 def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	'Write scalable vector graphics for a skeinforge gcode file, if activate vectorwrite is selected.'
@@ -114,33 +153,125 @@ def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	gcodeText = archive.getTextIfEmpty( fileNameSuffix, gcodeText )
 	getWindowAnalyzeFileGivenText( fileNameSuffix, gcodeText, repository )
 
+def writeVectorwriteFiles(fileName, layerFile, repository, startTime):
+	'Write the scalable vector graphics files from the layer file and open the first one in the svg viewer.'
+	suffixFileNames = layerFile.writeSVGFiles(fileName, repository.layersPerFile.value)
+	if len(suffixFileNames) < 1:
+		return
+	for suffixFileName in suffixFileNames:
+		print('The vectorwrite file is saved as ' + archive.getSummarizedFileName(suffixFileName) )
+	print('It took %s to vectorwrite the file.' % euclidean.getDurationString( time.time() - startTime ) )
+	settings.openSVGPage( suffixFileNames[0], repository.svgViewer.value )
+
+
+class PathStringLayer:
+	'The svg path strings of a thread layer, with its z.  A path string is None when there are no paths of its kind.'
+	def __init__(self, z):
+		'Initialize.'
+		self.boundaryLoopsString = ''
+		self.innerPerimetersString = None
+		self.loopsString = None
+		self.outerPerimetersString = None
+		self.pathsString = None
+		self.z = z
+
+	def __repr__(self):
+		'Get the string representation of this path string layer.'
+		return '%s, %s' % (self.z, len(self.getLine()))
+
+	def getFromLine(self, line):
+		'Get the path string layer from a tab separated line of the layer file.'
+		words = line[: -1].split('\t')
+		self.z = float(words[0])
+		self.boundaryLoopsString = words[1]
+		self.innerPerimetersString = getPathStringFromWord(words[2])
+		self.loopsString = getPathStringFromWord(words[3])
+		self.outerPerimetersString = getPathStringFromWord(words[4])
+		self.pathsString = getPathStringFromWord(words[5])
+		return self
+
+	def getFromThreadLayer(self, svgWriter, threadLayer):
+		'Get the path string layer from the threads of a thread layer.'
+		self.boundaryLoopsString = svgWriter.getSVGStringForLoops(threadLayer.boundaryLoops)
+		self.innerPerimetersString = svgWriter.getSVGStringForPaths(threadLayer.innerPerimeters)
+		self.loopsString = svgWriter.getSVGStringForPaths(threadLayer.loops)
+		self.outerPerimetersString = svgWriter.getSVGStringForPaths(threadLayer.outerPerimeters)
+		self.pathsString = svgWriter.getSVGStringForPaths(threadLayer.paths)
+		return self
+
+	def getLine(self):
+		'Get the tab separated line of the path string layer, with None written as a dash.'
+		words = [repr(self.z), self.boundaryLoopsString]
+		for pathString in [self.innerPerimetersString, self.loopsString, self.outerPerimetersString, self.pathsString]:
+			if pathString == None:
+				words.append('-')
+			else:
+				words.append(pathString)
+		return '\t'.join(words) + '\n'
+
 
 class SVGWriterVectorwrite( svg_writer.SVGWriter ):
-	'A class to vectorwrite a carving.'
-	def addPaths( self, colorName, paths, transformString ):
-		'Add paths to the output.'
-		pathString = ''
-		for path in paths:
-			pathString += self.getSVGStringForPath(path) + ' '
-		if len( pathString ) < 1:
+	'A class to vectorwrite a carving, a layer at a time.'
+	def addPaths( self, colorName, pathString, transformString ):
+		'Add the path string to the output, if it is not None.'
+		if pathString == None:
 			return
 		pathXMLElementCopy = self.pathXMLElement.getCopy('', self.pathXMLElement.parent )
 		pathCopyDictionary = pathXMLElementCopy.attributeDictionary
-		pathCopyDictionary['d'] = pathString[ : - 1 ]
+		pathCopyDictionary['d'] = pathString
 		pathCopyDictionary['fill'] = 'none'
 		pathCopyDictionary['stroke'] = colorName
 		pathCopyDictionary['transform'] = transformString
 
-	def addRotatedLoopLayerToOutput( self, layerIndex, threadLayer ):
-		'Add rotated boundary layer to the output.'
-		self.addLayerBegin( layerIndex, threadLayer )
+	def addRotatedLoopLayersToOutput(self, rotatedLoopLayers):
+		'Keep a copy of the layer template, and add the comment where the layers will be written as they are read.'
+		self.layerTemplate = self.graphicsXMLElement.getCopy('', self.graphicsXMLElement.parent)
+		self.graphicsXMLElement.parent.children.remove(self.layerTemplate)
+		svg_writer.getCommentElementByText(globalLayersComment).setParentAddToChildren(self.graphicsXMLElement.parent)
+
+	def addRotatedLoopLayerToOutput( self, layerIndex, pathStringLayer ):
+		'Add the path strings of a layer to the output.'
+		self.addLayerBegin( layerIndex, pathStringLayer )
 		transformString = self.getTransformString()
-		self.pathDictionary['d'] = self.getSVGStringForLoops( threadLayer.boundaryLoops )
+		self.pathDictionary['d'] = pathStringLayer.boundaryLoopsString
 		self.pathDictionary['transform'] = transformString
-		self.addPaths('#fa0', threadLayer.innerPerimeters, transformString ) #orange
-		self.addPaths('#ff0', threadLayer.loops, transformString ) #yellow
-		self.addPaths('#f00', threadLayer.outerPerimeters, transformString ) #red
-		self.addPaths('#f5c', threadLayer.paths, transformString ) #light violetred
+		self.addPaths('#fa0', pathStringLayer.innerPerimetersString, transformString ) #orange
+		self.addPaths('#ff0', pathStringLayer.loopsString, transformString ) #yellow
+		self.addPaths('#f00', pathStringLayer.outerPerimetersString, transformString ) #red
+		self.addPaths('#f5c', pathStringLayer.pathsString, transformString ) #light violetred
+
+	def getSVGStringForPaths(self, paths):
+		'Get the svg string of the paths, or None if there are no paths.'
+		if len(paths) < 1:
+			return None
+		return ' '.join([self.getSVGStringForPath(path) for path in paths])
+
+	def getVolume(self, rotatedLoopLayers):
+		'Get the volume of the layers of the file being written.'
+		return self.volume
+
+	def writeSVGFile(self, fileName, firstLayerIndex, layerFile, numberOfLayers, suffixFileName, volume):
+		'Write the svg file of the gcode file with the number of layers of the layer file, starting at its position.'
+		self.volume = volume
+		beginningText, endText = self.getReplacedSVGTemplate(fileName, 'vectorwrite', [None] * numberOfLayers).split(globalLayersComment)
+		self.graphicsXMLElement = self.layerTemplate
+		try:
+			svgFile = open(suffixFileName, 'w')
+		except IOError:
+			print('The file ' + suffixFileName + ' can not be written to.')
+			return
+		svgFile.write(beginningText)
+		for layerIndex in xrange(numberOfLayers):
+			pathStringLayer = PathStringLayer(0.0).getFromLine(layerFile.readline())
+			self.addRotatedLoopLayerToOutput(layerIndex, pathStringLayer)
+			if firstLayerIndex > 0:
+				layerString = 'Layer %s, z:%s' % (firstLayerIndex + layerIndex, self.getRounded(pathStringLayer.z))
+				self.graphicsCopy.getFirstChildWithClassName('text').text = layerString
+				self.graphicsCopy.attributeDictionary['inkscape:label'] = layerString
+			self.graphicsCopy.addXML(2, svgFile)
+			self.graphicsCopy.removeFromIDNameParent()
+		svgFile.write(endText)
+		svgFile.close()
 
 
 class ThreadLayer:
@@ -181,6 +312,53 @@ class ThreadLayer:
 		pointComplex = euclidean.getMinimum(euclidean.getMinimumByComplexPaths(self.paths), pointComplex)
 		vector3.setToXYZ(pointComplex.real, pointComplex.imag, min(self.z, vector3.z))
 
+
+class VectorwriteLayerFile:
+	'A class to write the path strings of the thread layers to a temporary file as they are parsed, then to write the svg files from them.'
+	def __init__(self, decimalPlacesCarried, layerThickness, perimeterWidth):
+		'Initialize.'
+		self.areas = []
+		self.cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
+		self.cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
+		self.layerOffsets = []
+		self.layerThickness = layerThickness
+		self.svgWriter = SVGWriterVectorwrite(True, self.cornerMaximum, self.cornerMinimum, decimalPlacesCarried, layerThickness, perimeterWidth)
+		self.temporaryFile = tempfile.TemporaryFile()
+
+	def __repr__(self):
+		'Get the string representation of this layer file.'
+		return '%s, %s, %s' % (len(self.areas), self.cornerMaximum, self.cornerMinimum)
+
+	def addThreadLayer(self, threadLayer):
+		'Add the path strings of the thread layer to the temporary file, skipping the empty layers before the first layer with threads.'
+		if len(self.areas) < 1 and threadLayer.getTotalNumberOfThreads() < 1:
+			return
+		threadLayer.maximize(self.cornerMaximum)
+		threadLayer.minimize(self.cornerMinimum)
+		self.areas.append(euclidean.getAreaLoops(threadLayer.loops))
+		self.layerOffsets.append(self.temporaryFile.tell())
+		self.temporaryFile.write(PathStringLayer(threadLayer.z).getFromThreadLayer(self.svgWriter, threadLayer).getLine())
+
+	def writeSVGFiles(self, fileName, layersPerFile):
+		'Write the svg files of the layers, in files of the layers per file if it is more than zero, and return their file names.  Each file seeks to its first layer, so a file which can not be written does not shift the layers of the next.'
+		if layersPerFile < 1:
+			layersPerFile = max(len(self.areas), 1)
+		halfLayerThickness = 0.5 * self.layerThickness
+		self.cornerMaximum.z += halfLayerThickness
+		self.cornerMinimum.z -= halfLayerThickness
+		numberOfFiles = (len(self.areas) + layersPerFile - 1) / layersPerFile
+		suffixFileNames = []
+		for fileIndex in xrange(numberOfFiles):
+			firstLayerIndex = fileIndex * layersPerFile
+			fileAreas = self.areas[firstLayerIndex : firstLayerIndex + layersPerFile]
+			suffixFileName = getSuffixFileName(fileName, fileIndex, numberOfFiles)
+			self.temporaryFile.seek(self.layerOffsets[firstLayerIndex])
+			self.svgWriter.writeSVGFile(fileName, firstLayerIndex, self.temporaryFile, len(fileAreas), suffixFileName, 0.001 * sum(fileAreas))
+			suffixFileNames.append(suffixFileName)
+		self.temporaryFile.close()
+		return suffixFileNames
+
+
 class VectorwriteRepository:
 	'A class to handle the vectorwrite settings.'
 	def __init__(self):
@@ -197,6 +375,8 @@ class VectorwriteRepository:
 		self.layersFrom = settings.IntSpin().getFromValue( 0, 'Layers From (index):', self, 20, 0 )
 		self.layersTo = settings.IntSpin().getSingleIncrementFromValue( 0, 'Layers To (index):', self, 912345678, 912345678 )
 		settings.LabelSeparator().getFromRepository(self)
+		self.layersPerFile = settings.IntSpin().getSingleIncrementFromValue( 0, 'Layers per File (integer):', self, 1000, 0 )
+		settings.LabelSeparator().getFromRepository(self)
 		self.svgViewer = settings.StringSetting().getFromValue('SVG Viewer:', self, 'webbrowser')
 		settings.LabelSeparator().getFromRepository(self)
 		self.executeTitle = 'Vectorwrite'
@@ -217,8 +397,17 @@ class VectorwriteSkein:
 	def addRotatedLoopLayer(self, z):
 		'Add rotated loop layer.'
 		self.layerCount.printProgressIncrement('vectorwrite')
+		self.addThreadLayerToLayerFile()
 		self.threadLayer = ThreadLayer(z)
-		self.threadLayers.append(self.threadLayer)
+
+	def addThreadLayerToLayerFile(self):
+		'Add the thread layer to the layer file, so that only the layer being parsed is held in memory.'
+		if self.threadLayer == None:
+			return
+		if self.layerFile == None:
+			self.layerFile = VectorwriteLayerFile(self.decimalPlacesCarried, self.layerThickness, self.perimeterWidth)
+		self.layerFile.addThreadLayer(self.threadLayer)
+		self.threadLayer = None
 
 	def addToLoops(self):
 		'Add the thread to the loops.'
@@ -245,40 +434,11 @@ class VectorwriteSkein:
 		'Get the layer thickness.'
 		return self.layerThickness
 
-	def getCarvedSVG(self, fileName, gcodeText, repository):
-		'Parse gnu triangulated surface text and store the vectorwrite gcode.'
-		cornerMaximum = Vector3(-987654321.0, -987654321.0, -987654321.0)
-		cornerMinimum = Vector3(987654321.0, 987654321.0, 987654321.0)
-		self.boundaryLoop = None
-		self.extruderActive = False
-		self.isLoop = False
-		self.isOuter = False
-		self.isPerimeter = False
-		self.lines = archive.getTextLines(gcodeText)
-		self.oldLocation = None
-		self.thread = []
-		self.threadLayers = []
-		self.repository = repository
-		self.parseInitialization()
-		for line in self.lines[self.lineIndex :]:
-			self.parseLine(line)
-		self.removeEmptyLayers()
-		for threadLayer in self.threadLayers:
-			threadLayer.maximize(cornerMaximum)
-			threadLayer.minimize(cornerMinimum)
-		halfLayerThickness = 0.5 * self.layerThickness
-		cornerMaximum.z += halfLayerThickness
-		cornerMinimum.z -= halfLayerThickness
-		svgWriter = SVGWriterVectorwrite(
-			True, cornerMaximum, cornerMinimum, self.decimalPlacesCarried, self.layerThickness, self.perimeterWidth)
-		return svgWriter.getReplacedSVGTemplate(fileName, 'vectorwrite', self.threadLayers)
-
-	def removeEmptyLayers(self):
-		'Remove empty layers.'
-		for threadLayerIndex, threadLayer in enumerate(self.threadLayers):
-			if threadLayer.getTotalNumberOfThreads() > 0:
-				self.threadLayers = self.threadLayers[threadLayerIndex :]
-				return
+	def getWindow(self):
+		'Write the scalable vector graphics of the visited lines.'
+		self.addThreadLayerToLayerFile()
+		if self.layerFile != None:
+			writeVectorwriteFiles(self.fileName, self.layerFile, self.repository, self.startTime)
 
 	def linearMove( self, splitLine ):
 		'Get statistics for a linear move.'
@@ -289,24 +449,27 @@ class VectorwriteSkein:
 			self.thread.append(location.dropAxis())
 		self.oldLocation = location
 
-	def parseInitialization(self):
-		'Parse gcode initialization and store the parameters.'
-		for self.lineIndex in xrange(len(self.lines)):
-			line = self.lines[self.lineIndex]
-			splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
-			firstWord = gcodec.getFirstWord(splitLine)
-			if firstWord == '(<decimalPlacesCarried>':
-				self.decimalPlacesCarried = int(splitLine[1])
-			elif firstWord == '(<layerThickness>':
-				self.layerThickness = float(splitLine[1])
-			elif firstWord == '(<crafting>)':
-				return
-			elif firstWord == '(<perimeterWidth>':
-				self.perimeterWidth = float(splitLine[1])
-
-	def parseLine(self, line):
-		'Parse a gcode line and add it to the outset skein.'
-		splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
+	def parseLines(self, lines, repository):
+		'Parse the gcode lines one at a time, without keeping them, and write the path strings of their layers to the layer file.'
+		self.setInitialValues(repository)
+		for line in lines:
+			line = line.rstrip('\r\n')
+			self.visitLine(line, gcodec.getSplitLineBeforeBracketSemicolon(line))
+
+	def parseInitializationSplitLine(self, splitLine):
+		'Parse a split line of the gcode initialization and store the parameters, until the crafting line ends the initialization.'
+		firstWord = gcodec.getFirstWord(splitLine)
+		if firstWord == '(<decimalPlacesCarried>':
+			self.decimalPlacesCarried = int(splitLine[1])
+		elif firstWord == '(<layerThickness>':
+			self.layerThickness = float(splitLine[1])
+		elif firstWord == '(<crafting>)':
+			self.isInitialization = False
+		elif firstWord == '(<perimeterWidth>':
+			self.perimeterWidth = float(splitLine[1])
+
+	def parseSplitLine(self, splitLine):
+		'Parse a split gcode line and add it to the outset skein.'
 		if len(splitLine) < 1:
 			return
 		firstWord = splitLine[0]
@@ -345,6 +508,28 @@ class VectorwriteSkein:
 		elif firstWord == '(</perimeter>)':
 			self.addToPerimeters()
 
+	def setInitialValues(self, repository):
+		'Set the threads to their values before the first line.'
+		self.boundaryLoop = None
+		self.extruderActive = False
+		self.isInitialization = True
+		self.isLoop = False
+		self.isOuter = False
+		self.isPerimeter = False
+		self.layerFile = None
+		self.oldLocation = None
+		self.perimeterWidth = None
+		self.thread = []
+		self.threadLayer = None
+		self.repository = repository
+
+	def visitLine(self, line, splitLine):
+		'Add a gcode line and its split line to the threads, after the initialization has been parsed.'
+		if self.isInitialization:
+			self.parseInitializationSplitLine(splitLine)
+		if not self.isInitialization:
+			self.parseSplitLine(splitLine)
+
 
 def main():
 	'Display the vectorwrite dialog.'
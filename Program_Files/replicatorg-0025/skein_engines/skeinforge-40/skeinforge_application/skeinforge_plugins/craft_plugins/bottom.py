@@ -140,9 +140,9 @@ class BottomSkein:
 			decimalPlacesCarried,
 			layerThickness,
 			perimeterWidth)
-		commentElement = svg_writer.getCommentElement(svgReader.root)
+		commentElement = svgReader.getCommentElement()
 		procedureNameString = svgReader.sliceDictionary['procedureName'] + ',bottom'
-		return svgWriter.getReplacedSVGTemplate(fileName, procedureNameString, rotatedLoopLayers, commentElement)
+		return svgWriter.getSliceText(fileName, procedureNameString, rotatedLoopLayers, commentElement)
 
 
 def main():
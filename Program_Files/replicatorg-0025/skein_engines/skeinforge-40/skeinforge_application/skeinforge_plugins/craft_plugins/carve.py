@@ -63,6 +63,11 @@ Default is 1.8.
 
 Defines the ratio of the extrusion perimeter width to the layer thickness.  The higher the value the more the perimeter will be inset, the default is 1.8.  A ratio of one means the extrusion is a circle, a typical ratio of 1.8 means the extrusion is a wide oval.  These values should be measured from a test extrusion line.
 
+===Print Parse Throughput===
+Default is off.
+
+When selected, the obj and gts import plugins will print the number of vertexes and faces parsed, the time and the throughput of the parse in megabytes per second.
+
 ===SVG Viewer===
 Default is webbrowser.
 
@@ -93,6 +98,7 @@ except:
 import __init__
 
 from fabmetheus_utilities.fabmetheus_tools import fabmetheus_interpret
+from fabmetheus_utilities.geometry.solids import triangle_mesh
 from fabmetheus_utilities import archive
 from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import gcodec
@@ -117,12 +123,13 @@ def getCraftedText( fileName, gcodeText = '', repository=None):
 		gcodeText = archive.getTextIfEmpty(fileName, gcodeText)
 		if gcodec.isProcedureDoneOrFileIsEmpty( gcodeText, 'carve'):
 			return gcodeText
-	carving = svg_writer.getCarving(fileName)
-	if carving == None:
-		return ''
 	if repository == None:
 		repository = CarveRepository()
 		settings.getReadRepository(repository)
+	triangle_mesh.setIsPrintingParseThroughput(repository.printParseThroughput.value)
+	carving = svg_writer.getCarving(fileName)
+	if carving == None:
+		return ''
 	return CarveSkein().getCarvedSVG( carving, fileName, repository )
 
 def getNewRepository():
@@ -168,6 +175,7 @@ class CarveRepository:
 		self.correctMesh = settings.Radio().getFromRadio( importLatentStringVar, 'Correct Mesh', self, True )
 		self.unprovenMesh = settings.Radio().getFromRadio( importLatentStringVar, 'Unproven Mesh', self, False )
 		self.perimeterWidthOverThickness = settings.FloatSpin().getFromValue( 1.4, 'Perimeter Width over Thickness (ratio):', self, 2.2, 1.8 )
+		self.printParseThroughput = settings.BooleanSetting().getFromValue('Print Parse Throughput', self, False)
 		settings.LabelSeparator().getFromRepository(self)
 		self.svgViewer = settings.StringSetting().getFromValue('SVG Viewer:', self, 'webbrowser')
 		settings.LabelSeparator().getFromRepository(self)
@@ -206,7 +214,7 @@ class CarveSkein:
 			carving.getCarveLayerThickness(),
 			perimeterWidth)
 		truncatedRotatedBoundaryLayers = svg_writer.getTruncatedRotatedBoundaryLayers(repository, rotatedLoopLayers)
-		return svgWriter.getReplacedSVGTemplate(
+		return svgWriter.getSliceText(
 			fileName, 'carve', truncatedRotatedBoundaryLayers, carving.getFabmetheusXML())
 
 
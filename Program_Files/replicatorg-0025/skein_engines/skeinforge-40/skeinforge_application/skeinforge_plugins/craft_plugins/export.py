@@ -113,6 +113,13 @@ def getDistanceGcode(exportText):
 			oldLocation = location
 	return exportText
 
+def getExportFileName(fileName, repository):
+	'Get the name of the file which the export of the file is saved as.'
+	exportFileName = fileName[: fileName.rfind('.')]
+	if repository.addExportSuffix.value:
+		exportFileName += '_export'
+	return exportFileName + '.' + repository.fileExtension.value
+
 def getNewRepository():
 	'Get new repository.'
 	return ExportRepository()
@@ -155,10 +162,7 @@ def writeOutput(fileName, shouldAnalyze=True):
 	settings.getReadRepository(repository)
 	startTime = time.time()
 	print('File ' + archive.getSummarizedFileName(fileName) + ' is being chain exported.')
-	fileNameSuffix = fileName[: fileName.rfind('.')]
-	if repository.addExportSuffix.value:
-		fileNameSuffix += '_export'
-	fileNameSuffix += '.' + repository.fileExtension.value
+	fileNameSuffix = getExportFileName(fileName, repository)
 	gcodeText = gcodec.getGcodeFileText(fileName, '')
 	procedures = skeinforge_craft.getProcedures('export', gcodeText)
 	gcodeText = skeinforge_craft.getChainTextFromProcedures(fileName, procedures[ : - 1 ], gcodeText)
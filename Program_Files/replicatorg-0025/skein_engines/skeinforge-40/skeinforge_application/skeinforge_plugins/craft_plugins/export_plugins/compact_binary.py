@@ -0,0 +1,107 @@
+"""
+This page is in the table of contents.
+Compact binary is an export plugin to convert gcode into a compact binary move stream, which is read back into gcode text by binary_gcode in fabmetheus_utilities.
+
+An export plugin is a script in the export_plugins folder which has the getOutput function, the globalIsReplaceable variable and if it's output is not replaceable, the writeOutput function.  It is meant to be run from the export tool.  To ensure that the plugin works on platforms which do not handle file capitalization properly, give the plugin a lower case name.
+
+The getOutput function of this script takes a gcode text and returns that text converted into the binary move stream.  The writeOutput function of this script takes a gcode text and writes that in the binary move stream.
+
+Each gcode line is written as the index of its command, the flags of its words and the differences of the numbers of its words from the numbers of the words before, as varints in units of the decimal places, so a move is usually a few bytes instead of a few tens of bytes.  A line which would not be read back exactly, like a comment, is written as text.  The send script in fabricate reads the binary move stream as well as gcode text.
+
+==Settings==
+===Check Round Trip===
+Default is on.
+
+When selected, the binary move stream is read back and compared with the gcode text after it is written, and a message is printed if they are not the same.  To check gcode files without exporting them, run binary_gcode.py in fabmetheus_utilities with the file names.
+
+===Decimal Places===
+Default is two.
+
+The numbers of the words are written in units of this number of decimal places.  The export tool rounds the coordinates to two decimal places, so with the default the moves of the exported gcode are encoded.  A number with more decimal places than this is not lost, its line is written as text.
+
+===File Extension===
+Default is sbg.
+
+The file extension of the binary move stream.
+
+"""
+
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import archive
+from fabmetheus_utilities import binary_gcode
+from fabmetheus_utilities import gcodec
+from fabmetheus_utilities import settings
+from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
+from skeinforge_application.skeinforge_utilities import skeinforge_profile
+import sys
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+# This is true if the output is text and false if it is binary.
+globalIsReplaceable = False
+
+
+def getNewRepository():
+	'Get new repository.'
+	return CompactBinaryRepository()
+
+def getOutput(gcodeText, repository=None):
+	'Get the exported version of a gcode file.'
+	if gcodeText == '':
+		return ''
+	if repository == None:
+		repository = getNewRepository()
+		settings.getReadRepository(repository)
+	return binary_gcode.getBinaryGcode(gcodeText, repository.decimalPlaces.value)
+
+def writeOutput(fileName, gcodeText=''):
+	'Write the exported version of a gcode file.'
+	gcodeText = gcodec.getGcodeFileText(fileName, gcodeText)
+	if gcodeText == '':
+		return
+	repository = getNewRepository()
+	settings.getReadRepository(repository)
+	binaryGcode = getOutput(gcodeText, repository)
+	if repository.checkRoundTrip.value:
+		if not binary_gcode.isRoundTrip(binaryGcode, gcodeText):
+			print('Warning, the binary move stream of %s is not read back into the same gcode text.' % archive.getSummarizedFileName(fileName))
+	suffixFileName = fileName[: fileName.rfind('.')] + '.' + repository.fileExtension.value
+	archive.writeFileText(suffixFileName, binaryGcode, 'wb')
+	print('The converted file is saved as %s, it is %s bytes instead of %s bytes.' % (archive.getSummarizedFileName(suffixFileName), len(binaryGcode), len(gcodeText)))
+
+
+class CompactBinaryRepository:
+	'A class to handle the export settings.'
+	def __init__(self):
+		'Set the default settings, execute title & settings fileName.'
+		skeinforge_profile.addListsToCraftTypeRepository('skeinforge_application.skeinforge_plugins.craft_plugins.export_plugins.compact_binary.html', self)
+		self.fileNameInput = settings.FileNameInput().getFromFileName([('Gcode text files', '*.gcode')], 'Open File to be Converted to Compact Binary', self, '')
+		self.checkRoundTrip = settings.BooleanSetting().getFromValue('Check Round Trip', self, True)
+		self.decimalPlaces = settings.IntSpin().getSingleIncrementFromValue(1, 'Decimal Places (integer):', self, 5, 2)
+		self.fileExtension = settings.StringSetting().getFromValue('File Extension:', self, 'sbg')
+		self.executeTitle = 'Convert to Compact Binary'
+
+	def execute(self):
+		'Convert to compact binary button has been clicked.'
+		fileNames = skeinforge_polyfile.getFileOrDirectoryTypesUnmodifiedGcode(self.fileNameInput.value, ['.gcode'], self.fileNameInput.wasCancelled)
+		for fileName in fileNames:
+			writeOutput(fileName)
+
+
+def main():
+	'Display the export dialog.'
+	if len(sys.argv) > 1:
+		writeOutput(' '.join(sys.argv[1 :]))
+	else:
+		settings.startMainLoopFromConstructor(getNewRepository())
+
+if __name__ == '__main__':
+	main()
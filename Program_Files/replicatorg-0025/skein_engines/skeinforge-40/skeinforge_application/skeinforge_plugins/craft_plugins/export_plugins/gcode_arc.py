@@ -0,0 +1,453 @@
+"""
+This page is in the table of contents.
+Gcode arc is an export plugin to merge the collinear linear moves of a gcode file into longer moves and to fit arcs to the curved runs of moves, so that the fabricator gets fewer and longer commands.
+
+An export plugin is a script in the export_plugins folder which has the getOutput function, the globalIsReplaceable variable and if it's output is not replaceable, the writeOutput function.  It is meant to be run from the export tool.  To ensure that the plugin works on platforms which do not handle file capitalization properly, give the plugin a lower case name.
+
+The getOutput function of this script takes a gcode text and returns it with the moves merged and the arcs fitted.  The writeOutput function of this script takes a gcode text and writes that text with the moves merged and the arcs fitted, in a file with the suffix _gcode_arc.gcode.
+
+A run is a sequence of G1 moves in the same plane, at the same feed rate and with the same extrusion per millimeter if the moves have E words.  Any other line, like M101, M103, M108, a comment or a change of height, ends the run, so moves are never merged across an extrusion or flow boundary.  In a run, the moves which are within the tolerance of a straight line are merged into one G1 move, and the moves which are within the tolerance of a circle are replaced by a G2 or G3 arc.  A move which is not merged is written unchanged.  The moves after a G91 are relative, so they are written unchanged, and the moves are only merged again from the second move after the next G90, because the location is not known until the first absolute move.
+
+The arcs are written the way the firmware reads them, with the X, Y and Z of the end point and the I and J of the center relative to the start point.  An arc turns by less than half a turn, so that its start and end points are never close enough for a firmware to take it for a full circle.  Because the analyze tools read the penultimate gcode, they do not see the arcs.
+
+After the gcode is converted, the number of commands and the estimated time before and after are printed.  The comments are not commands, so they are not counted and take no time.  The estimated time of a command is the longer of the time of its move at its feed rate and the time to send its line over the serial link, so the time of many short moves is the time to send them.
+
+==Settings==
+===Baud Rate===
+Default is 19200.
+
+The baud rate of the serial link to the fabricator, which is used to estimate the time to send a line.
+
+===Fit Arcs===
+Default is on.
+
+When selected, arcs are fitted to the curved runs of moves.  When it is off, only the collinear moves are merged.
+
+===Minimum Arc Segments===
+Default is four.
+
+The smallest number of moves which are replaced by an arc.
+
+===Tolerance===
+Default is 0.05 mm.
+
+The largest distance that a merged move or an arc is allowed to be from the moves it replaces.  Export rounds the coordinates to two decimal places, so the tolerance should be more than 0.01 mm.
+
+"""
+
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import archive
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import gcodec
+from fabmetheus_utilities import settings
+from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
+from skeinforge_application.skeinforge_utilities import skeinforge_profile
+import cStringIO
+import math
+import sys
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+# This is true if the output is text and false if it is binary.
+globalIsReplaceable = True
+
+
+def getArcCenter(begin, middle, end):
+	'Get the center of the circle through three complex points, or None if they are collinear.'
+	beginMiddle = middle - begin
+	beginEnd = end - begin
+	cross = beginMiddle.real * beginEnd.imag - beginMiddle.imag * beginEnd.real
+	if abs(cross) <= 0.0:
+		return None
+	beginMiddleSquared = beginMiddle.real * beginMiddle.real + beginMiddle.imag * beginMiddle.imag
+	beginEndSquared = beginEnd.real * beginEnd.real + beginEnd.imag * beginEnd.imag
+	centerReal = beginEnd.imag * beginMiddleSquared - beginMiddle.imag * beginEndSquared
+	centerImag = beginMiddle.real * beginEndSquared - beginEnd.real * beginMiddleSquared
+	return begin + complex(centerReal, centerImag) / (cross + cross)
+
+def getCommandTime(baudRate, distance, feedRateMinute, line):
+	'Get the longer of the time of the move at the feed rate and the time to send the line at the baud rate, with ten bits for each character and the newline.'
+	transmissionTime = 10.0 * float(len(line) + 1) / float(baudRate)
+	if feedRateMinute <= 0.0:
+		return transmissionTime
+	return max(60.0 * distance / feedRateMinute, transmissionTime)
+
+def getNewRepository():
+	'Get new repository.'
+	return GcodeArcRepository()
+
+def getNumberOfDecimalPlaces(numberString):
+	'Get the number of decimal places of a number string.'
+	dotIndex = numberString.find('.')
+	if dotIndex < 0:
+		return 0
+	return len(numberString) - dotIndex - 1
+
+def getOutput(gcodeText, repository=None):
+	'Get the exported version of a gcode file.'
+	if gcodeText == '':
+		return ''
+	if repository == None:
+		repository = GcodeArcRepository()
+		settings.getReadRepository(repository)
+	skein = GcodeArcSkein()
+	output = skein.getCraftedGcode(gcodeText, repository)
+	skein.printReport()
+	return output
+
+def isCommand(splitLine):
+	'Determine if the split line is a command, rather than a comment.'
+	return len(splitLine) > 0 and not splitLine[0].startswith('(')
+
+def writeOutput(fileName, gcodeText=''):
+	'Write the exported version of a gcode file.'
+	gcodeText = gcodec.getGcodeFileText(fileName, gcodeText)
+	repository = GcodeArcRepository()
+	settings.getReadRepository(repository)
+	output = getOutput(gcodeText, repository)
+	suffixFileName = fileName[: fileName.rfind('.')] + '_gcode_arc.gcode'
+	archive.writeFileText(suffixFileName, output)
+	print('The converted file is saved as ' + archive.getSummarizedFileName(suffixFileName))
+
+
+class GcodeArcRepository:
+	'A class to handle the export settings.'
+	def __init__(self):
+		'Set the default settings, execute title & settings fileName.'
+		skeinforge_profile.addListsToCraftTypeRepository('skeinforge_application.skeinforge_plugins.craft_plugins.export_plugins.gcode_arc.html', self)
+		self.fileNameInput = settings.FileNameInput().getFromFileName([('Gcode text files', '*.gcode')], 'Open File to be Converted to Gcode Arc', self, '')
+		self.baudRate = settings.IntSpin().getFromValue(300, 'Baud Rate (bits/second):', self, 115200, 19200)
+		self.fitArcs = settings.BooleanSetting().getFromValue('Fit Arcs', self, True)
+		self.minimumArcSegments = settings.IntSpin().getFromValue(3, 'Minimum Arc Segments (integer):', self, 20, 4)
+		self.tolerance = settings.FloatSpin().getFromValue(0.01, 'Tolerance (mm):', self, 0.2, 0.05)
+		self.executeTitle = 'Convert to Gcode Arc'
+
+	def execute(self):
+		'Convert to gcode arc button has been clicked.'
+		fileNames = skeinforge_polyfile.getFileOrDirectoryTypesUnmodifiedGcode(self.fileNameInput.value, ['.gcode'], self.fileNameInput.wasCancelled)
+		for fileName in fileNames:
+			writeOutput(fileName)
+
+
+class GcodeArcSkein:
+	'A class to merge the moves of a gcode text and fit arcs to them.'
+	def __init__(self):
+		'Initialize.'
+		self.arcCount = 0
+		self.commandCount = 0
+		self.decimalPlaces = 1
+		self.extrusion = 0.0
+		self.feedRateMinute = 0.0
+		self.isAbsoluteDistance = True
+		self.isRelativeExtrusion = False
+		self.linearMoves = []
+		self.location = None
+		self.mergedLineCount = 0
+		self.oldCommandCount = 0
+		self.oldTime = 0.0
+		self.output = cStringIO.StringIO()
+		self.points = []
+		self.time = 0.0
+		self.wordStrings = {}
+
+	def __repr__(self):
+		'Get the string representation of this GcodeArcSkein.'
+		return '%s, %s, %s' % (self.oldCommandCount, self.commandCount, self.arcCount)
+
+	def addArc(self, beginIndex, endIndex, center, turn):
+		'Add an arc from the point at the begin index to the point at the end index.'
+		firstWord = 'G3'
+		if turn < 0.0:
+			firstWord = 'G2'
+		centerMinusBegin = center - self.points[beginIndex]
+		centerWords = ['I' + self.getRounded(centerMinusBegin.real), 'J' + self.getRounded(centerMinusBegin.imag)]
+		line = self.getMergedLine(beginIndex, centerWords, endIndex, firstWord)
+		self.addLine(line, abs(turn * centerMinusBegin), self.linearMoves[0].feedRateMinute)
+		self.arcCount += 1
+
+	def addLine(self, line, distance=0.0, feedRateMinute=0.0):
+		'Add a line of text and a newline to the output, and add its time to the estimated time.'
+		if line == '':
+			return
+		if isCommand(gcodec.getSplitLineBeforeBracketSemicolon(line)):
+			self.commandCount += 1
+			self.time += getCommandTime(self.repository.baudRate.value, distance, feedRateMinute, line)
+		self.output.write(line + '\n')
+
+	def addLinearMoves(self, beginIndex, endIndex):
+		'Add the moves from the point at the begin index to the point at the end index, merged into one move if there is more than one.'
+		if endIndex - beginIndex == 1:
+			linearMove = self.linearMoves[beginIndex]
+			self.addLine(linearMove.line, linearMove.distance, linearMove.feedRateMinute)
+			return
+		line = self.getMergedLine(beginIndex, [], endIndex, 'G1')
+		self.addLine(line, abs(self.points[endIndex] - self.points[beginIndex]), self.linearMoves[0].feedRateMinute)
+		self.mergedLineCount += 1
+
+	def addRun(self):
+		'Add the moves of the run, merging the collinear moves and fitting arcs to the curved moves.'
+		if len(self.linearMoves) < 1:
+			return
+		beginIndex = 0
+		while beginIndex < len(self.linearMoves):
+			lineEndIndex = self.getLineEndIndex(beginIndex)
+			arcEndIndex, center, turn = self.getArcEndIndexCenterTurn(beginIndex)
+			if arcEndIndex > lineEndIndex:
+				self.addArc(beginIndex, arcEndIndex, center, turn)
+				beginIndex = arcEndIndex
+			else:
+				self.addLinearMoves(beginIndex, lineEndIndex)
+				beginIndex = lineEndIndex
+		self.linearMoves = []
+		self.points = []
+
+	def getArcCenterTurn(self, beginIndex, endIndex):
+		'Get the center and the turn of the arc through the points from the begin to the end index, or None if the points are not within the tolerance of an arc turning by less than half a turn.'
+		points = self.points
+		center = getArcCenter(points[beginIndex], points[(beginIndex + endIndex) / 2], points[endIndex])
+		if center == None:
+			return None, 0.0
+		radius = abs(points[beginIndex] - center)
+		tolerance = self.repository.tolerance.value
+		turn = 0.0
+		turnSign = None
+		for pointIndex in xrange(beginIndex, endIndex):
+			beginCenter = points[pointIndex] - center
+			endCenter = points[pointIndex + 1] - center
+			if abs(abs(endCenter) - radius) > tolerance:
+				return None, 0.0
+			halfChordLength = 0.5 * abs(endCenter - beginCenter)
+			if radius - math.sqrt(max(radius * radius - halfChordLength * halfChordLength, 0.0)) > tolerance:
+				return None, 0.0
+			stepTurn = math.atan2(beginCenter.real * endCenter.imag - beginCenter.imag * endCenter.real, beginCenter.real * endCenter.real + beginCenter.imag * endCenter.imag)
+			if turnSign == None:
+				turnSign = stepTurn
+			if stepTurn * turnSign <= 0.0:
+				return None, 0.0
+			turn += stepTurn
+		if abs(turn) >= math.pi:
+			return None, 0.0
+		return center, turn
+
+	def getArcEndIndexCenterTurn(self, beginIndex):
+		'Get the index of the last point of the longest arc from the point at the begin index, with its center and turn, or the begin index if there is no arc.'
+		if not self.repository.fitArcs.value:
+			return beginIndex, None, 0.0
+		arcEndIndex = beginIndex
+		center = None
+		turn = 0.0
+		endIndex = beginIndex + self.repository.minimumArcSegments.value
+		while endIndex < len(self.points):
+			endCenter, endTurn = self.getArcCenterTurn(beginIndex, endIndex)
+			if endCenter == None:
+				return arcEndIndex, center, turn
+			arcEndIndex = endIndex
+			center = endCenter
+			turn = endTurn
+			endIndex += 1
+		return arcEndIndex, center, turn
+
+	def getCraftedGcode(self, gcodeText, repository):
+		'Parse gcode text and store the gcode with the moves merged and the arcs fitted.'
+		self.repository = repository
+		for line in archive.getTextLines(gcodeText):
+			self.parseLine(line)
+		self.addRun()
+		return self.output.getvalue()
+
+	def getLineEndIndex(self, beginIndex):
+		'Get the index of the last point of the longest line from the point at the begin index, which is at least the next point.'
+		endIndex = beginIndex + 1
+		while endIndex + 1 < len(self.points) and self.isLinear(beginIndex, endIndex + 1):
+			endIndex += 1
+		return endIndex
+
+	def getLinearMove(self, distance, line, location, splitLine):
+		'Get the linear move of the split line, or None if it can not be merged.'
+		if not self.isAbsoluteDistance or self.location == None or distance <= 0.0 or location.z != self.location.z:
+			return None
+		for word in splitLine[1 :]:
+			if word[: 1] not in 'EFXYZ':
+				return None
+			try:
+				float(word[1 :])
+			except ValueError:
+				return None
+			if word[0] == 'X' or word[0] == 'Y':
+				self.decimalPlaces = max(self.decimalPlaces, getNumberOfDecimalPlaces(word[1 :]))
+		if gcodec.getIndexOfStartingWithSecond('X', splitLine) < 0 and gcodec.getIndexOfStartingWithSecond('Y', splitLine) < 0:
+			return None
+		return LinearMove(distance, self.feedRateMinute, line, location.dropAxis())
+
+	def getMergedLine(self, beginIndex, centerWords, endIndex, firstWord):
+		'Get the line of a move from the point at the begin index to the point at the end index, with the words of the last move.'
+		lastMove = self.linearMoves[endIndex - 1]
+		words = [firstWord]
+		for letter in 'XYZ':
+			if letter in lastMove.wordStrings:
+				words.append(letter + lastMove.wordStrings[letter])
+		words += centerWords
+		if 'F' in lastMove.wordStrings:
+			words.append('F' + lastMove.wordStrings['F'])
+		if lastMove.extrusionIncrement != None:
+			if self.isRelativeExtrusion:
+				extrusionDecimalPlaces = 1
+				extrusionIncrement = 0.0
+				for linearMove in self.linearMoves[beginIndex : endIndex]:
+					extrusionDecimalPlaces = max(extrusionDecimalPlaces, linearMove.extrusionDecimalPlaces)
+					extrusionIncrement += linearMove.extrusionIncrement
+				words.append('E' + euclidean.getRoundedToPlacesString(extrusionDecimalPlaces, extrusionIncrement))
+			else:
+				words.append('E' + lastMove.wordStrings['E'])
+		return ' '.join(words)
+
+	def getRounded(self, number):
+		'Get the number rounded to the decimal places of the coordinates as a string, without a minus sign on zero.'
+		return str(euclidean.getRoundedToPlaces(self.decimalPlaces, number) + 0.0)
+
+	def isInRun(self, linearMove):
+		'Determine if the linear move has the feed rate and the extrusion per millimeter of the run.'
+		firstMove = self.linearMoves[0]
+		if linearMove.feedRateMinute != firstMove.feedRateMinute:
+			return False
+		if (linearMove.extrusionIncrement == None) != (firstMove.extrusionIncrement == None):
+			return False
+		if linearMove.extrusionIncrement == None:
+			return True
+		runDistance = 0.0
+		runExtrusion = 0.0
+		for runMove in self.linearMoves:
+			runDistance += runMove.distance
+			runExtrusion += runMove.extrusionIncrement
+		extrusionUnit = math.pow(10.0, - linearMove.extrusionDecimalPlaces)
+		return abs(linearMove.extrusionIncrement - runExtrusion * linearMove.distance / runDistance) <= extrusionUnit
+
+	def isLinear(self, beginIndex, endIndex):
+		'Determine if the points from the begin to the end index are within the tolerance of the line between them and go forward along it.'
+		points = self.points
+		chord = points[endIndex] - points[beginIndex]
+		chordLength = abs(chord)
+		if chordLength <= 0.0:
+			return False
+		unitConjugate = chord.conjugate() / chordLength
+		tolerance = self.repository.tolerance.value
+		for pointIndex in xrange(beginIndex, endIndex):
+			if ((points[pointIndex + 1] - points[pointIndex]) * unitConjugate).real <= 0.0:
+				return False
+			if abs(((points[pointIndex] - points[beginIndex]) * unitConjugate).imag) > tolerance:
+				return False
+		return True
+
+	def linearMove(self, line, splitLine):
+		'Add the move to the run if it can be merged, otherwise end the run and add the line.'
+		location = gcodec.getLocationFromSplitLine(self.location, splitLine)
+		self.feedRateMinute = gcodec.getFeedRateMinute(self.feedRateMinute, splitLine)
+		distance = 0.0
+		if not self.isAbsoluteDistance:
+			distance = abs(location)
+		elif self.location != None:
+			distance = abs(location - self.location)
+		self.oldTime += getCommandTime(self.repository.baudRate.value, distance, self.feedRateMinute, line)
+		linearMove = self.getLinearMove(distance, line, location, splitLine)
+		self.setExtrusionWordStrings(linearMove, splitLine)
+		if linearMove == None:
+			self.addRun()
+			self.addLine(line, distance, self.feedRateMinute)
+		else:
+			if len(self.linearMoves) > 0 and not self.isInRun(linearMove):
+				self.addRun()
+			if len(self.linearMoves) == 0:
+				self.points.append(self.location.dropAxis())
+			self.linearMoves.append(linearMove)
+			self.points.append(linearMove.point)
+		if self.isAbsoluteDistance:
+			self.location = location
+
+	def parseLine(self, line):
+		'Parse a gcode line and add it to the run or to the output.'
+		if line == '':
+			return
+		splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
+		if isCommand(splitLine):
+			self.oldCommandCount += 1
+		firstWord = gcodec.getFirstWord(splitLine)
+		if firstWord == 'G1':
+			self.linearMove(line, splitLine)
+			return
+		if isCommand(splitLine):
+			self.oldTime += getCommandTime(self.repository.baudRate.value, 0.0, 0.0, line)
+		self.addRun()
+		self.addLine(line)
+		if firstWord == 'G90':
+			self.isAbsoluteDistance = True
+		elif firstWord == 'G91':
+			self.isAbsoluteDistance = False
+			self.location = None
+		elif firstWord == 'G92':
+			if self.location != None:
+				self.location = gcodec.getLocationFromSplitLine(self.location, splitLine)
+			self.extrusion = gcodec.getDoubleFromCharacterSplitLineValue('E', splitLine, self.extrusion)
+		elif firstWord == 'M82':
+			self.isRelativeExtrusion = False
+		elif firstWord == 'M83':
+			self.isRelativeExtrusion = True
+		elif firstWord in ['G0', 'G2', 'G3', 'G28']:
+			self.location = None
+
+	def printReport(self):
+		'Print the number of commands and the estimated time before and after.'
+		print('Gcode arc merged %s runs of collinear moves and fitted %s arcs, the number of commands went from %s to %s.' % (self.mergedLineCount, self.arcCount, self.oldCommandCount, self.commandCount))
+		print('The estimated time at %s baud went from %s to %s.' % (self.repository.baudRate.value, euclidean.getDurationString(self.oldTime), euclidean.getDurationString(self.time)))
+
+	def setExtrusionWordStrings(self, linearMove, splitLine):
+		'Set the extrusion and the word strings from the split line, and the extrusion increment and the word strings of the linear move if there is one.'
+		for word in splitLine[1 :]:
+			if word[: 1] in 'EFXYZ':
+				self.wordStrings[word[0]] = word[1 :]
+		extrusion = gcodec.getDoubleFromCharacterSplitLine('E', splitLine)
+		extrusionIncrement = extrusion
+		if extrusion != None and not self.isRelativeExtrusion:
+			extrusionIncrement = extrusion - self.extrusion
+			self.extrusion = extrusion
+		if linearMove == None:
+			return
+		linearMove.extrusionIncrement = extrusionIncrement
+		linearMove.wordStrings = self.wordStrings.copy()
+		if extrusion != None:
+			linearMove.extrusionDecimalPlaces = getNumberOfDecimalPlaces(gcodec.getStringFromCharacterSplitLine('E', splitLine))
+
+
+class LinearMove:
+	'A class to hold a linear move of a run.'
+	def __init__(self, distance, feedRateMinute, line, point):
+		'Initialize.'
+		self.distance = distance
+		self.extrusionDecimalPlaces = 0
+		self.extrusionIncrement = None
+		self.feedRateMinute = feedRateMinute
+		self.line = line
+		self.point = point
+		self.wordStrings = {}
+
+	def __repr__(self):
+		'Get the string representation of this LinearMove.'
+		return '%s, %s, %s' % (self.point, self.distance, self.extrusionIncrement)
+
+
+def main():
+	'Display the export dialog.'
+	if len(sys.argv) > 1:
+		writeOutput(' '.join(sys.argv[1 :]))
+	else:
+		settings.startMainLoopFromConstructor(getNewRepository())
+
+if __name__ == '__main__':
+	main()
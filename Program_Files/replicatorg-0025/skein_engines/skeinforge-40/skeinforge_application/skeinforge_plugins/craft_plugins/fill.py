@@ -133,7 +133,7 @@ When selected the layer will start from the lower left corner.  This is to extru
 http://hydraraptor.blogspot.com/2010/12/round-robin.html
 
 ====Nearest====
-When selected the layer will start from the nearest point to the end of the last layer.  This leads to less stringing, but the first extrusion will be deposited on the hottest part of the last layer which leads to melting problems.  So this option is deprecated, eventually this option will be removed and the layers will always start from the lower left.
+When selected the layer will start from the nearest point to the end of the last layer.  This leads to less stringing, but the first extrusion will be deposited on the hottest part of the last layer which leads to melting problems.  So this option is deprecated, eventually this option will be removed and the layers will always start from the lower left.  Because each layer depends on the end of the last layer, the layers are filled in order instead of being handed out to the layer worker processes of skeinforge_parallel.
 
 ===Thread Sequence Choice===
 The 'Thread Sequence Choice' is the sequence in which the threads will be extruded on the second and higher layers.  There are three kinds of thread, the perimeter threads on the outside of the object, the loop threads aka inner shell threads, and the interior infill threads.  The first layer thread sequence is 'Perimeter > Loops > Infill'.
@@ -180,6 +180,7 @@ from fabmetheus_utilities import gcodec
 from fabmetheus_utilities import intercircle
 from fabmetheus_utilities import settings
 from skeinforge_application.skeinforge_utilities import skeinforge_craft
+from skeinforge_application.skeinforge_utilities import skeinforge_parallel
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
 import math
@@ -838,7 +839,8 @@ class FillSkein:
 		self.extruderActive = False
 		self.fillInset = 0.18
 		self.isPerimeter = False
-		self.lastExtraShells = - 1
+		self.layerExtraShells = []
+		self.layerWindow = None
 		self.lineIndex = 0
 		self.oldLocation = None
 		self.oldOrderedLocation = None
@@ -853,7 +855,6 @@ class FillSkein:
 		'Add fill to the carve layer.'
 #		if layerIndex > 2:
 #			return
-		settings.printProgressByNumber(layerIndex, len(self.rotatedLayers), 'fill')
 		alreadyFilledArounds = []
 		pixelTable = {}
 		arounds = []
@@ -865,25 +866,18 @@ class FillSkein:
 		layerRotation = self.getLayerRotation(layerIndex)
 		reverseRotation = complex(layerRotation.real, - layerRotation.imag)
 		surroundingCarves = []
-		layerRemainder = layerIndex % int(round(self.repository.diaphragmPeriod.value))
-		if layerRemainder >= int(round(self.repository.diaphragmThickness.value)) and rotatedLayer.rotation == None:
+		if self.isSurroundingCarvesAdded(layerIndex):
 			for surroundingIndex in xrange(1, self.solidSurfaceThickness + 1):
 				self.addRotatedCarve(layerIndex, -surroundingIndex, reverseRotation, surroundingCarves)
 				self.addRotatedCarve(layerIndex, surroundingIndex, reverseRotation, surroundingCarves)
-		extraShells = self.repository.extraShellsSparseLayer.value
-		if len(surroundingCarves) < self.doubleSolidSurfaceThickness:
-			extraShells = self.repository.extraShellsAlternatingSolidLayer.value
-			if self.lastExtraShells != self.repository.extraShellsBase.value:
-				extraShells = self.repository.extraShellsBase.value
+		extraShells = self.layerExtraShells[layerIndex]
 		if rotatedLayer.rotation != None:
-			extraShells = 0
 			betweenWidth *= self.bridgeWidthMultiplier
 			self.layerExtrusionWidth *= self.bridgeWidthMultiplier
 			layerFillInset *= self.bridgeWidthMultiplier
 			self.distanceFeedRate.addLine('(<bridgeRotation> %s )' % rotatedLayer.rotation)
 		aroundInset = 0.25 * self.layerExtrusionWidth
 		aroundWidth = 0.25 * self.layerExtrusionWidth
-		self.lastExtraShells = extraShells
 		gridPointInsetX = 0.5 * layerFillInset
 		doubleExtrusionWidth = 2.0 * self.layerExtrusionWidth
 		endpoints = []
@@ -1080,6 +1074,10 @@ class FillSkein:
 			gridXStep = self.getNextGripXStep(gridXStep)
 			gridXOffset = offset + self.gridXStepSize * float(gridXStep)
 
+	def addLayer(self, layerIndex):
+		'Add fill to a layer, for skeinforge_parallel.'
+		self.addFill(layerIndex)
+
 	def addRemainingGridPoints(
 		self, arounds, gridPointInsetX, gridPointInsetY, gridPoints, isBothOrNone, paths, pixelTable, width):
 		'Add the remaining grid points to the grid point list.'
@@ -1164,8 +1162,11 @@ class FillSkein:
 		self.doubleSolidSurfaceThickness = self.solidSurfaceThickness + self.solidSurfaceThickness
 		for lineIndex in xrange( self.lineIndex, len(self.lines) ):
 			self.parseLine( lineIndex )
-		for layerIndex in xrange(len(self.rotatedLayers)):
-			self.addFill(layerIndex)
+		self.layerExtraShells = self.getLayerExtraShells()
+		if self.repository.startFromLowerLeft.value:
+			self.layerWindow = self.solidSurfaceThickness
+		for layerText in skeinforge_parallel.getLayerTexts(self, len(self.rotatedLayers), 'fill'):
+			self.distanceFeedRate.output.write(layerText)
 		self.distanceFeedRate.addLines( self.lines[ self.shutdownLineIndex : ] )
 		return self.distanceFeedRate.output.getvalue()
 
@@ -1205,6 +1206,22 @@ class FillSkein:
 				self.addGridLinePoints(begin, end, gridPoints, gridRotationAngle, offset, y)
 		return gridPoints
 
+	def getLayerExtraShells(self):
+		'Get the number of extra shells of each layer, which depends on the number of the layer below, so it is set before the layers are filled.'
+		lastExtraShells = - 1
+		layerExtraShells = []
+		for layerIndex in xrange(len(self.rotatedLayers)):
+			extraShells = self.repository.extraShellsSparseLayer.value
+			if self.getNumberOfSurroundingCarves(layerIndex) < self.doubleSolidSurfaceThickness:
+				extraShells = self.repository.extraShellsAlternatingSolidLayer.value
+				if lastExtraShells != self.repository.extraShellsBase.value:
+					extraShells = self.repository.extraShellsBase.value
+			if self.rotatedLayers[layerIndex].rotation != None:
+				extraShells = 0
+			layerExtraShells.append(extraShells)
+			lastExtraShells = extraShells
+		return layerExtraShells
+
 	def getLayerRotation(self, layerIndex):
 		'Get the layer rotation.'
 		rotation = self.rotatedLayers[layerIndex].rotation
@@ -1223,6 +1240,16 @@ class FillSkein:
 				gridXStep += 1
 		return gridXStep
 
+	def getNumberOfSurroundingCarves(self, layerIndex):
+		'Get the number of surrounding carves which are added to the layer.'
+		if not self.isSurroundingCarvesAdded(layerIndex):
+			return 0
+		numberOfSurroundingCarves = 0
+		for surroundingIndex in xrange(layerIndex - self.solidSurfaceThickness, layerIndex + self.solidSurfaceThickness + 1):
+			if surroundingIndex != layerIndex and surroundingIndex >= 0 and surroundingIndex < len(self.rotatedLayers):
+				numberOfSurroundingCarves += 1
+		return numberOfSurroundingCarves
+
 	def isGridToBeExtruded(self):
 		'Determine if the grid is to be extruded.'
 		if self.repository.infillPatternLine.value:
@@ -1246,6 +1273,11 @@ class FillSkein:
 					return True
 		return False
 
+	def isSurroundingCarvesAdded(self, layerIndex):
+		'Determine if the surrounding carves are added to the layer, they are not added to a diaphragm or a bridge layer.'
+		layerRemainder = layerIndex % int(round(self.repository.diaphragmPeriod.value))
+		return layerRemainder >= int(round(self.repository.diaphragmThickness.value)) and self.rotatedLayers[layerIndex].rotation == None
+
 	def linearMove( self, splitLine ):
 		'Add a linear move to the thread.'
 		location = gcodec.getLocationFromSplitLine(self.oldLocation, splitLine)
@@ -71,8 +71,10 @@ from fabmetheus_utilities import gcodec
 from fabmetheus_utilities import intercircle
 from fabmetheus_utilities import settings
 from skeinforge_application.skeinforge_utilities import skeinforge_craft
+from skeinforge_application.skeinforge_utilities import skeinforge_parallel
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
+import cStringIO
 import math
 import os
 import sys
@@ -258,9 +260,11 @@ class InsetSkein:
 	def __init__(self):
 		self.boundary = None
 		self.distanceFeedRate = gcodec.DistanceFeedRate()
-		self.layerCount = settings.LayerCount()
+		self.layerWindow = 0
 		self.lineIndex = 0
 		self.rotatedLoopLayer = None
+		self.rotatedLoopLayers = []
+		self.textsBetweenLayers = []
 
 	def addGcodeFromPerimeterPaths( self, isIntersectingSelf, loop, loopLists, radius, z ):
 		"Add the perimeter paths to the output."
@@ -346,6 +350,10 @@ class InsetSkein:
 		for extrudateLoop in extrudateLoops:
 			self.addGcodeFromRemainingLoop( extrudateLoop, alreadyFilledArounds, halfWidth, rotatedLoopLayer.z )
 
+	def addLayer(self, layerIndex):
+		"Add inset to a layer, for skeinforge_parallel."
+		self.addInset(self.rotatedLoopLayers[layerIndex])
+
 	def getCraftedGcode(self, gcodeText, repository):
 		"Parse gcode text and store the bevel gcode."
 		self.repository = repository
@@ -353,7 +361,14 @@ class InsetSkein:
 		self.parseInitialization()
 		for line in self.lines[self.lineIndex :]:
 			self.parseLine(line)
-		return self.distanceFeedRate.output.getvalue()
+		self.textsBetweenLayers.append(self.distanceFeedRate.output.getvalue())
+		output = cStringIO.StringIO()
+		layerTexts = skeinforge_parallel.getLayerTexts(self, len(self.rotatedLoopLayers), 'inset')
+		for layerIndex in xrange(len(layerTexts)):
+			output.write(self.textsBetweenLayers[layerIndex])
+			output.write(layerTexts[layerIndex])
+		output.write(self.textsBetweenLayers[-1])
+		return output.getvalue()
 
 	def parseInitialization(self):
 		'Parse gcode initialization and store the parameters.'
@@ -393,11 +408,12 @@ class InsetSkein:
 					self.distanceFeedRate.addLine('M104 S0') # Turn extruder heater off.
 				return
 		elif firstWord == '(<layer>':
-			self.layerCount.printProgressIncrement('inset')
 			self.rotatedLoopLayer = euclidean.RotatedLoopLayer(float(splitLine[1]))
+			self.rotatedLoopLayers.append(self.rotatedLoopLayer)
 			self.distanceFeedRate.addLine(line)
+			self.textsBetweenLayers.append(self.distanceFeedRate.output.getvalue())
+			self.distanceFeedRate.output = cStringIO.StringIO()
 		elif firstWord == '(</layer>)':
-			self.addInset( self.rotatedLoopLayer )
 			self.rotatedLoopLayer = None
 		elif firstWord == '(<nestedRing>)':
 			self.boundary = []
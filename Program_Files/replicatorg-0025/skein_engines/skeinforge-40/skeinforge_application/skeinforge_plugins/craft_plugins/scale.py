@@ -144,9 +144,9 @@ class ScaleSkein:
 			decimalPlacesCarried,
 			layerThickness,
 			perimeterWidth)
-		commentElement = svg_writer.getCommentElement(svgReader.root)
+		commentElement = svgReader.getCommentElement()
 		procedureNameString = svgReader.sliceDictionary['procedureName'] + ',scale'
-		return svgWriter.getReplacedSVGTemplate(fileName, procedureNameString, rotatedLoopLayers, commentElement)
+		return svgWriter.getSliceText(fileName, procedureNameString, rotatedLoopLayers, commentElement)
 
 
 def main():
@@ -1,6 +1,8 @@
 """
 Analyze is a script to access the plugins which analyze a gcode file.
 
+The gcode text is split into lines and each line is tokenized once, then the lines are handed in one pass to all the activated plugins which are line visitors.  A plugin is a line visitor if it has a getLineVisitor(fileNameSuffix, gcodeText) function, which returns None if the plugin is not activated, or an object with a visitLine(line, splitLine) method, which is called for each line, and a getWindow() method, which is called after the last line to write the output.  The other plugins are called with writeOutput as before, and while they run the split lines are shared through the split line table of gcodec, so they look up the tokenized lines instead of splitting them again.  When analyze is called from export, the table of the craft chain is used.
+
 """
 
 from __future__ import absolute_import
@@ -34,23 +36,77 @@ def getPluginsDirectoryPath():
 	"Get the plugins directory path."
 	return archive.getAbsoluteFolderPath( os.path.dirname(__file__), os.path.join('skeinforge_plugins', 'analyze_plugins') )
 
+def getLineVisitors(fileNameSuffix, gcodeText, pluginModules):
+	'Get a dictionary of the line visitors of the activated plugins which are line visitors, keyed by the plugin file name.'
+	lineVisitors = {}
+	for pluginFileName, pluginModule in pluginModules:
+		if hasattr(pluginModule, 'getLineVisitor'):
+			try:
+				lineVisitor = pluginModule.getLineVisitor(fileNameSuffix, gcodeText)
+				if lineVisitor != None:
+					lineVisitors[pluginFileName] = lineVisitor
+			except:
+				printAnalyzeWarning(pluginFileName)
+	return lineVisitors
+
+def getPluginModules():
+	'Get the file names and modules of the analyze plugins.'
+	analyzePluginsDirectoryPath = getPluginsDirectoryPath()
+	pluginModules = []
+	for pluginFileName in getPluginFileNames():
+		pluginModule = archive.getModuleWithDirectoryPath( analyzePluginsDirectoryPath, pluginFileName )
+		if pluginModule != None:
+			pluginModules.append((pluginFileName, pluginModule))
+	return pluginModules
+
+def printAnalyzeWarning(pluginFileName):
+	'Print the warning and the exception traceback of a plugin which could not analyze the output.'
+	print('Warning, the tool %s could not analyze the output.' % pluginFileName )
+	print('Exception traceback in writeOutput in skeinforge_analyze:')
+	traceback.print_exc(file=sys.stdout)
+
+def visitLines(lineVisitors, lines):
+	'Tokenize each line once and hand it to each line visitor, dropping a line visitor which raises an exception.'
+	visitorItems = lineVisitors.items()
+	for line in lines:
+		splitLine = gcodec.getSplitLineBeforeBracketSemicolon(line)
+		for pluginFileName, lineVisitor in visitorItems:
+			try:
+				lineVisitor.visitLine(line, splitLine)
+			except:
+				printAnalyzeWarning(pluginFileName)
+				del lineVisitors[pluginFileName]
+				visitorItems = lineVisitors.items()
+
 def writeOutput( fileName, fileNameSuffix, gcodeText = ''):
 	"Analyze a gcode file."
 	gcodeText = archive.getTextIfEmpty(fileName, gcodeText)
-	pluginFileNames = getPluginFileNames()
+	oldSplitLineTable = gcodec.globalSplitLineTable
+	if oldSplitLineTable == None:
+		gcodec.setSplitLineTable({})
+	try:
+		return writeOutputWithSplitLineTable(fileName, fileNameSuffix, gcodeText)
+	finally:
+		gcodec.setSplitLineTable(oldSplitLineTable)
+
+def writeOutputWithSplitLineTable(fileName, fileNameSuffix, gcodeText):
+	'Analyze a gcode file in one pass for the line visitors, then with writeOutput for the other plugins, while the split line table is shared by the plugins.'
+	pluginModules = getPluginModules()
+	lineVisitors = getLineVisitors(fileNameSuffix, gcodeText, pluginModules)
+	visitLines(lineVisitors, archive.getTextLines(gcodeText))
 	window = None
-	for pluginFileName in pluginFileNames:
-		analyzePluginsDirectoryPath = getPluginsDirectoryPath()
-		pluginModule = archive.getModuleWithDirectoryPath( analyzePluginsDirectoryPath, pluginFileName )
-		if pluginModule != None:
-			try:
+	for pluginFileName, pluginModule in pluginModules:
+		try:
+			if hasattr(pluginModule, 'getLineVisitor'):
+				newWindow = None
+				if pluginFileName in lineVisitors:
+					newWindow = lineVisitors[pluginFileName].getWindow()
+			else:
 				newWindow = pluginModule.writeOutput( fileName, fileNameSuffix, gcodeText )
-				if newWindow != None:
-					window = newWindow
-			except:
-				print('Warning, the tool %s could not analyze the output.' % pluginFileName )
-				print('Exception traceback in writeOutput in skeinforge_analyze:')
-				traceback.print_exc(file=sys.stdout)
+			if newWindow != None:
+				window = newWindow
+		except:
+			printAnalyzeWarning(pluginFileName)
 	return window
 
 
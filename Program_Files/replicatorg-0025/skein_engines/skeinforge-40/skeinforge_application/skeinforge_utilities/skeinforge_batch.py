@@ -0,0 +1,222 @@
+"""
+Batch is a script to craft many model files in parallel worker processes, for example to slice a directory of models unattended overnight.
+
+The arguments are model files, directories or glob patterns.  For a directory, all the files in it which have a type which can be interpreted are crafted, except for files which were generated by a craft procedure, like test_carve.svg.  Each file is crafted through export in its own job, the output of the job is captured and a line with the result and the time is printed when the job is done.  After all the jobs are done, a summary is printed.  If any job failed, batch exits with a nonzero code.
+
+Before crafting, batch exits with a nonzero code if an argument does not match any file, or if two files have the same name without the extension, like test.stl and test.obj, because they would be crafted to the same output files.
+
+To craft all the models in a directory with four worker processes, in a shell type:
+> python skeinforge_batch.py -n 4 models
+
+To craft all the stl files matching a pattern, in a shell type:
+> python skeinforge_batch.py "models/*.stl"
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities.fabmetheus_tools import fabmetheus_interpret
+from fabmetheus_utilities import archive
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import settings
+from optparse import OptionParser
+from skeinforge_application.skeinforge_plugins.craft_plugins import export
+from skeinforge_application.skeinforge_utilities import skeinforge_craft
+import cStringIO
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+def getBatchFileNames(fileNamesOrPatterns):
+	'Get the sorted model file names from the file names, directories and glob patterns.'
+	fileTypes = fabmetheus_interpret.getImportPluginFileNames()
+	generatedWords = getGeneratedWords()
+	batchFileNames = []
+	for fileNameOrPattern in fileNamesOrPatterns:
+		for fileName in glob.glob(fileNameOrPattern):
+			fileName = os.path.abspath(fileName)
+			if os.path.isdir(fileName):
+				batchFileNames += archive.getFilesWithFileTypesWithoutWords(fileTypes, generatedWords, os.path.join(fileName, '__init__.py'))
+			else:
+				batchFileNames.append(fileName)
+	return sorted(set(batchFileNames))
+
+def getBatchResult(fileName):
+	'Craft a file in a worker process and return its BatchResult.'
+	batchResult = BatchResult(fileName)
+	originalStandardOutput = sys.stdout
+	outputWriter = cStringIO.StringIO()
+	sys.stdout = outputWriter
+	startTime = time.time()
+	try:
+		exportFileName = export.getExportFileName(fileName, settings.getReadRepository(export.ExportRepository()))
+		exportStatBefore = getStatOrNone(exportFileName)
+		skeinforge_craft.writeOutput(fileName, False)
+		exportStatAfter = getStatOrNone(exportFileName)
+		if exportStatAfter == None or exportStatAfter == exportStatBefore:
+			batchResult.message = 'No export file was written.'
+		else:
+			batchResult.exportFileName = exportFileName
+			batchResult.succeeded = True
+	except:
+		batchResult.message = traceback.format_exc()
+	sys.stdout = originalStandardOutput
+	batchResult.seconds = time.time() - startTime
+	batchResult.output = outputWriter.getvalue()
+	return batchResult
+
+def getFileNamesWithSameStem(fileNames):
+	'Get the lists of file names which have the same name without the extension, so they would be crafted to the same output files.'
+	stemDictionary = {}
+	for fileName in fileNames:
+		stem = fileName[: fileName.rfind('.')]
+		if stem in stemDictionary:
+			stemDictionary[stem].append(fileName)
+		else:
+			stemDictionary[stem] = [fileName]
+	fileNamesWithSameStem = []
+	for stem in sorted(stemDictionary.keys()):
+		if len(stemDictionary[stem]) > 1:
+			fileNamesWithSameStem.append(stemDictionary[stem])
+	return fileNamesWithSameStem
+
+def getGeneratedWords():
+	'Get the words which are in the names of the files generated by the craft procedures.'
+	generatedWords = ['_penultimate.']
+	for procedure in skeinforge_craft.getReadCraftSequence():
+		generatedWords.append('_%s.' % procedure)
+	return generatedWords
+
+def getStatOrNone(fileName):
+	'Get the modification time and size of a file, or None if it does not exist.'
+	try:
+		fileStat = os.stat(fileName)
+	except OSError:
+		return None
+	return (fileStat.st_mtime, fileStat.st_size)
+
+def getUnmatchedPatterns(fileNamesOrPatterns):
+	'Get the file names, directories and glob patterns which do not match any file.'
+	unmatchedPatterns = []
+	for fileNameOrPattern in fileNamesOrPatterns:
+		if len(glob.glob(fileNameOrPattern)) < 1:
+			unmatchedPatterns.append(fileNameOrPattern)
+	return unmatchedPatterns
+
+def getSummary(batchResults, wallSeconds):
+	'Get the summary text of the batch results.'
+	failedResults = []
+	totalSeconds = 0.0
+	for batchResult in batchResults:
+		totalSeconds += batchResult.seconds
+		if not batchResult.succeeded:
+			failedResults.append(batchResult)
+	summaryLines = ['Crafted %s of %s files in %s, with %s of crafting time.' % (len(batchResults) - len(failedResults), len(batchResults), euclidean.getDurationString(wallSeconds), euclidean.getDurationString(totalSeconds))]
+	if len(batchResults) > 0:
+		slowestResult = max(batchResults, key=lambda batchResult: batchResult.seconds)
+		summaryLines.append('The slowest file was %s, which took %s.' % (slowestResult.fileName, euclidean.getDurationString(slowestResult.seconds)))
+	if len(failedResults) > 0:
+		summaryLines.append('The files which failed are:')
+		for failedResult in failedResults:
+			summaryLines.append(failedResult.fileName)
+	return '\n'.join(summaryLines)
+
+def initializeWorker(preferencesDirectory, temporaryOverrides):
+	'Initialize a worker process with the preferences directory and overrides of the batch.'
+	if preferencesDirectory != '':
+		archive.globalTemporarySettingsPath = preferencesDirectory
+	settings.globalTemporaryOverrides = temporaryOverrides
+
+def writeBatchOutput(fileNames, numberOfProcesses=None, preferencesDirectory='', printOutput=False):
+	'Craft the files in a pool of worker processes, print a line for each result and the summary, then return the batch results.'
+	if numberOfProcesses == None:
+		numberOfProcesses = multiprocessing.cpu_count()
+	print('Crafting %s files with %s worker processes.' % (len(fileNames), numberOfProcesses))
+	startTime = time.time()
+	pool = multiprocessing.Pool(numberOfProcesses, initializeWorker, (preferencesDirectory, settings.globalTemporaryOverrides))
+	batchResults = []
+	try:
+		for batchResult in pool.imap_unordered(getBatchResult, fileNames):
+			batchResults.append(batchResult)
+			print(str(batchResult))
+			if printOutput or not batchResult.succeeded:
+				print(batchResult.output)
+				print(batchResult.message)
+		pool.close()
+	except KeyboardInterrupt:
+		pool.terminate()
+		raise
+	pool.join()
+	print('')
+	print(getSummary(batchResults, time.time() - startTime))
+	return batchResults
+
+
+class BatchResult:
+	'A class to hold the result of crafting one file of a batch.'
+	def __init__(self, fileName):
+		'Initialize.'
+		self.exportFileName = None
+		self.fileName = fileName
+		self.message = ''
+		self.output = ''
+		self.seconds = 0.0
+		self.succeeded = False
+
+	def __repr__(self):
+		'Get the string representation of this BatchResult.'
+		if self.succeeded:
+			return 'Done    %s  %s -> %s' % (euclidean.getDurationString(self.seconds), self.fileName, self.exportFileName)
+		return 'Failed  %s  %s' % (euclidean.getDurationString(self.seconds), self.fileName)
+
+
+def main():
+	'Craft the files, directories and glob patterns given as arguments.'
+	parser = OptionParser(usage='usage: %prog [options] file|directory|pattern...')
+	parser.add_option('-n', '--processes', help='set the number of worker processes', action='store', type='int', dest='numberOfProcesses')
+	parser.add_option('-o', '--option', help='set an individual option in the format "module:preference=value"', action='append', type='string', dest='preferences', default=[])
+	parser.add_option('-p', '--prefdir', help='set path to preference directory', action='store', type='string', dest='preferencesDirectory', default='')
+	parser.add_option('-v', '--verbose', help='print the craft output of every file', action='store_true', dest='verbose', default=False)
+	(options, args) = parser.parse_args()
+	if len(args) < 1:
+		parser.error('there are no files to craft')
+	if options.preferencesDirectory != '':
+		archive.globalTemporarySettingsPath = options.preferencesDirectory
+	for preference in options.preferences:
+		moduleName, preferenceSpecification = preference.split(':', 1)
+		preferenceName, value = preferenceSpecification.split('=', 1)
+		settings.temporaryAddPreferenceOverride(moduleName, preferenceName, value)
+	unmatchedPatterns = getUnmatchedPatterns(args)
+	if len(unmatchedPatterns) > 0:
+		print('Warning, there are no files matching:')
+		print(' '.join(unmatchedPatterns))
+		sys.exit(1)
+	fileNames = getBatchFileNames(args)
+	if len(fileNames) < 1:
+		print('There are no files to craft in:')
+		print(' '.join(args))
+		sys.exit(1)
+	fileNamesWithSameStem = getFileNamesWithSameStem(fileNames)
+	if len(fileNamesWithSameStem) > 0:
+		print('Warning, these files would overwrite each other\'s output files, so they have to be crafted in separate batches:')
+		for sameStemFileNames in fileNamesWithSameStem:
+			print(' '.join(sameStemFileNames))
+		sys.exit(1)
+	batchResults = writeBatchOutput(fileNames, options.numberOfProcesses, options.preferencesDirectory, options.verbose)
+	for batchResult in batchResults:
+		if not batchResult.succeeded:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -3,6 +3,12 @@ Craft is a script to access the plugins which craft a gcode file.
 
 The plugin buttons which are commonly used are bolded and the ones which are rarely used have normal font weight.
 
+When 'Activate Craft Cache' is on, the output of each procedure is saved in the craft_cache folder in the .skeinforge folder, keyed by a hash of the procedure input, the procedure settings, the craft settings which change the procedure output like 'Hand Off Binary Slice Layers', the alterations, the procedure script and the modification times of the fabmetheus_utilities and skeinforge_utilities scripts.  When a file is crafted again, each procedure whose key is in the cache is skipped and its saved output is used, so after changing a setting of a late procedure like speed or cool, the chain resumes from the first procedure whose output changed.  The input file of the first procedure is part of its key, except for xml files, which can import other files, so their first procedure is always run.  When the cache is bigger than the 'Maximum Craft Cache Size', the least recently used outputs are deleted.
+
+When 'Hand Off Binary Slice Layers' is on, carve and the procedures up to preface hand the slice layers to each other in the compact binary format of slice_layers instead of as svg text, so the coordinates are not written out as text and parsed back by each procedure.  The svg is still written when the chain stops before preface, for example when a tool like carve or bottom is run by itself.
+
+The 'Layer Worker Processes' is the number of worker processes which the procedures that craft their layers independently, like fill and inset, hand their layers out to.  The default is one, which means the layers are crafted in order in the crafting process, so that crafting from the gui does not fork a pool of worker processes for every procedure.  Zero means one worker process per processor.  The output is the same whatever the number of worker processes is.
+
 """
 
 from __future__ import absolute_import
@@ -14,12 +20,17 @@ from fabmetheus_utilities import archive
 from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import gcodec
 from fabmetheus_utilities import settings
+from fabmetheus_utilities import slice_layers
+from fabmetheus_utilities import svg_writer
 from skeinforge_application.skeinforge_utilities import skeinforge_analyze
+from skeinforge_application.skeinforge_utilities import skeinforge_parallel
 from skeinforge_application.skeinforge_utilities import skeinforge_polyfile
 from skeinforge_application.skeinforge_utilities import skeinforge_profile
+import hashlib
 import os
 import sys
 import time
+import zlib
 
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
@@ -32,20 +43,47 @@ def getChainText( fileName, procedure ):
 	text=''
 	if fileName.endswith('.gcode') or fileName.endswith('.svg'):
 		text = archive.getFileText(fileName)
+	settings.addProfileDirectoryToCache(archive.getProfilesPath(skeinforge_profile.getProfileDirectory()))
 	procedures = getProcedures( procedure, text )
-	return getChainTextFromProcedures( fileName, procedures, text )
+	return svg_writer.getSVGTextIfSliceLayers(fileName, getChainTextFromProcedures(fileName, procedures, text))
 
 def getChainTextFromProcedures(fileName, procedures, text):
 	'Get a crafted shape file from a list of procedures.'
+	craftRepository = settings.getReadRepository(CraftRepository())
+	gcodec.setProcedureLinesTable({})
+	gcodec.setSplitLineTable({})
+	slice_layers.setIsHandingOff(craftRepository.handOffBinarySliceLayers.value)
+	skeinforge_parallel.setNumberOfProcesses(craftRepository.layerWorkerProcesses.value)
+	try:
+		return getChainTextFromProceduresWithSplitLineTable(craftRepository, fileName, procedures, text)
+	finally:
+		gcodec.setProcedureLinesTable(None)
+		gcodec.setSplitLineTable(None)
+		slice_layers.setIsHandingOff(False)
+		skeinforge_parallel.setNumberOfProcesses(1)
+
+def getChainTextFromProceduresWithSplitLineTable(craftRepository, fileName, procedures, text):
+	'Get a crafted shape file from a list of procedures, while the split line table is shared by the procedures.'
+	craftCache = CraftCache(craftRepository)
 	lastProcedureTime = time.time()
 	for procedure in procedures:
 		craftModule = getCraftModule(procedure)
 		if craftModule != None:
-			text = craftModule.getCraftedText(fileName, text)
-			if text == '':
+			cacheKey = craftCache.getKey(craftModule, fileName, procedure, text)
+			cachedText = craftCache.getText(cacheKey)
+			if cachedText != None:
+				print('%s procedure output was read from the craft cache.' % procedure.capitalize())
+				text = cachedText
+				lastProcedureTime = time.time()
+				continue
+			craftedText = craftModule.getCraftedText(fileName, text)
+			if craftedText == '':
 				print('Warning, the text was not recognized in getChainTextFromProcedures in skeinforge_craft for')
 				print(fileName)
 				return ''
+			if craftedText != text:
+				craftCache.setText(cacheKey, craftedText)
+			text = craftedText
 			if gcodec.isProcedureDone( text, procedure ):
 				print('%s procedure took %s.' % (procedure.capitalize(), euclidean.getDurationString(time.time() - lastProcedureTime)))
 				lastProcedureTime = time.time()
@@ -155,6 +193,103 @@ def writeSVGTextWithNounMessage(fileName, repository, shouldAnalyze=True):
 		settings.openSVGPage(fileNameSuffix, repository.svgViewer.value)
 
 
+class CraftCache:
+	"A class to save and read the output of the craft procedures, keyed by a hash of everything which the output depends on."
+	def __init__(self, repository):
+		"Initialize."
+		self.directory = archive.getSettingsPath('craft_cache')
+		self.isActive = repository.activateCraftCache.value
+		self.maximumSize = 1024 * 1024 * repository.maximumCraftCacheSize.value
+		if not self.isActive:
+			return
+		archive.makeDirectory(self.directory)
+		self.chainHash = hashlib.sha1(skeinforge_profile.getProfileDirectory())
+		for outputSetting in repository.outputSettings:
+			self.chainHash.update('%s=%s\n' % (outputSetting.name, outputSetting.value))
+		alterationsDirectories = [archive.getSettingsPath('alterations'), archive.getSkeinforgePath('alterations')]
+		for alterationsDirectory in alterationsDirectories:
+			if os.path.isdir(alterationsDirectory):
+				for alterationsFileName in archive.getFilesWithFileTypesWithoutWords(['gcode', 'csv', 'txt'], [], os.path.join(alterationsDirectory, '__init__.py')):
+					self.chainHash.update(alterationsFileName)
+					self.chainHash.update(archive.getFileText(alterationsFileName, False))
+		utilitiesFileNames = archive.getFilesWithFileTypesWithoutWordsRecursively(['py'], [], archive.getFabmetheusUtilitiesPath('__init__.py'))
+		utilitiesFileNames += archive.getFilesWithFileTypesWithoutWords(['py'], [], __file__)
+		for utilitiesFileName in utilitiesFileNames:
+			self.chainHash.update(utilitiesFileName)
+			self.chainHash.update(str(os.path.getmtime(utilitiesFileName)))
+
+	def getKey(self, craftModule, fileName, procedure, text):
+		"Get the cache key of the procedure output, or None if the output can not be cached."
+		if not self.isActive:
+			return None
+		if text == '' and fileName.endswith('.xml'):
+			return None
+		keyHash = self.chainHash.copy()
+		keyHash.update(procedure)
+		craftModuleFileName = archive.getUntilDot(craftModule.__file__) + '.py'
+		if os.path.isfile(craftModuleFileName):
+			keyHash.update(str(os.path.getmtime(craftModuleFileName)))
+		keyHash.update(settings.getRepositoryText(settings.getReadRepository(craftModule.getNewRepository())))
+		if text == '':
+			keyHash.update(fileName[fileName.rfind('.') :])
+			keyHash.update(archive.getFileText(fileName, False, 'rb'))
+		else:
+			keyHash.update(text)
+		return keyHash.hexdigest()
+
+	def getText(self, cacheKey):
+		"Get the cached output text, or None if it is not in the cache."
+		if cacheKey == None:
+			return None
+		cacheFileName = os.path.join(self.directory, cacheKey)
+		compressedText = archive.getFileText(cacheFileName, False, 'rb')
+		if compressedText == '':
+			return None
+		try:
+			text = zlib.decompress(compressedText)
+		except zlib.error:
+			return None
+		try:
+			os.utime(cacheFileName, None)
+		except OSError:
+			pass
+		return text
+
+	def removeLeastRecentlyUsed(self):
+		"Remove the least recently used outputs until the cache is smaller than the maximum size."
+		cacheFiles = []
+		cacheSize = 0
+		for cacheFileName in archive.getFilePathsByDirectory(self.directory):
+			try:
+				cacheStat = os.stat(cacheFileName)
+			except OSError:
+				continue
+			cacheFiles.append((cacheStat.st_mtime, cacheStat.st_size, cacheFileName))
+			cacheSize += cacheStat.st_size
+		cacheFiles.sort()
+		for modifiedTime, fileSize, cacheFileName in cacheFiles:
+			if cacheSize <= self.maximumSize:
+				return
+			try:
+				os.remove(cacheFileName)
+			except OSError:
+				pass
+			cacheSize -= fileSize
+
+	def setText(self, cacheKey, text):
+		"Save the output text in the cache."
+		if cacheKey == None:
+			return
+		cacheFileName = os.path.join(self.directory, cacheKey)
+		temporaryFileName = cacheFileName + '.%s.tmp' % os.getpid()
+		archive.writeFileText(temporaryFileName, zlib.compress(text, 1), 'wb')
+		try:
+			os.rename(temporaryFileName, cacheFileName)
+		except OSError:
+			return
+		self.removeLeastRecentlyUsed()
+
+
 class CraftRadioButtonsSaveListener:
 	"A class to update the craft radio buttons."
 	def addToDialog( self, gridPosition ):
@@ -205,6 +340,11 @@ class CraftRepository:
 		allCraftNames = archive.getPluginFileNamesFromDirectoryPath( getPluginsDirectoryPath() )
 		radioPlugins = settings.getRadioPluginsAddPluginFrame( getPluginsDirectoryPath(), self.importantFileNames, allCraftNames, self )
 		CraftRadioButtonsSaveListener().getFromRadioPlugins( radioPlugins, self )
+		self.activateCraftCache = settings.BooleanSetting().getFromValue('Activate Craft Cache', self, True)
+		self.maximumCraftCacheSize = settings.IntSpin().getFromValue(10, 'Maximum Craft Cache Size (megabytes):', self, 2000, 200)
+		self.handOffBinarySliceLayers = settings.BooleanSetting().getFromValue('Hand Off Binary Slice Layers', self, True)
+		self.layerWorkerProcesses = settings.IntSpin().getFromValue(0, 'Layer Worker Processes:', self, 16, 1)
+		self.outputSettings = [self.handOffBinarySliceLayers]
 		self.executeTitle = 'Craft'
 
 	def execute(self):
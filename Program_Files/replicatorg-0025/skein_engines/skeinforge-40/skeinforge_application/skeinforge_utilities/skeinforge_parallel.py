@@ -0,0 +1,85 @@
+"""
+Parallel is a collection of utilities to craft the layers of a skein in a pool of worker processes.
+
+A craft plugin whose layers can be crafted independently gives its skein a layerWindow attribute and an addLayer(layerIndex) method.  The layer window is the number of layers below and above a layer which are read when the layer is crafted, the fill window is the solid surface thickness and the inset window is zero.  If crafting a layer also depends on the state left by crafting the layer before it, the layer window is None and the layers are crafted in order.  The addLayer method adds the gcode of the layer to the skein distanceFeedRate, which is replaced by an empty one for each layer, so that the text of each layer can be returned by itself.
+
+The skein and its repository can not be pickled, so the worker processes are forked after the skein has parsed all of its layers and each worker reads the layers in the window from its own copy of the skein.  The layers are handed out in contiguous chunks, the texts come back in layer order and the progress is printed by the crafting process.  When fork is not available, or when the chain is already running in a worker process like the ones of skeinforge_batch and skeinforge_server, the layers are crafted in the crafting process.
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import gcodec
+from fabmetheus_utilities import settings
+import multiprocessing
+import os
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalLayerSkein = None
+globalMinimumLayersPerProcess = 4
+globalNumberOfProcesses = 1
+
+
+def getLayerText(layerSkein, layerIndex):
+	'Craft a layer into an empty distanceFeedRate and get the text of the layer.'
+	distanceFeedRate = layerSkein.distanceFeedRate
+	layerSkein.distanceFeedRate = gcodec.DistanceFeedRate()
+	layerSkein.distanceFeedRate.decimalPlacesCarried = distanceFeedRate.decimalPlacesCarried
+	try:
+		layerSkein.addLayer(layerIndex)
+		return layerSkein.distanceFeedRate.output.getvalue()
+	finally:
+		layerSkein.distanceFeedRate = distanceFeedRate
+
+def getLayerTextByIndex(layerIndex):
+	'Craft a layer of the skein which was forked into this worker process.'
+	return getLayerText(globalLayerSkein, layerIndex)
+
+def getLayerTexts(layerSkein, numberOfLayers, procedureName):
+	'Get the texts of the crafted layers in order, crafting the layers in worker processes when the skein and the platform allow it.'
+	global globalLayerSkein
+	layerTexts = []
+	numberOfProcesses = getNumberOfProcesses(layerSkein, numberOfLayers)
+	if numberOfProcesses < 2:
+		for layerIndex in xrange(numberOfLayers):
+			settings.printProgressByNumber(layerIndex, numberOfLayers, procedureName)
+			layerTexts.append(getLayerText(layerSkein, layerIndex))
+		return layerTexts
+	chunkSize = max(1, numberOfLayers / numberOfProcesses / 4)
+	globalLayerSkein = layerSkein
+	pool = multiprocessing.Pool(numberOfProcesses)
+	try:
+		for layerText in pool.imap(getLayerTextByIndex, xrange(numberOfLayers), chunkSize):
+			settings.printProgressByNumber(len(layerTexts), numberOfLayers, procedureName)
+			layerTexts.append(layerText)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		globalLayerSkein = None
+	pool.join()
+	return layerTexts
+
+def getNumberOfProcesses(layerSkein, numberOfLayers):
+	'Get the number of worker processes for the layers of the skein, one if the layers should be crafted in this process.'
+	if layerSkein.layerWindow == None or not hasattr(os, 'fork'):
+		return 1
+	if multiprocessing.current_process().daemon:
+		return 1
+	numberOfProcesses = globalNumberOfProcesses
+	if numberOfProcesses < 1:
+		numberOfProcesses = multiprocessing.cpu_count()
+	return max(1, min(numberOfProcesses, numberOfLayers / globalMinimumLayersPerProcess))
+
+def setNumberOfProcesses(numberOfProcesses):
+	'Set the number of layer worker processes, zero for one per processor.'
+	global globalNumberOfProcesses
+	globalNumberOfProcesses = numberOfProcesses
@@ -0,0 +1,429 @@
+"""
+Server is a script to keep skeinforge running as a slicing service, so that the imports, the profiles and the plugins are loaded once instead of once per slice.
+
+The server listens on a local address for jobs and runs them on a pool of worker processes, which stay alive between jobs so their module and profile caches stay warm.  If the address has a colon, like localhost:4250, it is a localhost TCP address, otherwise it is the path of a Unix socket.
+
+A job is a line of JSON with the fileName to craft and optionally the procedure to craft up to, the preferencesDirectory to use instead of the .skeinforge folder in the home directory and the options, which are a list of overrides in the "module:preference=value" format of skeinforge.py.  The server answers with a line of JSON for each event of the job, the progress and message events followed by a done or error event.  A job is done only if it wrote an output file beside the file to craft, so a missing file or a craft which only printed a warning is an error.  While a job runs, the server checks that its worker process is still alive, and sends an error if the worker stopped without finishing the job.  If no worker starts a job while no other job is running, the pool is stuck, so the job also gets an error.  In both cases the server starts a new pool of worker processes and submits the other jobs of the old pool to the new pool again, so they are crafted from the start instead of being lost.
+
+To start the server, in a shell type:
+> python skeinforge_server.py
+
+To craft a file with a running server, in a shell type:
+> python skeinforge_server.py --client test.stl
+
+"""
+
+from __future__ import absolute_import
+#Init has to be imported first because it has code to workaround the python bug where relative imports don't work if the module is imported as a main module.
+import __init__
+
+from fabmetheus_utilities import archive
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import settings
+from optparse import OptionParser
+from skeinforge_application.skeinforge_utilities import skeinforge_craft
+import copy
+import json
+import multiprocessing
+import os
+import Queue
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+
+
+__author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
+__date__ = '$Date: 2008/21/04 $'
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+globalDefaultAddress = 'localhost:4250'
+globalEventTimeout = 5.0
+globalStartTimeout = 30.0
+globalWorkerEventQueue = None
+
+
+def getConnectedSocket(address):
+	'Get a socket connected to the server address.'
+	if isTCPAddress(address):
+		return socket.create_connection(getTCPAddressTuple(address))
+	connectedSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	connectedSocket.connect(address)
+	return connectedSocket
+
+def getJobEvents(address, fileName, procedure='', preferencesDirectory='', options=[]):
+	'Send a job to the server and yield the events of the job as dictionaries until it is done.'
+	job = {'fileName' : os.path.abspath(fileName), 'options' : options, 'preferencesDirectory' : preferencesDirectory, 'procedure' : procedure}
+	connectedSocket = getConnectedSocket(address)
+	try:
+		connectedSocket.sendall(json.dumps(job) + '\n')
+		for line in connectedSocket.makefile('r'):
+			event = json.loads(line)
+			yield event
+			if event['type'] in ['done', 'error']:
+				return
+	finally:
+		connectedSocket.close()
+
+def getOutputModifiedTimes(fileName):
+	'Get the modified times and sizes of the files beside the file which start with its name without the extension.'
+	directoryPath = os.path.dirname(fileName)
+	fileStem = os.path.basename(fileName[: fileName.rfind('.')])
+	outputModifiedTimes = {}
+	if not os.path.isdir(directoryPath):
+		return outputModifiedTimes
+	for outputFileName in os.listdir(directoryPath):
+		outputPath = os.path.join(directoryPath, outputFileName)
+		if outputFileName.startswith(fileStem) and outputPath != fileName and os.path.isfile(outputPath):
+			outputModifiedTimes[outputPath] = (os.path.getmtime(outputPath), os.path.getsize(outputPath))
+	return outputModifiedTimes
+
+def getServer(address, numberOfProcesses=None):
+	'Get the slicing server listening on the address.'
+	if isTCPAddress(address):
+		return SlicingTCPServer(getTCPAddressTuple(address), numberOfProcesses)
+	if os.path.exists(address):
+		os.remove(address)
+	return SlicingUnixServer(address, numberOfProcesses)
+
+def getTCPAddressTuple(address):
+	'Get the host and port tuple of a TCP address.'
+	host, port = address.rsplit(':', 1)
+	return (host, int(port))
+
+def initializeWorker(eventQueue):
+	'Initialize a worker process so that it sends its progress to the server.'
+	global globalWorkerEventQueue
+	globalWorkerEventQueue = eventQueue
+
+def isTCPAddress(address):
+	'Determine if the address is a TCP address instead of a Unix socket path.'
+	return ':' in address
+
+def runJob(jobIndex, attempt, job):
+	'Craft the file of a job in a worker process, sending the events to the server.'
+	global globalWorkerEventQueue
+	eventWriter = EventWriter(globalWorkerEventQueue, jobIndex, attempt)
+	originalSettingsPath = archive.globalTemporarySettingsPath
+	originalStandardOutput = sys.stdout
+	originalTemporaryOverrides = settings.globalTemporaryOverrides
+	settings.globalProgressFunction = eventWriter.writeProgress
+	settings.globalTemporaryOverrides = copy.deepcopy(originalTemporaryOverrides)
+	sys.stdout = eventWriter
+	startTime = time.time()
+	try:
+		eventWriter.putEvent({'type' : 'started', 'pid' : os.getpid()})
+		fileName = job['fileName']
+		if not os.path.isfile(fileName):
+			eventWriter.putEvent({'type' : 'error', 'text' : 'The file %s does not exist.' % fileName})
+			return
+		oldOutputModifiedTimes = getOutputModifiedTimes(fileName)
+		if job.get('preferencesDirectory', '') != '':
+			archive.globalTemporarySettingsPath = job['preferencesDirectory']
+		for option in job.get('options', []):
+			moduleName, preferenceSpecification = option.split(':', 1)
+			preferenceName, value = preferenceSpecification.split('=', 1)
+			settings.temporaryAddPreferenceOverride(moduleName, preferenceName, value)
+		procedure = job.get('procedure', '')
+		if procedure == '':
+			skeinforge_craft.writeOutput(fileName, False)
+		else:
+			skeinforge_craft.writeChainTextWithNounMessage(fileName, procedure, False)
+		eventWriter.flush()
+		if getOutputModifiedTimes(fileName) == oldOutputModifiedTimes:
+			eventWriter.putEvent({'type' : 'error', 'text' : 'No output file was written for %s.' % fileName})
+			return
+		eventWriter.putEvent({'type' : 'done', 'seconds' : time.time() - startTime})
+	except:
+		eventWriter.flush()
+		eventWriter.putEvent({'type' : 'error', 'text' : traceback.format_exc()})
+	finally:
+		archive.globalTemporarySettingsPath = originalSettingsPath
+		settings.globalProgressFunction = None
+		settings.globalTemporaryOverrides = originalTemporaryOverrides
+		sys.stdout = originalStandardOutput
+
+def startServer(address=globalDefaultAddress, numberOfProcesses=None):
+	'Start the slicing server and serve jobs until interrupted.'
+	server = getServer(address, numberOfProcesses)
+	print('The skeinforge server is listening on %s with %s worker processes.' % (address, server.numberOfProcesses))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print('The skeinforge server has been stopped.')
+	finally:
+		server.close()
+
+def terminatePool(pool, processes):
+	'Terminate a worker pool, then kill its worker processes, because terminate never returns if a killed worker left the pool locked.'
+	terminateThread = threading.Thread(target=pool.terminate)
+	terminateThread.daemon = True
+	terminateThread.start()
+	terminateThread.join(globalEventTimeout)
+	for process in processes:
+		if process.is_alive():
+			process.terminate()
+
+def writeJobOutput(address, fileName, procedure='', preferencesDirectory='', options=[]):
+	'Send a job to the server and print its events.  Return True if the job was done.'
+	for event in getJobEvents(address, fileName, procedure, preferencesDirectory, options):
+		if event['type'] == 'progress':
+			settings.printProgressByString(event['text'])
+		elif event['type'] == 'message':
+			print(event['text'])
+		elif event['type'] == 'done':
+			print('The server crafted the file in %s.' % euclidean.getDurationString(event['seconds']))
+			return True
+		else:
+			print('Warning, the server could not craft the file:')
+			print(event['text'])
+	return False
+
+
+class EventWriter:
+	'A class to send the output of a job in a worker process to the server as events.'
+	def __init__(self, eventQueue, jobIndex, attempt):
+		'Initialize.'
+		self.attempt = attempt
+		self.eventQueue = eventQueue
+		self.jobIndex = jobIndex
+		self.text = ''
+
+	def flush(self):
+		'Send the unfinished line, if any.'
+		if self.text != '':
+			self.putEvent({'type' : 'message', 'text' : self.text})
+			self.text = ''
+
+	def putEvent(self, event):
+		'Send an event to the server.'
+		self.eventQueue.put((self.jobIndex, self.attempt, event))
+
+	def write(self, text):
+		'Send each finished line as a message event.'
+		lines = (self.text + text).split('\n')
+		self.text = lines[-1]
+		for line in lines[: -1]:
+			self.putEvent({'type' : 'message', 'text' : line})
+
+	def writeProgress(self, progressString):
+		'Send the progress string as a progress event.'
+		self.putEvent({'type' : 'progress', 'text' : progressString})
+
+
+class JobHandler(SocketServer.StreamRequestHandler):
+	'A class to read a job from a connection, run it and stream its events back.'
+	def handle(self):
+		'Handle a job connection.'
+		line = self.rfile.readline()
+		if line.strip() == '':
+			return
+		try:
+			job = json.loads(line)
+			if not isinstance(job, dict) or 'fileName' not in job:
+				raise ValueError('The job has no fileName.')
+		except ValueError, valueError:
+			self.writeEvent({'type' : 'error', 'text' : 'Could not read the job: %s' % valueError})
+			return
+		jobIndex, eventQueue = self.server.addJob(job)
+		try:
+			while True:
+				try:
+					event = eventQueue.get(True, globalEventTimeout)
+				except Queue.Empty:
+					errorText = self.server.getStoppedJobErrorText(jobIndex)
+					if errorText != None:
+						self.writeEvent({'type' : 'error', 'text' : errorText})
+						return
+					continue
+				self.writeEvent(event)
+				if event['type'] in ['done', 'error']:
+					return
+		finally:
+			self.server.removeJob(jobIndex)
+
+	def writeEvent(self, event):
+		'Write an event as a line of JSON.'
+		self.wfile.write(json.dumps(event) + '\n')
+		self.wfile.flush()
+
+
+class ServerJob:
+	'A class to hold the state of a job while the server runs it.'
+	def __init__(self, jobIndex, job):
+		'Initialize.'
+		self.asyncResult = None
+		self.attempt = 0
+		self.eventQueue = Queue.Queue()
+		self.isFinished = False
+		self.job = job
+		self.jobIndex = jobIndex
+		self.pool = None
+		self.processID = None
+		self.readyTime = None
+		self.submitTime = None
+
+	def addEvent(self, attempt, event):
+		'Add an event of the current attempt, remembering the worker process which started it, and drop the events of earlier attempts.'
+		if attempt != self.attempt:
+			return
+		if event['type'] == 'started':
+			self.processID = event['pid']
+			return
+		if event['type'] in ['done', 'error']:
+			self.isFinished = True
+		self.eventQueue.put(event)
+
+
+class SlicingServerMixIn:
+	'A mix in class to run the jobs of a server on a pool of worker processes.'
+	def addJob(self, job):
+		'Submit a job to the pool and return the job index and its event queue.'
+		self.jobLock.acquire()
+		try:
+			self.jobIndex += 1
+			serverJob = ServerJob(self.jobIndex, job)
+			self.serverJobs[self.jobIndex] = serverJob
+			self.submitJob(serverJob)
+			return self.jobIndex, serverJob.eventQueue
+		finally:
+			self.jobLock.release()
+
+	def close(self):
+		'Stop the pool and close the socket.'
+		self.pool.terminate()
+		self.workerEventQueue.put(None)
+		self.server_close()
+
+	def getStoppedJobErrorText(self, jobIndex):
+		'Get the error text of a job which can not finish, restarting its pool if its worker process stopped or the pool is stuck, or None if the job can still finish.'
+		self.jobLock.acquire()
+		try:
+			serverJob = self.serverJobs[jobIndex]
+			if not serverJob.eventQueue.empty():
+				return None
+			if serverJob.asyncResult.ready():
+				if serverJob.readyTime == None:
+					serverJob.readyTime = time.time()
+					return None
+				return 'The job returned without sending its last event.'
+			pool = serverJob.pool
+			if serverJob.processID != None:
+				if serverJob.processID in [child.pid for child in multiprocessing.active_children()]:
+					return None
+				errorText = 'The worker process stopped without finishing the job.'
+			else:
+				if time.time() - serverJob.submitTime < globalStartTimeout:
+					return None
+				for otherJob in self.serverJobs.values():
+					if otherJob.pool == pool and otherJob.processID != None and not otherJob.isFinished:
+						return None
+				errorText = 'No worker process started the job.'
+			if pool != self.pool:
+				return errorText
+			processes = list(pool._pool)
+			self.restartPool(jobIndex)
+		finally:
+			self.jobLock.release()
+		terminatePool(pool, processes)
+		return errorText
+
+	def removeJob(self, jobIndex):
+		'Remove a job.'
+		self.jobLock.acquire()
+		try:
+			del self.serverJobs[jobIndex]
+		finally:
+			self.jobLock.release()
+
+	def restartPool(self, lostJobIndex):
+		'Start a new worker pool in place of the pool of the lost job, and submit the other jobs of the old pool to the new pool, while the job lock is held.'
+		oldPool = self.pool
+		self.pool = multiprocessing.Pool(self.numberOfProcesses, initializeWorker, (self.workerEventQueue,))
+		for serverJob in self.serverJobs.values():
+			if serverJob.jobIndex != lostJobIndex and serverJob.pool == oldPool and not serverJob.isFinished:
+				serverJob.eventQueue.put({'type' : 'message', 'text' : 'The pool of worker processes was restarted, so the job is crafted again.'})
+				self.submitJob(serverJob)
+
+	def routeEvents(self):
+		'Route the events of the worker processes to the event queues of their jobs.'
+		while True:
+			jobIndexEvent = self.workerEventQueue.get()
+			if jobIndexEvent == None:
+				return
+			jobIndex, attempt, event = jobIndexEvent
+			self.jobLock.acquire()
+			try:
+				if jobIndex in self.serverJobs:
+					self.serverJobs[jobIndex].addEvent(attempt, event)
+			finally:
+				self.jobLock.release()
+
+	def startPool(self, numberOfProcesses):
+		'Start the worker pool and the event router.'
+		if numberOfProcesses == None:
+			numberOfProcesses = multiprocessing.cpu_count()
+		self.numberOfProcesses = numberOfProcesses
+		self.jobIndex = 0
+		self.jobLock = threading.Lock()
+		self.serverJobs = {}
+		self.workerEventQueue = multiprocessing.Queue()
+		self.pool = multiprocessing.Pool(numberOfProcesses, initializeWorker, (self.workerEventQueue,))
+		routerThread = threading.Thread(target=self.routeEvents)
+		routerThread.daemon = True
+		routerThread.start()
+
+	def submitJob(self, serverJob):
+		'Submit a job to the pool as a new attempt, while the job lock is held.'
+		serverJob.attempt += 1
+		serverJob.isFinished = False
+		serverJob.pool = self.pool
+		serverJob.processID = None
+		serverJob.readyTime = None
+		serverJob.submitTime = time.time()
+		serverJob.asyncResult = self.pool.apply_async(runJob, (serverJob.jobIndex, serverJob.attempt, serverJob.job))
+
+
+class SlicingTCPServer(SlicingServerMixIn, SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	'A class to serve slicing jobs on a localhost TCP address.'
+	allow_reuse_address = True
+	daemon_threads = True
+	def __init__(self, addressTuple, numberOfProcesses):
+		'Start the pool, then bind the address.'
+		self.startPool(numberOfProcesses)
+		SocketServer.TCPServer.__init__(self, addressTuple, JobHandler)
+
+
+if hasattr(socket, 'AF_UNIX'):
+	class SlicingUnixServer(SlicingServerMixIn, SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+		'A class to serve slicing jobs on a Unix socket.'
+		daemon_threads = True
+		def __init__(self, socketPath, numberOfProcesses):
+			'Start the pool, then bind the socket path.'
+			self.startPool(numberOfProcesses)
+			SocketServer.UnixStreamServer.__init__(self, socketPath, JobHandler)
+
+
+def main():
+	'Start the server, or send a job to a running server if the client option is set.'
+	parser = OptionParser(usage='usage: %prog [options] [fileName]')
+	parser.add_option('-a', '--address', help='set the address, host:port for TCP or a path for a Unix socket', action='store', type='string', dest='address', default=globalDefaultAddress)
+	parser.add_option('-c', '--client', help='send the file as a job to a running server', action='store_true', dest='client', default=False)
+	parser.add_option('-n', '--processes', help='set the number of worker processes', action='store', type='int', dest='numberOfProcesses')
+	parser.add_option('-o', '--option', help='set an individual option in the format "module:preference=value"', action='append', type='string', dest='preferences', default=[])
+	parser.add_option('-p', '--prefdir', help='set path to preference directory', action='store', type='string', dest='preferencesDirectory', default='')
+	parser.add_option('-r', '--procedure', help='set the procedure to craft up to, the default is the end of the chain', action='store', type='string', dest='procedure', default='')
+	(options, args) = parser.parse_args()
+	if not options.client:
+		startServer(options.address, options.numberOfProcesses)
+		return
+	if len(args) < 1:
+		parser.error('the client needs a file name')
+	if not writeJobOutput(options.address, ' '.join(args), options.procedure, options.preferencesDirectory, options.preferences):
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()